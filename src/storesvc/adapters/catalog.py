@@ -0,0 +1,60 @@
+"""Readers for item catalogs uploaded for bulk import, one item per line.
+
+CSV files have a header with at least name, price and quantity, and optionally id. JSON lines
+files have one object per line with the same keys. An id must be a UUID; items without one
+get a new one.
+"""
+import csv
+import json
+from typing import Dict, Iterable, Iterator
+from uuid import UUID, uuid4
+
+REQUIRED_FIELDS = ('name', 'price', 'quantity')
+
+
+class InvalidCatalog(Exception):
+    pass
+
+
+def read_csv(lines: Iterable[str]) -> Iterator[Dict]:
+    reader = csv.DictReader(lines)
+    missing = set(REQUIRED_FIELDS) - set(reader.fieldnames or ())
+    if missing:
+        raise InvalidCatalog(f'Missing columns {sorted(missing)} in the CSV header')
+    for row in reader:
+        yield to_item_row(row, reader.line_num)
+
+
+def read_json_lines(lines: Iterable[str]) -> Iterator[Dict]:
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            raise InvalidCatalog(f'Line {line_number}: {e}')
+        if not isinstance(row, dict):
+            raise InvalidCatalog(f'Line {line_number}: expected an object')
+        yield to_item_row(row, line_number)
+
+
+READERS = {
+    'text/csv': read_csv,
+    'application/x-ndjson': read_json_lines,
+    'application/jsonl': read_json_lines,
+}
+
+
+def to_item_row(row: Dict, line_number: int) -> Dict:
+    try:
+        item = {
+            'id': str(UUID(str(row['id']))) if row.get('id') else str(uuid4()),
+            'name': str(row['name']),
+            'price': float(row['price']),
+            'quantity': int(row['quantity']),
+        }
+    except (KeyError, TypeError, ValueError) as e:
+        raise InvalidCatalog(f'Line {line_number}: invalid item {row}: {e!r}')
+    if item['quantity'] < 0:
+        raise InvalidCatalog(f'Line {line_number}: negative quantity {item["quantity"]}')
+    return item
@@ -0,0 +1,196 @@
+import logging
+import os
+import sqlalchemy
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool, QueuePool
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from storesvc import config
+
+logger = logging.getLogger(__name__)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that also records how long checkouts wait for a free connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.timeouts += timed_out
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+def create_engine(uri: str = None, **kwargs) -> sqlalchemy.engine.Engine:
+    """Creates an engine whose connection pool is sized and tuned by the DB_POOL_* settings."""
+    return sqlalchemy.create_engine(
+        uri or config.get_postgres_uri(),
+        poolclass=TimedQueuePool,
+        pool_size=config.get_db_pool_size(),
+        max_overflow=config.get_db_max_overflow(),
+        pool_timeout=config.get_db_pool_timeout(),
+        pool_recycle=config.get_db_pool_recycle(),
+        pool_pre_ping=config.get_db_pool_pre_ping(),
+        **kwargs
+    )
+
+
+# Engines shared by the whole process, by uri and isolation level; see get_engine
+_engines = {}  # type: Dict[Tuple[str, Optional[str]], Engine]
+_engines_lock = threading.Lock()
+
+
+def get_engine(uri: str = None, isolation_level: str = None) -> sqlalchemy.engine.Engine:
+    """Returns the process's engine for `uri`, created on first use.
+
+    Nothing connects to the database, or even imports its driver, until something asks for
+    an engine, so workers and tools that never touch the database start without it.
+    """
+    key = (uri or config.get_postgres_uri(), isolation_level)
+    engine = _engines.get(key)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(key)
+            if engine is None:
+                kwargs = {'isolation_level': isolation_level} if isolation_level else {}
+                engine = _engines[key] = create_engine(key[0], **kwargs)
+    return engine
+
+
+def dispose_engines():
+    """Closes the pooled connections of the shared engines; they open new ones when used again."""
+    with _engines_lock:
+        engines = list(_engines.values())
+    for engine in engines:
+        engine.dispose()
+
+
+# Engines and connections inherited through fork, never to be closed by this process: drivers
+# close a connection when it is garbage collected, which would end the parent's session too
+_inherited = []  # type: List[object]
+
+
+def _forget_engines():
+    # In a forked child: the inherited engines pool the parent's connections, so the child makes
+    # its own engines on first use
+    global _engines, _engines_lock
+    _inherited.extend(_engines.values())
+    _engines = {}
+    _engines_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_engines)
+
+
+@event.listens_for(Pool, 'connect')
+def _remember_process(dbapi_connection, connection_record):
+    connection_record.info['pid'] = os.getpid()
+
+
+@event.listens_for(Pool, 'checkout')
+def _check_process(dbapi_connection, connection_record, connection_proxy):
+    """Keeps a process from using a connection it inherited through fork, whatever the engine."""
+    pid = os.getpid()
+    if connection_record.info.get('pid', pid) != pid:
+        # Detach it without closing it; the pool connects again on DisconnectionError
+        _inherited.append(dbapi_connection)
+        connection_record.connection = connection_proxy.connection = None
+        raise exc.DisconnectionError(
+            f"Connection opened by process {connection_record.info['pid']}, checked out by process {pid}"
+        )
+
+
+def pool_stats(engine: sqlalchemy.engine.Engine) -> Dict[str, float]:
+    pool = engine.pool
+    stats = {
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'checked_in': pool.checkedin(),
+        # QueuePool counts overflow from -size; it is positive only once the pool itself is exhausted
+        'overflow': max(pool.overflow(), 0),
+    }
+    if isinstance(pool, TimedQueuePool):
+        with pool._stats_lock:
+            stats.update({
+                'checkouts': pool.checkouts,
+                'timeouts': pool.timeouts,
+                'wait_seconds_total': pool.wait_seconds_total,
+                'wait_seconds_max': pool.wait_seconds_max,
+            })
+    return stats
+
+
+@dataclass
+class QueryStats:
+    """Statements run while tracking was on. `rows` is the driver's rowcount: rows written,
+    and rows read where the driver reports them (psycopg2 does, sqlite3 does not)."""
+    statements: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+    # The SQL of each statement, only kept when tracking with record=True
+    sql: Optional[List[str]] = field(default=None, repr=False)
+
+
+# Every tracker active in the current context: a unit of work inside a request counts in both
+_trackers = ContextVar('query_trackers', default=())  # type: ContextVar[Tuple[QueryStats, ...]]
+
+
+def start_tracking(record: bool = False) -> Tuple[QueryStats, Token]:
+    """Counts the statements run from now on in this thread or task, until stop_tracking(token)."""
+    stats = QueryStats(sql=[] if record else None)
+    return stats, _trackers.set(_trackers.get() + (stats,))
+
+
+def stop_tracking(token: Token):
+    _trackers.reset(token)
+
+
+@contextmanager
+def track_queries(record: bool = False) -> Iterator[QueryStats]:
+    stats, token = start_tracking(record)
+    try:
+        yield stats
+    finally:
+        stop_tracking(token)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['statement_start'].pop()
+    rows = max(cursor.rowcount, 0)
+    for stats in _trackers.get():
+        stats.statements += 1
+        stats.rows += rows
+        stats.seconds += elapsed
+        if stats.sql is not None:
+            stats.sql.append(statement)
+    if elapsed > config.get_db_slow_query_threshold():
+        logger.warning('Slow query took %.3fs: %s', elapsed, statement)
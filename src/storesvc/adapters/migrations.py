@@ -0,0 +1,114 @@
+"""Brings an existing database up to the schema of orm.metadata. Every step checks what is
+already there first, so upgrade() can run on any version of the schema, as often as needed.
+
+Postgres ids are converted to the uuid type by convert_keys_to_uuid(), which rewrites the
+tables: run it in a maintenance window, before starting the service with DB_NATIVE_UUID.
+"""
+import logging
+from sqlalchemy import func, inspect, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import AddConstraint
+from typing import List, Tuple
+
+from storesvc.adapters import orm
+
+logger = logging.getLogger(__name__)
+
+
+def upgrade(connection: Connection, native_uuid: bool = False):
+    orm.metadata.create_all(connection)
+    add_store_items_indexes(connection)
+    add_reservation_owner(connection)
+    widen_consumer_positions(connection)
+    if native_uuid:
+        convert_keys_to_uuid(connection)
+
+
+def add_store_items_indexes(connection: Connection) -> int:
+    """Creates the indexes of store_items_mappings that are missing, after deleting the duplicate
+    mappings the unique one would reject. Returns the number of duplicates deleted."""
+    table = orm.store_items_mappings
+    existing = {index['name'] for index in inspect(connection).get_indexes(table.name)}
+    missing = [index for index in table.indexes if index.name not in existing]
+    deleted = 0
+    if any(index.unique for index in missing):
+        # The first mapping of each (store_id, item_id) stays
+        first_ids = select([func.min(table.c.id)]).group_by(table.c.store_id, table.c.item_id)
+        deleted = connection.execute(table.delete().where(table.c.id.notin_(first_ids))).rowcount
+        if deleted:
+            logger.warning('Deleted %d duplicate rows of %s', deleted, table.name)
+    for index in missing:
+        logger.info('Creating index %s', index.name)
+        index.create(connection)
+    return deleted
+
+
+def add_reservation_owner(connection: Connection) -> bool:
+    """Adds the owner column of reservations, and its index, if missing. Returns whether it was.
+
+    The rows saved before get the empty owner: no instance loads them, and they are deleted
+    once they expire.
+    """
+    table = orm.reservations
+    if any(column['name'] == 'owner' for column in inspect(connection).get_columns(table.name)):
+        return False
+    logger.info('Adding %s.owner', table.name)
+    connection.execute(f"ALTER TABLE {table.name} ADD COLUMN owner VARCHAR(255) NOT NULL DEFAULT ''")
+    for index in table.indexes:
+        index.create(connection)
+    return True
+
+
+def widen_consumer_positions(connection: Connection) -> bool:
+    """Changes consumer_positions.position from integer to bigint on Postgres, where an integer
+    is 32 bits. Returns whether it did; SQLite integers are 64 bits already."""
+    table = orm.consumer_positions
+    if connection.dialect.name != 'postgresql':
+        return False
+    if not any(
+        column['name'] == 'position' and str(column['type']).upper() == 'INTEGER'
+        for column in inspect(connection).get_columns(table.name)
+    ):
+        return False
+    logger.info('Changing %s.position to bigint', table.name)
+    connection.execute(f'ALTER TABLE {table.name} ALTER COLUMN position TYPE BIGINT')
+    return True
+
+
+def uuid_columns() -> List[Tuple[str, str]]:
+    """(table, column) of every id column of the UUIDString type, foreign keys included."""
+    return [
+        (table.name, column.name)
+        for table in orm.metadata.sorted_tables
+        for column in table.columns
+        if isinstance(column.type, orm.UUIDString)
+    ]
+
+
+def convert_keys_to_uuid(connection: Connection) -> List[Tuple[str, str]]:
+    """Changes the CHAR(36) id columns of a Postgres database to uuid, in one transaction.
+    Returns the (table, column) converted; it fails on the first value that is not a UUID."""
+    if connection.dialect.name != 'postgresql':
+        raise ValueError(f'Native uuid columns need Postgres, not {connection.dialect.name}')
+    inspector = inspect(connection)
+    converting = [
+        (table, column) for table, column in uuid_columns()
+        if not any(
+            info['name'] == column and str(info['type']).upper() == 'UUID' for info in inspector.get_columns(table)
+        )
+    ]
+    if not converting:
+        return converting
+    # Foreign keys between columns of different types cannot exist, even for a moment
+    referencing = [table for table in orm.metadata.sorted_tables if table.foreign_key_constraints]
+    with connection.begin():
+        for table in referencing:
+            for foreign_key in inspector.get_foreign_keys(table.name):
+                connection.execute(f'ALTER TABLE {table.name} DROP CONSTRAINT {foreign_key["name"]}')
+        for table, column in converting:
+            logger.info('Converting %s.%s to uuid', table, column)
+            connection.execute(f'ALTER TABLE {table} ALTER COLUMN {column} TYPE uuid USING {column}::uuid')
+        for table in referencing:
+            for foreign_key in table.foreign_key_constraints:
+                connection.execute(AddConstraint(foreign_key))
+    return converting
@@ -0,0 +1,95 @@
+"""Order events published by the order service, read by the order replica.
+
+FileOrderEventSource reads them from a JSON lines file instead of the message broker, one
+{"type": "OrderCreated" | "OrderUpdated", "order": {...}} object per line, the order in the
+order service API's format. A position is the byte offset of the next line to read. A line
+that is not such a message is logged and skipped, so that it does not stop the replication.
+"""
+import abc
+import json
+import logging
+import os
+from typing import Iterable, List, Tuple
+
+from storesvc import metrics
+from storesvc.adapters.provider import OrderSvcProvider
+from storesvc.domain import events
+from storesvc.domain.value import Order
+
+logger = logging.getLogger(__name__)
+
+ORDER_EVENT_TYPES = {
+    'OrderCreated': events.OrderCreated,
+    'OrderUpdated': events.OrderUpdated,
+}
+
+
+class AbstractOrderEventSource(abc.ABC):
+    name: str
+
+    @abc.abstractmethod
+    def read(self, position: int, limit: int) -> Tuple[List[events.Event], int]:
+        """Returns up to `limit` events from `position` on, and the position after them."""
+        raise NotImplementedError
+
+
+class FileOrderEventSource(AbstractOrderEventSource):
+    def __init__(self, path: str, name: str = None):
+        self.path = path
+        self.name = name or f'order-events:{os.path.basename(path)}'
+
+    def read(self, position: int, limit: int) -> Tuple[List[events.Event], int]:
+        order_events = []
+        try:
+            file = open(self.path, 'rb')
+        except FileNotFoundError:
+            return order_events, position
+        with file:
+            file.seek(position)
+            while len(order_events) < limit:
+                line = file.readline()
+                if not line.endswith(b'\n'):
+                    # End of the file, or a line still being written
+                    break
+                position += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    event = from_message(json.loads(line))
+                except (AttributeError, KeyError, TypeError, ValueError) as e:
+                    metrics.INVALID_ORDER_EVENTS.inc()
+                    logger.error(
+                        'Skipping invalid order event at %s:%d: %r (%r)', self.path, position - len(line), line, e
+                    )
+                    continue
+                if event is not None:
+                    order_events.append(event)
+        return order_events, position
+
+    def append(self, order_events: Iterable[events.Event]):
+        """Publishes events to the file, as the order service would to its topic."""
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.writelines(json.dumps(to_message(event)) + '\n' for event in order_events)
+
+
+def from_message(message: dict):
+    event_type = ORDER_EVENT_TYPES.get(message.get('type'))
+    if event_type is None:
+        logger.debug('Skipping order event %s', message.get('type'))
+        return None
+    return event_type(order=OrderSvcProvider.to_domain(message['order']))
+
+
+def to_message(event: events.Event) -> dict:
+    order = event.order  # type: Order
+    return {
+        'type': type(event).__name__,
+        'order': {
+            'id': order.order_id,
+            'orderDate': order.order_datetime.isoformat(),
+            'customerPhoneNumber': order.customer_phone,
+            'storeId': order.store_id,
+            'itemIds': list(order.item_ids),
+            'orderStatus': order.order_status,
+        },
+    }
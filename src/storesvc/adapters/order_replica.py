@@ -0,0 +1,113 @@
+import json
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session
+from typing import Callable, Dict, Iterable, Iterator
+
+from storesvc import metrics
+from storesvc.adapters import orm
+from storesvc.adapters.provider import AbstractOrderProvider
+from storesvc.domain.value import Order
+
+
+class SqlAlchemyOrderReplica:
+    def __init__(self, session):
+        self.session = session
+
+    def get_orders(self, order_ids: Iterable[str]) -> Dict[str, Order]:
+        rows = self.session.execute(
+            select([orm.orders]).where(orm.orders.c.order_id.in_(list(order_ids)))
+        )
+        return {
+            row.order_id: Order(
+                order_id=row.order_id,
+                order_datetime=row.order_datetime,
+                customer_phone=row.customer_phone,
+                store_id=row.store_id,
+                item_ids=json.loads(row.item_ids),
+                order_status=row.order_status,
+            )
+            for row in rows
+        }
+
+    def save(self, orders: Iterable[Order]):
+        """Inserts the orders, or replaces the saved ones: the last order of an id wins."""
+        rows = {
+            order.order_id: dict(
+                order_id=order.order_id,
+                order_datetime=order.order_datetime,
+                customer_phone=order.customer_phone,
+                store_id=order.store_id,
+                item_ids=json.dumps(list(order.item_ids)),
+                order_status=order.order_status,
+            )
+            for order in orders
+        }
+        if not rows:
+            return
+        # Portable upsert: SQLAlchemy 1.3 has ON CONFLICT for Postgres only
+        saved = {order_id for order_id, in self.session.execute(
+            select([orm.orders.c.order_id]).where(orm.orders.c.order_id.in_(list(rows)))
+        )}
+        updates = [dict(row, saved_id=order_id) for order_id, row in rows.items() if order_id in saved]
+        inserts = [row for order_id, row in rows.items() if order_id not in saved]
+        if updates:
+            self.session.execute(
+                orm.orders.update().where(orm.orders.c.order_id == bindparam('saved_id')), updates
+            )
+        if inserts:
+            self.session.execute(orm.orders.insert(), inserts)
+
+    def get_position(self, name: str) -> int:
+        position = self.session.execute(
+            select([orm.consumer_positions.c.position]).where(orm.consumer_positions.c.name == name)
+        ).scalar()
+        return position or 0
+
+    def set_position(self, name: str, position: int):
+        updated = self.session.execute(
+            orm.consumer_positions.update().where(orm.consumer_positions.c.name == name).values(position=position)
+        ).rowcount
+        if not updated:
+            self.session.execute(orm.consumer_positions.insert().values(name=name, position=position))
+
+
+class ReplicaOrderProvider(AbstractOrderProvider):
+    """Reads orders from the local replica, and from `fallback` for the orders it has not seen yet.
+
+    An approval then costs one primary key lookup instead of a call to the order service, once
+    the order's OrderCreated event has been replicated. Orders fetched from `fallback` are not
+    saved: only the events write the replica, so it never goes back to an older order.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], fallback: AbstractOrderProvider):
+        self.session_factory = session_factory
+        self.fallback = fallback
+
+    def get_order(self, order_id: str) -> Order:
+        order = self._get_replicated([order_id]).get(order_id)
+        if order is not None:
+            metrics.ORDER_REPLICA_LOOKUPS.inc('hit')
+            return order
+        metrics.ORDER_REPLICA_LOOKUPS.inc('miss')
+        return self.fallback.get_order(order_id)
+
+    def get_orders(self, order_ids: Iterable[str]) -> Dict[str, Order]:
+        order_ids = list(order_ids)
+        orders = self._get_replicated(order_ids)
+        missing = [order_id for order_id in order_ids if order_id not in orders]
+        metrics.ORDER_REPLICA_LOOKUPS.inc('hit', amount=len(orders))
+        if missing:
+            metrics.ORDER_REPLICA_LOOKUPS.inc('miss', amount=len(missing))
+            orders.update(self.fallback.get_orders(missing))
+        return orders
+
+    def list_orders(self, store_id: str) -> Iterator[Order]:
+        # The replica only has the orders placed since replication started
+        return iter(self.fallback.list_orders(store_id))
+
+    def _get_replicated(self, order_ids: Iterable[str]) -> Dict[str, Order]:
+        session = self.session_factory()
+        try:
+            return SqlAlchemyOrderReplica(session).get_orders(order_ids)
+        finally:
+            session.close()
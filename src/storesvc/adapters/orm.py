@@ -1,15 +1,35 @@
+import threading
 from sqlalchemy import (
-    Table, MetaData, Column, Integer, String, ForeignKey, CHAR, Float, event
+    Table, MetaData, Column, BigInteger, Integer, String, ForeignKey, CHAR, Float, DateTime, Text, Index, event
 )
-from sqlalchemy.orm import mapper, relationship
+from sqlalchemy.orm import class_mapper, mapper, relationship
+from sqlalchemy.orm.exc import UnmappedClassError
+from sqlalchemy.types import TypeDecorator
 
+from storesvc import config
 from storesvc.domain import model
 
 metadata = MetaData()
 
+
+class UUIDString(TypeDecorator):
+    """Ids of stores and items: UUIDs as strings in Python, stored as CHAR(36), or as Postgres's
+    16 bytes uuid type with DB_NATIVE_UUID (see migrations.convert_keys_to_uuid)."""
+    impl = CHAR
+
+    def __init__(self):
+        super().__init__(36)
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql' and config.get_db_native_uuid():
+            from sqlalchemy.dialects.postgresql import UUID
+            return dialect.type_descriptor(UUID())
+        return dialect.type_descriptor(self.impl)
+
+
 items = Table(
     'items', metadata,
-    Column('id', CHAR(36), primary_key=True),
+    Column('id', UUIDString(), primary_key=True),
     Column('name', String(255)),
     Column('price', Float),
     Column('quantity', Integer),
@@ -17,7 +37,7 @@ items = Table(
 
 stores = Table(
     'stores', metadata,
-    Column('id', CHAR(36), primary_key=True),
+    Column('id', UUIDString(), primary_key=True),
     Column('name', String(255)),
     Column('version_number', Integer, nullable=False, server_default='0'),
 )
@@ -27,12 +47,76 @@ store_items_mappings = Table(
     Column('id', Integer, primary_key=True, autoincrement=True),
     Column('store_id', ForeignKey('stores.id')),
     Column('item_id', ForeignKey('items.id')),
+    # Loading a store's items and checking that it owns an item both search by store_id first
+    Index('uq_store_items_mappings_store_id_item_id', 'store_id', 'item_id', unique=True),
+    Index('ix_store_items_mappings_item_id', 'item_id'),
+)
+
+# Domain events committed together with the changes that raised them, until the relay hands them to the message bus
+outbox = Table(
+    'outbox', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('event_type', String(255), nullable=False),
+    Column('payload', Text, nullable=False),
+    Column('created_at', DateTime, nullable=False),
 )
 
+# Snapshots of the in-memory ReservationBooks, saved periodically and loaded at startup; each
+# instance of the service saves and loads only the rows of its owner name
+reservations = Table(
+    'reservations', metadata,
+    Column('id', CHAR(36), primary_key=True),
+    Column('owner', String(255), nullable=False, server_default=''),
+    Column('order', Text, nullable=False),
+    Column('expires_at', Float, nullable=False),
+    Index('ix_reservations_owner', 'owner'),
+)
+
+# Orders already approved, written in the approval's transaction so that a retried webhook is not applied twice
+processed_orders = Table(
+    'processed_orders', metadata,
+    Column('order_id', String(255), primary_key=True),
+    Column('store_id', UUIDString(), nullable=False),
+    Column('processed_at', DateTime, nullable=False),
+)
+
+# Local copy of the orders of the order service, kept up to date from its order events
+orders = Table(
+    'orders', metadata,
+    Column('order_id', String(255), primary_key=True),
+    Column('order_datetime', DateTime(timezone=True), nullable=False),
+    Column('customer_phone', String(255), nullable=False),
+    Column('store_id', UUIDString(), nullable=False),
+    Column('item_ids', Text, nullable=False),
+    Column('order_status', Integer, nullable=False),
+)
+
+# How far each event consumer has read its source, committed with the changes it made. The
+# position is a byte offset, which outgrows a 32 bits integer
+consumer_positions = Table(
+    'consumer_positions', metadata,
+    Column('name', String(255), primary_key=True),
+    Column('position', BigInteger, nullable=False),
+)
+
+
+_mappers_lock = threading.Lock()
+
 
 def start_mappers():
+    """Maps the domain model to the tables. Once they are mapped, it does nothing: every
+    entrypoint can call it, and clear_mappers() undoes it."""
+    with _mappers_lock:
+        try:
+            class_mapper(model.Store)
+        except UnmappedClassError:
+            _map()
+
+
+def _map():
     items_mapper = mapper(model.Item, items)
-    mapper(model.Store, stores, properties={
+    # version_number is bumped by the domain model and checked by the ORM on every UPDATE of a store
+    mapper(model.Store, stores, version_id_col=stores.c.version_number, version_id_generator=False, properties={
         '_items': relationship(
             items_mapper,
             secondary=store_items_mappings,
@@ -44,3 +128,4 @@ def start_mappers():
 @event.listens_for(model.Store, 'load')
 def receive_load(store, _):
     store.events = []
+    store._item_index = None
@@ -0,0 +1,40 @@
+import datetime
+from sqlalchemy import select
+from typing import List, Tuple
+
+from storesvc.adapters import orm, serialization
+from storesvc.domain import events
+
+
+def serialize(event: events.Event) -> str:
+    return serialization.dumps(event)
+
+
+def deserialize(event_type: str, payload: str) -> events.Event:
+    return serialization.loads(getattr(events, event_type), payload)
+
+
+class SqlAlchemyOutbox:
+    def __init__(self, session):
+        self.session = session
+
+    def add(self, event: events.Event):
+        self.session.execute(orm.outbox.insert().values(
+            event_type=type(event).__name__,
+            payload=serialize(event),
+            created_at=datetime.datetime.utcnow(),
+        ))
+
+    def pending(self, limit: int) -> List[Tuple[int, events.Event]]:
+        # SKIP LOCKED lets several relays drain the outbox without handing out the same rows
+        rows = self.session.execute(
+            select([orm.outbox.c.id, orm.outbox.c.event_type, orm.outbox.c.payload])
+            .order_by(orm.outbox.c.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return [(id, deserialize(event_type, payload)) for id, event_type, payload in rows]
+
+    def remove(self, ids: List[int]):
+        if ids:
+            self.session.execute(orm.outbox.delete().where(orm.outbox.c.id.in_(ids)))
@@ -1,7 +1,10 @@
 import abc
+import asyncio
 import datetime
 import requests
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Dict, Iterable, Iterator, Tuple, Union
 
 import storesvc.domain.value
 from storesvc.domain import model
@@ -18,34 +21,135 @@ class AbstractOrderProvider(abc.ABC):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def list_orders(self, order_id: str) -> List[storesvc.domain.value.Order]:
+    def list_orders(self, store_id: str) -> Iterable[storesvc.domain.value.Order]:
         raise NotImplementedError
 
+    def get_orders(self, order_ids: Iterable[str]) -> Dict[str, storesvc.domain.value.Order]:
+        # Orders that do not exist are left out of the result
+        orders = {}
+        for order_id in order_ids:
+            try:
+                orders[order_id] = self.get_order(order_id)
+            except InvalidOrderId:
+                continue
+        return orders
+
 
 class OrderSvcProvider(AbstractOrderProvider):
-    def __init__(self):
-        self._url = config.get_order_svc_url()
+    """Order service client. Safe to share between threads: requests go through one
+    keep-alive connection pool of `pool_size` connections."""
+
+    def __init__(
+            self, url: str = None, pool_size: int = None, timeout: Tuple[float, float] = None, page_size: int = None
+    ):
+        self._url = url or config.get_order_svc_url()
+        self._pool_size = pool_size or config.get_order_svc_pool_size()
+        self._timeout = timeout or config.get_order_svc_timeout()
+        self._page_size = page_size or config.get_order_svc_page_size()
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=self._pool_size, thread_name_prefix='ordersvc')
+
+    def close(self):
+        self._executor.shutdown()
+        self._session.close()
 
     def get_order(self, order_id: str) -> storesvc.domain.value.Order:
-        r = requests.get(url=f'{self._url}/api/orders/{order_id}')
-        order = self.to_domain(r)
+        r = self._session.get(url=f'{self._url}/api/orders/{order_id}', timeout=self._timeout)
+        if r.status_code == 404:
+            raise InvalidOrderId(f'Invalid order id {order_id}')
+        r.raise_for_status()
+        order = self.to_domain(r.json())
         return order
 
-    def list_orders(self, store_id: str) -> List[storesvc.domain.value.Order]:
-        r = requests.get(url=f'{self._url}/api/orders/stores/{store_id}')
-        orders = []
-        for order in r['orders']:
-            o = self.to_domain(order)
-            orders.append(o)
+    def get_orders(self, order_ids: Iterable[str]) -> Dict[str, storesvc.domain.value.Order]:
+        order_ids = list(order_ids)
+        futures = [self._executor.submit(self.get_order, order_id) for order_id in order_ids]
+        orders = {}
+        for order_id, future in zip(order_ids, futures):
+            try:
+                orders[order_id] = future.result()
+            except InvalidOrderId:
+                continue
         return orders
 
+    def list_orders(self, store_id: str) -> Iterator[storesvc.domain.value.Order]:
+        """Yields the orders of the store page by page, holding at most one page in memory."""
+        cursor = None
+        while True:
+            page = self._get_orders_page(store_id, cursor)
+            for order in page['orders']:
+                yield self.to_domain(order)
+            cursor = page.get('nextCursor')
+            if not cursor:
+                return
+
+    def _get_orders_page(self, store_id: str, cursor: str = None) -> dict:
+        params = {'limit': self._page_size}
+        if cursor:
+            params['cursor'] = cursor
+        r = self._session.get(url=f'{self._url}/api/orders/stores/{store_id}', params=params, timeout=self._timeout)
+        r.raise_for_status()
+        return r.json()
+
     @staticmethod
     def to_domain(order: dict):
         return storesvc.domain.value.Order(
             order_id=order['id'],
-            order_datetime=datetime.datetime(order['orderDate']),
+            order_datetime=parse_order_date(order['orderDate']),
             customer_phone=order['customerPhoneNumber'],
             store_id=order['storeId'],
             item_ids=order['itemIds'],
             order_status=order['orderStatus'],
         )
+
+
+def parse_order_date(value: Union[str, int, float]) -> datetime.datetime:
+    """Parses an ISO 8601 string (a trailing 'Z' included) or epoch milliseconds."""
+    if isinstance(value, (int, float)):
+        return datetime.datetime.fromtimestamp(value / 1000, tz=datetime.timezone.utc)
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    return datetime.datetime.fromisoformat(value)
+
+
+class AbstractAsyncOrderProvider(abc.ABC):
+    @abc.abstractmethod
+    async def get_order(self, order_id: str) -> storesvc.domain.value.Order:
+        raise NotImplementedError
+
+    async def get_orders(self, order_ids: Iterable[str]) -> Dict[str, storesvc.domain.value.Order]:
+        # Orders that do not exist are left out of the result
+        order_ids = list(order_ids)
+        results = await asyncio.gather(*(self.get_order(order_id) for order_id in order_ids), return_exceptions=True)
+        orders = {}
+        for order_id, result in zip(order_ids, results):
+            if isinstance(result, InvalidOrderId):
+                continue
+            if isinstance(result, BaseException):
+                raise result
+            orders[order_id] = result
+        return orders
+
+
+class ExecutorOrderProvider(AbstractAsyncOrderProvider):
+    """Async view of a blocking provider, whose calls run on a pool of `workers` threads.
+
+    With OrderSvcProvider, `workers` should match its connection pool size: that many
+    requests are in flight at once and the rest wait on the event loop, not on a thread.
+    """
+
+    def __init__(self, provider: AbstractOrderProvider = None, workers: int = None):
+        self._provider = provider or OrderSvcProvider()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or config.get_order_svc_pool_size(), thread_name_prefix='ordersvc-async'
+        )
+
+    def close(self):
+        self._executor.shutdown()
+
+    async def get_order(self, order_id: str) -> storesvc.domain.value.Order:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._provider.get_order, order_id)
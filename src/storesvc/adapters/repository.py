@@ -1,25 +1,61 @@
 import abc
+import datetime
+import io
+from sqlalchemy import and_, case, exists, select
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import attributes
 from sqlalchemy.orm.exc import NoResultFound
-from typing import List, Set
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Sequence, Set, Tuple
 
-from storesvc.domain import model
+from storesvc.adapters import orm
+from storesvc.domain import events, model
+from storesvc.domain.value import Order
 
 
 class InvalidStoreId(Exception):
     pass
 
 
+class DuplicateApproval(Exception):
+    """Another transaction approved the order first."""
+    pass
+
+
+class DuplicateItem(Exception):
+    """An item being added has the id of an item that exists, or of another one added with it."""
+    pass
+
+
+class InvalidItem(Exception):
+    """An item being added has a value its column cannot store."""
+    pass
+
+
+# Columns of an item that listings can project
+ITEM_FIELDS = ('id', 'name', 'price', 'quantity')
+
+
 class AbstractRepository(abc.ABC):
     def __init__(self):
         self.seen = set()  # type: Set[model.Store]
+        # Events of changes written without loading the aggregate, e.g. by decrement_quantities
+        self.events = []  # type: List[events.Event]
 
     def new(self, store: model.Store):
         self._new(store)
         self.seen.add(store)
 
-    def get(self, id: str) -> model.Store:
+    def get(self, id: str, item_ids: Iterable[str] = None) -> model.Store:
+        """Returns the store with all of its items, or only with the items in `item_ids` if given.
+
+        A store loaded with `item_ids` is a partial aggregate: list_items() returns only the
+        requested items, but approve() and get_item() work as usual for orders of those items.
+        """
         try:
-            store = self._get(id)
+            if item_ids is None:
+                store = self._get(id)
+            else:
+                store = self._get_with_items(id, set(item_ids))
             self.seen.add(store)
             return store
         except Exception:
@@ -37,6 +73,42 @@ class AbstractRepository(abc.ABC):
     def _list(self) -> List[model.Store]:
         raise NotImplementedError
 
+    def _get_with_items(self, id: str, item_ids: Set[str]) -> model.Store:
+        return self._get(id)
+
+    @abc.abstractmethod
+    def decrement_quantities(
+            self, store_id: str, ordered_counts: Dict[str, int], held: Dict[str, int] = None
+    ) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_quantities(self, store_id: str, item_ids: Iterable[str]) -> Dict[str, int]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_name_and_version_number(self, id: str) -> Tuple[str, int]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def insert_items(self, store_id: str, rows: Sequence[Dict]) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_approved_order_ids(self, order_ids: Iterable[str]) -> Set[str]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def add_approved_orders(self, orders: Iterable[Order]):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def iter_item_rows(
+            self, store_id: str, fields: Sequence[str] = ITEM_FIELDS, after: str = None, limit: int = None,
+            in_stock: bool = False, batch_size: int = 500,
+    ) -> Iterator[Tuple]:
+        raise NotImplementedError
+
 
 class SqlAlchemyRepository(AbstractRepository):
     def __init__(self, session):
@@ -52,5 +124,268 @@ class SqlAlchemyRepository(AbstractRepository):
         except NoResultFound:
             raise InvalidStoreId(f'Invalid store id {id}')
 
+    def _get_with_items(self, id: str, item_ids: Set[str]) -> model.Store:
+        # One round trip: the store row outer joined to only the requested items
+        rows = self.session.query(model.Store, model.Item).select_from(model.Store).outerjoin(
+            orm.store_items_mappings,
+            and_(
+                orm.store_items_mappings.c.store_id == orm.stores.c.id,
+                orm.store_items_mappings.c.item_id.in_(item_ids),
+            )
+        ).outerjoin(
+            model.Item, model.Item.id == orm.store_items_mappings.c.item_id
+        ).filter(model.Store.id == id).all()
+        if not rows:
+            raise InvalidStoreId(f'Invalid store id {id}')
+
+        store = rows[0][0]
+        items = [item for _, item in rows if item is not None]
+        if '_items' not in store.__dict__:
+            attributes.set_committed_value(store, '_items', items)
+            store._item_index = None
+        elif not attributes.get_history(store, '_items').has_changes():
+            # Already (partially) loaded in this session: add the requested items it is missing
+            missing = [item for item in items if store.get_item(item.id) is None]
+            if missing:
+                attributes.set_committed_value(store, '_items', store._items + missing)
+                store._item_index = None
+        return store
+
     def _list(self) -> List[model.Store]:
         return self.session.query(model.Store).all()
+
+    def decrement_quantities(
+            self, store_id: str, ordered_counts: Dict[str, int], held: Dict[str, int] = None
+    ) -> int:
+        """Takes the ordered counts out of the store's items that have enough stock, in one UPDATE.
+
+        Stock `held` by reservations, by item id, does not count as enough. Returns the number of
+        items decremented; fewer than len(ordered_counts) means some item is missing or short,
+        and the caller must roll back. Bumps the store's version_number so that aggregate-based
+        writers and the item listing cache see the change.
+        """
+        held = held or {}
+        ordered_count = case(ordered_counts, value=orm.items.c.id)
+        required_count = case(
+            {item_id: count + held.get(item_id, 0) for item_id, count in ordered_counts.items()},
+            value=orm.items.c.id,
+        )
+        owned_by_store = exists().where(and_(
+            orm.store_items_mappings.c.store_id == store_id,
+            orm.store_items_mappings.c.item_id == orm.items.c.id,
+        ))
+        decremented = self.session.execute(
+            orm.items.update().where(and_(
+                orm.items.c.id.in_(list(ordered_counts)),
+                owned_by_store,
+                orm.items.c.quantity >= required_count,
+            )).values(quantity=orm.items.c.quantity - ordered_count)
+        ).rowcount
+        bumped = self.session.execute(
+            orm.stores.update().where(orm.stores.c.id == store_id).values(
+                version_number=orm.stores.c.version_number + 1
+            )
+        ).rowcount
+        if not bumped:
+            raise InvalidStoreId(f'Invalid store id {store_id}')
+        return decremented
+
+    def get_quantities(self, store_id: str, item_ids: Iterable[str]) -> Dict[str, int]:
+        rows = self.session.execute(
+            select([orm.items.c.id, orm.items.c.quantity]).select_from(
+                orm.items.join(orm.store_items_mappings, orm.store_items_mappings.c.item_id == orm.items.c.id)
+            ).where(and_(
+                orm.store_items_mappings.c.store_id == store_id,
+                orm.items.c.id.in_(list(item_ids)),
+            ))
+        )
+        return {item_id: quantity for item_id, quantity in rows}
+
+    def get_version_number(self, id: str) -> int:
+        version_number = self.session.query(model.Store.version_number).filter_by(id=id).scalar()
+        if version_number is None:
+            raise InvalidStoreId(f'Invalid store id {id}')
+        return version_number
+
+    def get_name_and_version_number(self, id: str) -> Tuple[str, int]:
+        row = self.session.execute(
+            select([orm.stores.c.name, orm.stores.c.version_number]).where(orm.stores.c.id == id)
+        ).first()
+        if row is None:
+            raise InvalidStoreId(f'Invalid store id {id}')
+        return row.name, row.version_number
+
+    def insert_items(self, store_id: str, rows: Sequence[Dict]) -> int:
+        """Adds new items, given as dicts of ITEM_FIELDS, to the store without going through the ORM.
+
+        Items and their mappings are written with one executemany each, or COPY on Postgres.
+        Bumps the store's version_number like every other change to its catalog.
+        """
+        bumped = self.session.execute(
+            orm.stores.update().where(orm.stores.c.id == store_id).values(
+                version_number=orm.stores.c.version_number + 1
+            )
+        ).rowcount
+        if not bumped:
+            raise InvalidStoreId(f'Invalid store id {store_id}')
+        mappings = [{'store_id': store_id, 'item_id': row['id']} for row in rows]
+        connection = self.session.connection()
+        # COPY runs on the driver's cursor, whose errors SQLAlchemy does not wrap
+        dbapi = connection.dialect.dbapi
+        try:
+            if connection.dialect.name == 'postgresql':
+                cursor = connection.connection.cursor()
+                try:
+                    _copy(cursor, orm.items, rows)
+                    _copy(cursor, orm.store_items_mappings, mappings)
+                finally:
+                    cursor.close()
+            else:
+                connection.execute(orm.items.insert(), list(rows))
+                connection.execute(orm.store_items_mappings.insert(), mappings)
+        except (IntegrityError, dbapi.IntegrityError) as e:
+            raise DuplicateItem(f'Items already exist: {e}') from e
+        except (DataError, dbapi.DataError) as e:
+            raise InvalidItem(f'Invalid items: {e}') from e
+        return len(rows)
+
+    def get_approved_order_ids(self, order_ids: Iterable[str]) -> Set[str]:
+        """Returns the ids in `order_ids` that are in the processed_orders ledger."""
+        rows = self.session.execute(
+            select([orm.processed_orders.c.order_id]).where(orm.processed_orders.c.order_id.in_(list(order_ids)))
+        )
+        return {order_id for order_id, in rows}
+
+    def add_approved_orders(self, orders: Iterable[Order]):
+        """Records the orders in the processed_orders ledger, to be committed with their approval.
+
+        The rows are inserted right away rather than at flush: an approval racing a duplicate of
+        its order waits here on the primary key, then fails with DuplicateApproval.
+        """
+        processed_at = datetime.datetime.utcnow()
+        rows = [dict(order_id=order.order_id, store_id=order.store_id, processed_at=processed_at) for order in orders]
+        if not rows:
+            return
+        try:
+            self.session.execute(orm.processed_orders.insert(), rows)
+        except IntegrityError as e:
+            raise DuplicateApproval(f'Order already approved: {[row["order_id"] for row in rows]}') from e
+
+    def iter_item_rows(
+            self, store_id: str, fields: Sequence[str] = ITEM_FIELDS, after: str = None, limit: int = None,
+            in_stock: bool = False, batch_size: int = 500,
+    ) -> Iterator[Tuple]:
+        """Yields the `fields` of the store's items in id order, without loading Item objects.
+
+        `after` is an item id to continue from (keyset pagination) and `in_stock` skips items
+        with no quantity left; both are applied in SQL. Rows are fetched `batch_size` at a time
+        from a server side cursor where the driver has one.
+        """
+        query = select([orm.items.c[field] for field in fields]).select_from(
+            orm.items.join(orm.store_items_mappings, orm.store_items_mappings.c.item_id == orm.items.c.id)
+        ).where(orm.store_items_mappings.c.store_id == store_id).order_by(orm.items.c.id)
+        if after is not None:
+            query = query.where(orm.items.c.id > after)
+        if in_stock:
+            query = query.where(orm.items.c.quantity > 0)
+        if limit is not None:
+            query = query.limit(limit)
+        result = self.session.execute(query.execution_options(stream_results=True))
+        try:
+            while True:
+                rows = result.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            result.close()
+
+
+def _copy(cursor, table, rows: Sequence[Dict]):
+    # psycopg2 cursor: streams the rows as CSV through COPY ... FROM STDIN
+    columns = [column.name for column in table.columns if column.name in rows[0]] if rows else []
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(','.join(_csv_field(row[column]) for column in columns) + '\n')
+    buffer.seek(0)
+    cursor.copy_expert(f'COPY {table.name} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+def _csv_field(value) -> str:
+    # COPY reads an unquoted empty field as NULL and a quoted one as '': quote every string
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
+
+
+class AbstractAsyncRepository(abc.ABC):
+    seen: Set[model.Store]
+    events: List[events.Event]
+
+    @abc.abstractmethod
+    async def new(self, store: model.Store):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get(self, id: str, item_ids: Iterable[str] = None) -> model.Store:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_version_number(self, id: str) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def decrement_quantities(self, store_id: str, ordered_counts: Dict[str, int]) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_quantities(self, store_id: str, item_ids: Iterable[str]) -> Dict[str, int]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_approved_order_ids(self, order_ids: Iterable[str]) -> Set[str]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def add_approved_orders(self, orders: Iterable[Order]):
+        raise NotImplementedError
+
+
+class ExecutorRepository(AbstractAsyncRepository):
+    """Async view of a blocking repository: every call is handed to `run`, which runs it
+    on the thread that owns the repository's session."""
+
+    def __init__(self, repo: AbstractRepository, run: Callable[..., Awaitable[Any]]):
+        self._repo = repo
+        self._run = run
+
+    @property
+    def seen(self) -> Set[model.Store]:
+        return self._repo.seen
+
+    @property
+    def events(self) -> List[events.Event]:
+        return self._repo.events
+
+    async def new(self, store: model.Store):
+        await self._run(self._repo.new, store)
+
+    async def get(self, id: str, item_ids: Iterable[str] = None) -> model.Store:
+        return await self._run(self._repo.get, id, item_ids)
+
+    async def get_version_number(self, id: str) -> int:
+        return await self._run(self._repo.get_version_number, id)
+
+    async def decrement_quantities(self, store_id: str, ordered_counts: Dict[str, int]) -> int:
+        return await self._run(self._repo.decrement_quantities, store_id, ordered_counts)
+
+    async def get_quantities(self, store_id: str, item_ids: Iterable[str]) -> Dict[str, int]:
+        return await self._run(self._repo.get_quantities, store_id, item_ids)
+
+    async def get_approved_order_ids(self, order_ids: Iterable[str]) -> Set[str]:
+        return await self._run(self._repo.get_approved_order_ids, order_ids)
+
+    async def add_approved_orders(self, orders: Iterable[Order]):
+        await self._run(self._repo.add_approved_orders, orders)
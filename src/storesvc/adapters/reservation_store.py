@@ -0,0 +1,38 @@
+import time
+from sqlalchemy import or_, select
+from typing import Iterable, List
+
+from storesvc.adapters import orm, serialization
+from storesvc.domain.reservation import Hold
+from storesvc.domain.value import Order
+
+
+class SqlAlchemyReservationStore:
+    """The holds of one `owner`, among those of every instance sharing the reservations table."""
+
+    def __init__(self, session, owner: str):
+        self.session = session
+        self.owner = owner
+
+    def save(self, holds: Iterable[Hold]):
+        """Replaces the owner's saved holds with `holds`. Also deletes the expired holds of any
+        owner, which instances that are gone would leave behind."""
+        self.session.execute(orm.reservations.delete().where(or_(
+            orm.reservations.c.owner == self.owner, orm.reservations.c.expires_at <= time.time()
+        )))
+        rows = [
+            dict(id=hold.reservation_id, owner=self.owner, order=serialization.dumps(hold.order),
+                 expires_at=hold.expires_at)
+            for hold in holds
+        ]
+        if rows:
+            self.session.execute(orm.reservations.insert(), rows)
+
+    def load(self) -> List[Hold]:
+        rows = self.session.execute(select([
+            orm.reservations.c.id, orm.reservations.c.order, orm.reservations.c.expires_at
+        ]).where(orm.reservations.c.owner == self.owner))
+        return [
+            Hold(reservation_id=id, order=serialization.loads(Order, order), expires_at=expires_at)
+            for id, order, expires_at in rows
+        ]
@@ -0,0 +1,33 @@
+import dataclasses
+import datetime
+import enum
+import json
+from typing import Type, TypeVar
+
+T = TypeVar('T')
+
+
+def dumps(obj) -> str:
+    """Serializes a (nested) dataclass to JSON."""
+    return json.dumps(dataclasses.asdict(obj), default=_to_json)
+
+
+def loads(cls: Type[T], payload: str) -> T:
+    """Rebuilds a dataclass of type `cls` from the output of `dumps`."""
+    return _from_dict(cls, json.loads(payload))
+
+
+def _to_json(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _from_dict(cls, data):
+    if dataclasses.is_dataclass(cls):
+        return cls(**{field.name: _from_dict(field.type, data[field.name]) for field in dataclasses.fields(cls)})
+    if cls is datetime.datetime:
+        return datetime.datetime.fromisoformat(data)
+    return data
@@ -1,4 +1,5 @@
 import os
+import socket
 
 
 def get_api_url():
@@ -15,7 +16,209 @@ def get_postgres_uri():
     return f"postgresql://{user}:{password}@{host}:{port}/{db_name}"
 
 
+def get_web_bind():
+    return os.environ.get('WEB_BIND', '0.0.0.0:80')
+
+
+def get_web_workers():
+    # Processes of the pre-fork server; each runs Python on one core at a time
+    return int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1))
+
+
+def get_web_worker_index():
+    # Set by the pre-fork master in each worker, from 0 to WEB_WORKERS - 1; a restarted worker keeps
+    # the index of the one it replaces. None outside of the pre-fork server
+    index = os.environ.get('WEB_WORKER_INDEX')
+    return int(index) if index else None
+
+
+def get_web_threads():
+    # Requests in flight per worker process; each holds a pooled connection while it uses the database,
+    # so workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) is the most connections the database sees
+    return int(os.environ.get('WEB_THREADS', 8))
+
+
+def get_web_graceful_timeout():
+    # Seconds a stopping worker has to finish its requests before it is killed
+    return float(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30.0))
+
+
+def get_db_pool_size():
+    return int(os.environ.get('DB_POOL_SIZE', 5))
+
+
+def get_db_max_overflow():
+    return int(os.environ.get('DB_MAX_OVERFLOW', 10))
+
+
+def get_db_pool_timeout():
+    return float(os.environ.get('DB_POOL_TIMEOUT', 30.0))
+
+
+def get_db_pool_recycle():
+    # Seconds after which a connection is replaced; -1 keeps connections forever
+    return int(os.environ.get('DB_POOL_RECYCLE', 1800))
+
+
+def get_db_pool_pre_ping():
+    return os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+
+
+def get_db_native_uuid():
+    # Store and item ids in Postgres uuid columns instead of CHAR(36): 16 bytes instead of 37, and
+    # smaller indexes; existing databases are converted with `python -m storesvc.entrypoints.migrate`
+    return os.environ.get('DB_NATIVE_UUID', 'false').lower() in ('1', 'true', 'yes')
+
+
+def get_db_slow_query_threshold():
+    # Seconds; statements taking longer are logged
+    return float(os.environ.get('DB_SLOW_QUERY_THRESHOLD', 0.5))
+
+
 def get_order_svc_url():
     host = os.environ.get('ORDER_SVC_HOST', 'localhost')
     port = 5006 if host == 'localhost' else 80
     return f'http://{host}:{port}'
+
+
+def get_order_svc_pool_size():
+    return int(os.environ.get('ORDER_SVC_POOL_SIZE', 10))
+
+
+def get_order_svc_timeout():
+    connect_timeout = float(os.environ.get('ORDER_SVC_CONNECT_TIMEOUT', 1.0))
+    read_timeout = float(os.environ.get('ORDER_SVC_READ_TIMEOUT', 3.0))
+    return connect_timeout, read_timeout
+
+
+def get_order_svc_page_size():
+    return int(os.environ.get('ORDER_SVC_PAGE_SIZE', 100))
+
+
+def get_items_cache_size():
+    return int(os.environ.get('ITEMS_CACHE_SIZE', 1024))
+
+
+def get_items_cache_ttl():
+    return float(os.environ.get('ITEMS_CACHE_TTL', 60.0))
+
+
+def get_approved_orders_cache_size():
+    # Recently approved order ids kept in memory in front of the processed_orders ledger
+    return int(os.environ.get('APPROVED_ORDERS_CACHE_SIZE', 10000))
+
+
+def get_approved_orders_cache_ttl():
+    return float(os.environ.get('APPROVED_ORDERS_CACHE_TTL', 3600.0))
+
+
+def get_approve_max_retries():
+    return int(os.environ.get('APPROVE_MAX_RETRIES', 3))
+
+
+def get_approve_retry_backoff():
+    return float(os.environ.get('APPROVE_RETRY_BACKOFF', 0.01))
+
+
+def get_approval_strategy():
+    # 'aggregate' loads the store and approves through the domain model,
+    # 'set_based' decrements stock with a single guarded UPDATE
+    return os.environ.get('APPROVAL_STRATEGY', 'aggregate')
+
+
+def get_approval_execution():
+    # 'direct' approves on the request thread, 'lanes' on per-store single-writer lanes
+    return os.environ.get('APPROVAL_EXECUTION', 'direct')
+
+
+def get_approval_lanes():
+    return int(os.environ.get('APPROVAL_LANES', 8))
+
+
+def get_approval_group_commit_size():
+    return int(os.environ.get('APPROVAL_GROUP_COMMIT_SIZE', 16))
+
+
+def get_approval_lane_timeout():
+    return float(os.environ.get('APPROVAL_LANE_TIMEOUT', 10.0))
+
+
+def get_outbox_enabled():
+    return os.environ.get('OUTBOX_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+
+def get_outbox_batch_size():
+    return int(os.environ.get('OUTBOX_BATCH_SIZE', 100))
+
+
+def get_outbox_poll_interval():
+    return float(os.environ.get('OUTBOX_POLL_INTERVAL', 1.0))
+
+
+def get_order_replica_enabled():
+    # Read orders from the local replica, and from the order service only for orders it has not seen yet
+    return os.environ.get('ORDER_REPLICA_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+
+def get_order_events_path():
+    # JSON lines file of order events, standing in for the order service's topic
+    return os.environ.get('ORDER_EVENTS_PATH')
+
+
+def get_order_replication_batch_size():
+    return int(os.environ.get('ORDER_REPLICATION_BATCH_SIZE', 500))
+
+
+def get_order_replication_poll_interval():
+    return float(os.environ.get('ORDER_REPLICATION_POLL_INTERVAL', 1.0))
+
+
+def get_messagebus_mode():
+    # 'sync' runs event handlers on the request thread, 'async' on a worker pool
+    return os.environ.get('MESSAGEBUS_MODE', 'sync')
+
+
+def get_messagebus_workers():
+    return int(os.environ.get('MESSAGEBUS_WORKERS', 4))
+
+
+def get_messagebus_queue_size():
+    return int(os.environ.get('MESSAGEBUS_QUEUE_SIZE', 1000))
+
+
+def get_messagebus_backpressure():
+    # 'block', 'drop' or 'reject' when the queue is full
+    return os.environ.get('MESSAGEBUS_BACKPRESSURE', 'block')
+
+
+def get_reservations_enabled():
+    # Reservations are held in the memory of the process: even when enabled, they are only taken while
+    # the web server runs a single process
+    return os.environ.get('RESERVATIONS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+
+def get_reservation_ttl():
+    return float(os.environ.get('RESERVATION_TTL', 600.0))
+
+
+def get_reservation_snapshots_enabled():
+    return os.environ.get('RESERVATION_SNAPSHOTS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+
+def get_reservation_snapshot_interval():
+    return float(os.environ.get('RESERVATION_SNAPSHOT_INTERVAL', 5.0))
+
+
+def get_reservation_owner():
+    # Name of the instance in the reservations table: it must be unique, and stay the same across restarts
+    return os.environ.get('RESERVATION_OWNER', socket.gethostname())
+
+
+def get_async_db_workers():
+    # Threads running the sessions of the ASGI entrypoint; more than the pool can hand out would only wait
+    return int(os.environ.get('ASYNC_DB_WORKERS', get_db_pool_size() + get_db_max_overflow()))
+
+
+def get_catalog_import_chunk_size():
+    # Items written and committed per transaction by a bulk catalog import
+    return int(os.environ.get('CATALOG_IMPORT_CHUNK_SIZE', 5000))
@@ -9,3 +9,15 @@ class Event:
 @dataclass
 class ApprovedOrder(Event):
     order: Order
+
+
+@dataclass
+class OrderCreated(Event):
+    """Published by the order service when an order is placed."""
+    order: Order
+
+
+@dataclass
+class OrderUpdated(Event):
+    """Published by the order service when an order changes, e.g. its status."""
+    order: Order
@@ -1,5 +1,6 @@
 from __future__ import annotations
-from typing import List
+from collections import Counter
+from typing import Dict, List, Mapping, Optional
 from uuid import uuid4
 
 from storesvc.domain import events
@@ -18,6 +19,15 @@ class InvalidOrder(CannotApprove):
     pass
 
 
+def count_order_lines(order: Order) -> Dict[str, int]:
+    """Returns how many of each item the order asks for, if the order can be approved at all."""
+    if order.order_status != OrderStatus.PUBLISHED.value:
+        raise InvalidOrder(
+            f'The order cannot be approved : the order status is {order.order_status}'
+        )
+    return Counter(order.item_ids)
+
+
 class Item:
     def __init__(self, name: str, price: float, quantity: int, id: uuid4 = None):
         self.id = str(id) if id else str(uuid4())
@@ -39,6 +49,7 @@ class Store:
         self.id = str(id) if id else str(uuid4())
         self.name = name
         self._items: List[Item] = list()
+        self._item_index: Optional[Dict[str, Item]] = dict()
         self.version_number = version_number
         self.events = []  # type: List[events.Event]
 
@@ -50,53 +61,64 @@ class Store:
     def __hash__(self):
         return hash(self.id)
 
+    @property
+    def item_index(self) -> Dict[str, Item]:
+        # Built lazily: stores loaded by the ORM start with no index (see orm.receive_load)
+        # so that `_items` is only hydrated when an item is actually looked up.
+        if self._item_index is None:
+            self._item_index = {item.id: item for item in self._items}
+        return self._item_index
+
     def add_item(self, item: Item) -> uuid4:
         self._items.append(item)
+        if self._item_index is not None:
+            self._item_index[item.id] = item
+        self.version_number += 1
         return item.id
 
     def delete_item(self, item: Item) -> Item:
         self._items.remove(item)
+        if self._item_index is not None:
+            self._item_index.pop(item.id, None)
+        self.version_number += 1
         return item
 
     def list_items(self) -> List[Item]:
         return self._items
 
     def get_item(self, item_id: uuid4) -> Item:
-        try:
-            item = next(item for item in self._items if item.id == item_id)
-            return item
-        except StopIteration:
-            return None
+        return self.item_index.get(str(item_id))
 
     def set_item_quantity(self, item_id: uuid4, quantity: int):
         item = self.get_item(item_id)
         if item:
             item.quantity = quantity
+            self.version_number += 1
 
-    def approve(self, order: Order):
+    def approve(self, order: Order, held: Mapping[str, int] = None):
+        """Takes the ordered items out of stock. `held` are the quantities of items, by id, that
+        reservations hold: they are not available to the order."""
         if self.id != order.store_id:
             raise InvalidOrder(
                 f'store id is not matched : store_id of the order({order.order_id}) is {order.store_id} '
                 f'but current store_id is {self.id}'
             )
 
-        if order.order_status != OrderStatus.PUBLISHED.value:
-            raise InvalidOrder(
-                f'The order cannot be approved : the order status is {order.order_status}'
-            )
-
-        item_ids = set(order.item_ids)
-        ordered_counts = {item_id: order.item_ids.count(item_id) for item_id in item_ids}
+        ordered_counts = count_order_lines(order)
 
+        # Check every line before touching any quantity so a rejected order leaves the store unchanged
+        ordered_items = []
         for item_id, ordered_count in ordered_counts.items():
             if item := self.get_item(item_id):
-                if item.quantity < ordered_count:
+                if item.quantity - (held.get(item_id, 0) if held else 0) < ordered_count:
                     raise OutOfStock(
                         f'Out of stock for store_id {self.id}, item {item.id}, order_id {order.order_id}'
                     )
-                else:
-                    item.quantity -= ordered_count
-                    self.events.append(events.ApprovedOrder(order=order))
+                ordered_items.append((item, ordered_count))
             else:
                 raise InvalidOrder(f'item does not exist : item_id of the order({order.order_id}) is {item_id}')
+
+        for item, ordered_count in ordered_items:
+            item.quantity -= ordered_count
+        self.events.append(events.ApprovedOrder(order=order))
         self.version_number += 1
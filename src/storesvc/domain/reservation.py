@@ -0,0 +1,160 @@
+from __future__ import annotations
+import heapq
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Collection, Dict, Iterable, List, Tuple
+from uuid import uuid4
+
+from storesvc.domain.model import Store, InvalidOrder, OutOfStock, count_order_lines
+from storesvc.domain.value import Order
+
+
+class InvalidReservation(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Hold:
+    reservation_id: str
+    order: Order
+    expires_at: float
+
+
+class ReservationBook:
+    """Stock held for orders that are not approved yet, released automatically after a TTL.
+
+    Held quantities are kept per (store id, item id), so checking whether a line can be held
+    is a dict lookup against the item's quantity. Expiry is a min-heap on expiry time: holds
+    released or confirmed before they expire are skipped when they reach the top. An order
+    has one hold at most.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._holds = {}  # type: Dict[str, Hold]
+        # Reservation id of each held order, by order id
+        self._order_holds = {}  # type: Dict[str, str]
+        self._held = {}  # type: Dict[Tuple[str, str], int]
+        self._expiry = []  # type: List[Tuple[float, str]]
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._holds)
+
+    def held(self, store_id: str, item_id: str) -> int:
+        return self._held.get((store_id, item_id), 0)
+
+    def held_counts(self, store_id: str, item_ids: Iterable[str], excluding: Collection[str] = ()) -> Dict[str, int]:
+        """Quantities of the items held by reservations that have not expired, leaving out those with none.
+        The holds of the orders in `excluding`, by order id, are not counted."""
+        with self._lock:
+            self.expire()
+            counts = {
+                item_id: self._held[(store_id, item_id)] for item_id in item_ids if (store_id, item_id) in self._held
+            }
+            for order_id in excluding:
+                if order_id not in self._order_holds:
+                    continue
+                hold = self._holds[self._order_holds[order_id]]
+                if hold.order.store_id != store_id:
+                    continue
+                for item_id, ordered_count in count_order_lines(hold.order).items():
+                    if item_id in counts:
+                        counts[item_id] -= ordered_count
+                        if not counts[item_id]:
+                            del counts[item_id]
+            return counts
+
+    def reserve(self, store: Store, order: Order, ttl: float) -> Hold:
+        """Holds the ordered items of the store, which must be loaded with at least those items.
+        Returns the hold the order has already, if it has one."""
+        if store.id != order.store_id:
+            raise InvalidOrder(
+                f'store id is not matched : store_id of the order({order.order_id}) is {order.store_id} '
+                f'but current store_id is {store.id}'
+            )
+        ordered_counts = count_order_lines(order)
+        with self._lock:
+            self.expire()
+            if order.order_id in self._order_holds:
+                return self._holds[self._order_holds[order.order_id]]
+            for item_id, ordered_count in ordered_counts.items():
+                item = store.get_item(item_id)
+                if item is None:
+                    raise InvalidOrder(f'item does not exist : item_id of the order({order.order_id}) is {item_id}')
+                if item.quantity - self.held(store.id, item_id) < ordered_count:
+                    raise OutOfStock(
+                        f'Out of stock for store_id {store.id}, item {item_id}, order_id {order.order_id}'
+                    )
+            hold = Hold(reservation_id=str(uuid4()), order=order, expires_at=self._clock() + ttl)
+            self._add(hold)
+            return hold
+
+    def get(self, reservation_id: str) -> Hold:
+        with self._lock:
+            self.expire()
+            try:
+                return self._holds[reservation_id]
+            except KeyError:
+                raise InvalidReservation(f'Invalid or expired reservation id {reservation_id}')
+
+    def release(self, reservation_id: str) -> Hold:
+        with self._lock:
+            hold = self.get(reservation_id)
+            self._remove(hold)
+            return hold
+
+    def release_orders(self, order_ids: Collection[str]) -> List[Hold]:
+        """Releases the holds of the orders that have one, and returns them."""
+        with self._lock:
+            self.expire()
+            holds = [
+                self._holds[self._order_holds[order_id]] for order_id in order_ids if order_id in self._order_holds
+            ]
+            for hold in holds:
+                self._remove(hold)
+            return holds
+
+    def expire(self) -> List[Hold]:
+        """Releases the holds whose TTL has passed and returns them."""
+        expired = []
+        with self._lock:
+            now = self._clock()
+            while self._expiry and self._expiry[0][0] <= now:
+                _, reservation_id = heapq.heappop(self._expiry)
+                hold = self._holds.get(reservation_id)
+                if hold is not None and hold.expires_at <= now:
+                    self._remove(hold)
+                    expired.append(hold)
+        return expired
+
+    def holds(self) -> List[Hold]:
+        with self._lock:
+            return list(self._holds.values())
+
+    def restore(self, holds: Iterable[Hold]):
+        with self._lock:
+            for hold in holds:
+                if hold.reservation_id not in self._holds and hold.order.order_id not in self._order_holds:
+                    self._add(hold)
+            self.expire()
+
+    def _add(self, hold: Hold):
+        self._holds[hold.reservation_id] = hold
+        self._order_holds[hold.order.order_id] = hold.reservation_id
+        for item_id, ordered_count in count_order_lines(hold.order).items():
+            key = (hold.order.store_id, item_id)
+            self._held[key] = self._held.get(key, 0) + ordered_count
+        heapq.heappush(self._expiry, (hold.expires_at, hold.reservation_id))
+
+    def _remove(self, hold: Hold):
+        del self._holds[hold.reservation_id]
+        del self._order_holds[hold.order.order_id]
+        for item_id, ordered_count in count_order_lines(hold.order).items():
+            key = (hold.order.store_id, item_id)
+            remaining = self._held[key] - ordered_count
+            if remaining:
+                self._held[key] = remaining
+            else:
+                del self._held[key]
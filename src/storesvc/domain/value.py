@@ -1,7 +1,7 @@
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
-from typing import List
+from typing import Tuple
 
 
 class OrderStatus(Enum):
@@ -13,9 +13,23 @@ class OrderStatus(Enum):
 
 @dataclass(frozen=True)
 class Order:
+    __slots__ = ('order_id', 'order_datetime', 'customer_phone', 'store_id', 'item_ids', 'order_status')
+
     order_id: str
     order_datetime: datetime
     customer_phone: str
     store_id: str
-    item_ids: List[str]
-    order_status: OrderStatus
\ No newline at end of file
+    item_ids: Tuple[str, ...]
+    order_status: OrderStatus
+
+    def __post_init__(self):
+        # A tuple is smaller than a list and keeps the order immutable
+        object.__setattr__(self, 'item_ids', tuple(self.item_ids))
+
+    # Without a __dict__, pickle and copy set the slots one by one, which a frozen dataclass refuses
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            object.__setattr__(self, name, value)
@@ -0,0 +1,128 @@
+"""ASGI entrypoint, an alternative to flask_app for serving approvals from one event loop.
+
+Approvals wait on the order service and on the database without holding a thread each, so a
+single process keeps as many in flight as the order service and database pools allow.
+Run it with any ASGI server, e.g. `uvicorn storesvc.entrypoints.asgi_app:app`.
+"""
+import json
+import logging
+import re
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from storesvc.adapters import orm, provider, repository
+from storesvc.domain import model, value
+from storesvc.service_layer import services, unit_of_work
+
+logger = logging.getLogger(__name__)
+
+Scope = Dict
+Receive = Callable[[], Awaitable[Dict]]
+Send = Callable[[Dict], Awaitable[None]]
+Response = Tuple[int, Dict]
+
+UUID_PATTERN = r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'
+
+
+class InvalidBody(Exception):
+    pass
+
+
+class StoreSvcApp:
+    def __init__(
+            self,
+            uow_factory: Callable[[], unit_of_work.AbstractAsyncUnitOfWork] = unit_of_work.AsyncSqlAlchemyUnitOfWork,
+            order_provider: provider.AbstractAsyncOrderProvider = None,
+    ):
+        self.uow_factory = uow_factory
+        self.order_provider = order_provider or provider.ExecutorOrderProvider()
+        self.routes = [
+            ('GET', re.compile(rf'^/stores/(?P<store_id>{UUID_PATTERN})/items$'), self.list_items),
+            ('POST', re.compile(rf'^/stores/(?P<store_id>{UUID_PATTERN})/orders$'), self.handle_orders),
+        ]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            status, body = await self.dispatch(scope, receive)
+            await send({
+                'type': 'http.response.start',
+                'status': status,
+                'headers': [(b'content-type', b'application/json')],
+            })
+            await send({'type': 'http.response.body', 'body': json.dumps(body).encode()})
+
+    async def lifespan(self, receive: Receive, send: Send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                orm.start_mappers()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def dispatch(self, scope: Scope, receive: Receive) -> Response:
+        for method, pattern, handler in self.routes:
+            match = pattern.match(scope['path'])
+            if match is None:
+                continue
+            if scope['method'] != method:
+                return 405, {'message': 'Method not allowed'}
+            try:
+                return await handler(await read_json(receive), **match.groupdict())
+            except InvalidBody as e:
+                return 400, {'message': str(e)}
+            except Exception:
+                logger.exception('Failed to handle %s %s', scope['method'], scope['path'])
+                return 500, {'message': 'Internal server error'}
+        return 404, {'message': 'Not found'}
+
+    async def list_items(self, body: Optional[Dict], store_id: str) -> Response:
+        async with self.uow_factory() as uow:
+            try:
+                store = await uow.stores.get(store_id)
+            except repository.InvalidStoreId as e:
+                return 404, {'message': str(e)}
+            return 200, {
+                'storeId': store.id,
+                'storeName': store.name,
+                'items': [
+                    {'id': item.id, 'name': item.name, 'price': item.price, 'quantity': item.quantity}
+                    for item in store.list_items()
+                ]
+            }
+
+    async def handle_orders(self, body: Optional[Dict], store_id: str) -> Response:
+        # Todo: Check Authorization
+        # ex) store_id in user.store_ids
+        if not isinstance(body, dict) or 'order_id' not in body or 'order_status' not in body:
+            raise InvalidBody('The body must be a JSON object with order_id and order_status')
+        order_id = body['order_id']
+        order_status = body['order_status']
+        if order_status == value.OrderStatus.APPROVED.value:
+            try:
+                await services.approve_order_async(order_id, self.uow_factory(), self.order_provider)
+            except (model.OutOfStock, model.InvalidOrder, provider.InvalidOrderId, repository.InvalidStoreId) as e:
+                return 400, {'message': str(e)}
+            return 200, {'result': 'success'}
+        return 400, {'message': f'Unsupported order status {order_status}'}
+
+
+async def read_json(receive: Receive) -> Optional[Dict]:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            break
+    body = b''.join(chunks)
+    if not body:
+        return None
+    try:
+        return json.loads(body)
+    except ValueError as e:
+        raise InvalidBody(f'The body is not valid JSON: {e}') from e
+
+
+app = StoreSvcApp()
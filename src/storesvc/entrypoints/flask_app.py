@@ -1,45 +1,342 @@
-from flask import Flask, jsonify, request
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+"""Flask entrypoint. `flask run` finds create_app; WSGI servers call it, e.g.
+`gunicorn 'storesvc.entrypoints.flask_app:create_app()'`, and so does the pre-fork server of
+`python -m storesvc.entrypoints.prefork` in each of its worker processes.
+
+Importing this module only defines the app: create_app() maps the model and starts the
+background workers, and the database engine is created by the first request that needs it.
+The workers are the app's own: app.extensions['storesvc'].close() stops them, and so does the
+exit of the process.
+
+Everything else create_app makes is the process's own as well, e.g. reservations and metrics.
+See the prefork module for what that means with several worker processes. Reservations are
+only taken while the WSGI server reports a single process, e.g. not from gunicorn with more
+than one worker (wsgi.multiprocess); other servers must run the order replicator in one of
+their processes only.
+"""
+import concurrent.futures
+import functools
+import io
+import json
+import logging
+import time
+import weakref
+from typing import Callable, Iterator, List, Optional, Sequence
+from flask import Blueprint, Flask, current_app, g, jsonify, request
+from sqlalchemy.orm import Session
 
 import storesvc.domain.value
-from storesvc import config
-from storesvc.domain import model
-from storesvc.adapters import orm, repository, provider
-from storesvc.service_layer import services
+from storesvc import config, metrics
+from storesvc.domain import model, reservation
+from storesvc.adapters import cache, catalog, db, order_events, order_replica, orm, repository, provider
+from storesvc.service_layer import (
+    lanes, messagebus, order_replication, reservation_snapshots, services, unit_of_work
+)
+
+logger = logging.getLogger(__name__)
+
+api = Blueprint('api', __name__)
+
+
+class StoreSvc:
+    """What the endpoints of one app share, kept in app.extensions['storesvc'] by create_app."""
+
+    def __init__(
+            self, session_factory: Callable[[], Session], order_provider: provider.AbstractOrderProvider,
+            items_cache: cache.LRUCache, reservation_book: Optional[reservation.ReservationBook],
+            approval_lanes: lanes.ApprovalLanes = None, stoppers: Sequence[Callable[[], None]] = (),
+    ):
+        self.session_factory = session_factory
+        self.order_provider = order_provider
+        self.items_cache = items_cache
+        self.reservation_book = reservation_book
+        self.approval_lanes = approval_lanes
+        # Stop the background workers started for the app, in the order they were started
+        self._stoppers = list(stoppers)
+
+    def close(self):
+        """Stops the app's background workers, the last started first. Called at exit, or when
+        the app is garbage collected; calling it again does nothing."""
+        stoppers, self._stoppers = self._stoppers, []
+        for stop in reversed(stoppers):
+            try:
+                stop()
+            except Exception:
+                logger.exception('Failed to stop %s', stop)
+
+
+def create_app(
+        session_factory: Callable[[], Session] = None, order_provider: provider.AbstractOrderProvider = None
+) -> Flask:
+    worker_index = config.get_web_worker_index()
+    # One of the processes of the pre-fork server, not the only one
+    prefork_workers = worker_index is not None and config.get_web_workers() > 1
+    orm.start_mappers()
+    session_factory = session_factory or unit_of_work.new_session
+    order_provider = order_provider or provider.OrderSvcProvider()
+    stoppers = []  # type: List[Callable[[], None]]
+    if config.get_order_replica_enabled():
+        order_provider = order_replica.ReplicaOrderProvider(session_factory, order_provider)
+        # One replicator for the whole pre-fork server: they would all move the same position
+        if config.get_order_events_path() and worker_index in (None, 0):
+            order_replicator = order_replication.OrderReplicator(
+                order_events.FileOrderEventSource(config.get_order_events_path()), session_factory
+            )
+            order_replicator.start()
+            stoppers.append(order_replicator.stop)
+
+    if config.get_messagebus_mode() == 'async':
+        dispatcher = messagebus.start_async_dispatch(
+            workers=config.get_messagebus_workers(),
+            queue_size=config.get_messagebus_queue_size(),
+            backpressure=messagebus.Backpressure(config.get_messagebus_backpressure()),
+        )
+        stoppers.append(functools.partial(messagebus.stop_async_dispatch, dispatcher=dispatcher))
+
+    reservation_book = None  # type: Optional[reservation.ReservationBook]
+    if config.get_reservations_enabled() and not prefork_workers:
+        reservation_book = reservation.ReservationBook()
+    approval_lanes = None  # type: Optional[lanes.ApprovalLanes]
+    if config.get_approval_execution() == 'lanes':
+        approval_lanes = lanes.ApprovalLanes(
+            lambda: unit_of_work.SqlAlchemyUnitOfWork(session_factory), order_provider,
+            lanes=config.get_approval_lanes(),
+            group_commit_size=config.get_approval_group_commit_size(),
+            book=reservation_book,
+        )
+        approval_lanes.start()
+        stoppers.append(approval_lanes.shutdown)
+
+    if reservation_book is not None and config.get_reservation_snapshots_enabled():
+        snapshotter = reservation_snapshots.ReservationSnapshotter(reservation_book, session_factory)
+        snapshotter.start()
+        stoppers.append(snapshotter.stop)
+
+    app = Flask(__name__)
+    app.extensions['storesvc'] = StoreSvc(
+        session_factory, order_provider,
+        cache.LRUCache(maxsize=config.get_items_cache_size(), ttl=config.get_items_cache_ttl()),
+        reservation_book, approval_lanes, stoppers,
+    )
+    # Runs at exit too, unless the app was collected before: workers do not outlive their app
+    weakref.finalize(app, app.extensions['storesvc'].close)
+    app.register_blueprint(api)
+    app.before_request(start_request_timer)
+    app.after_request(keep_response_status)
+    app.teardown_request(record_request_metrics)
+    app.teardown_request(stop_query_tracking)
+    app.teardown_appcontext(close_session)
+    return app
+
+
+def state() -> StoreSvc:
+    return current_app.extensions['storesvc']
+
+
+def get_session() -> Session:
+    """Session for reads in the current request; it is closed when the request ends."""
+    if 'session' not in g:
+        g.session = state().session_factory()
+    return g.session
+
 
-orm.start_mappers()
-get_session = sessionmaker(bind=create_engine(config.get_postgres_uri()))
-app = Flask(__name__)
+def close_session(exception=None):
+    session = g.pop('session', None)
+    if session is not None:
+        session.close()
 
 
-@app.route('/stores/<uuid:store_id>/items', methods=['GET'])
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.queries, g.queries_token = db.start_tracking()
+
+
+def keep_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+
+def stop_query_tracking(exception=None):
+    # Also after an unhandled exception, or the worker thread would keep counting for the next requests
+    token = g.pop('queries_token', None)
+    if token is not None:
+        db.stop_tracking(token)
+
+
+def record_request_metrics(exception=None):
+    # A teardown, so that requests failing with an unhandled exception are counted, as 500s
+    if 'request_start' not in g:
+        return
+    # The view's name, without the blueprint's
+    endpoint = request.endpoint.rpartition('.')[2] if request.endpoint else 'unmatched'
+    status = 500 if exception is not None else g.get('response_status', 500)
+    metrics.HTTP_REQUESTS.inc(endpoint, str(status))
+    metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint)
+    metrics.HTTP_REQUEST_DB_STATEMENTS.observe(g.queries.statements, endpoint)
+
+
+@api.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """The metrics of this process: with several worker processes, of the worker that answers."""
+    return current_app.response_class(metrics.REGISTRY.render(), status=200, mimetype='text/plain; version=0.0.4')
+
+
+@api.route('/_status/db-pool', methods=['GET'])
+def db_pool_status_endpoint():
+    return jsonify(db.pool_stats(get_session().get_bind())), 200
+
+
+# Query parameters that select a streamed page of items instead of the cached full listing
+ITEM_PAGE_PARAMS = ('fields', 'limit', 'cursor', 'in_stock')
+# Items serialized per chunk of a streamed response
+ITEM_STREAM_CHUNK = 500
+
+
+@api.route('/stores/<uuid:store_id>/items', methods=['GET'])
 def list_items_endpoint(store_id):
-    session = get_session()
-    repo = repository.SqlAlchemyRepository(session)
+    if any(param in request.args for param in ITEM_PAGE_PARAMS):
+        return list_item_page(str(store_id))
+
+    repo = repository.SqlAlchemyRepository(get_session())
     try:
-        store = repo.get(str(store_id))
+        version_number = repo.get_version_number(str(store_id))
     except repository.InvalidStoreId as e:
-        response = {'message': str(e)}
-        status_code = 404
-    else:
+        return jsonify({'message': str(e)}), 404
+
+    # A store's version number changes with every change to its catalog, so it identifies the payload
+    etag = f'{store_id}-{version_number}'
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    payload = state().items_cache.get((str(store_id), version_number))
+    if payload is None:
+        store = repo.get(str(store_id))
         items = store.list_items()
-        response = {
+        payload = jsonify({
             'storeId': store.id,
             'storeName': store.name,
             'items': [
                 {'id': item.id, 'name': item.name, 'price': item.price, 'quantity': item.quantity} for item in items
             ]
-        }
-        status_code = 200
-    return jsonify(response), status_code
+        }).get_data()
+        version_number = store.version_number
+        etag = f'{store_id}-{version_number}'
+        state().items_cache.set((str(store_id), version_number), payload)
+    response = current_app.response_class(payload, status=200, mimetype='application/json')
+    response.set_etag(etag)
+    return response
 
 
-@app.route('/stores/<uuid:store_id>/orders', methods=['POST'])
+def list_item_page(store_id: str):
+    """Items of the store in id order, from `cursor` on, with only `fields`, streamed as they are read.
+
+    `?limit=` bounds the page; the response's nextCursor is then the cursor of the next page,
+    or null on the last one. `?in_stock=true` leaves out items with no quantity left.
+    """
+    fields = request.args.get('fields', ','.join(repository.ITEM_FIELDS)).split(',')
+    unknown = set(fields) - set(repository.ITEM_FIELDS)
+    if unknown:
+        return jsonify({'message': f'Unknown fields {sorted(unknown)}'}), 400
+    try:
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+    except ValueError:
+        limit = 0
+    if limit is not None and limit < 1:
+        return jsonify({'message': 'limit must be a positive integer'}), 400
+    cursor = request.args.get('cursor')
+    in_stock = request.args.get('in_stock', 'false').lower() in ('1', 'true', 'yes')
+
+    repo = repository.SqlAlchemyRepository(get_session())
+    try:
+        store_name, version_number = repo.get_name_and_version_number(store_id)
+    except repository.InvalidStoreId as e:
+        return jsonify({'message': str(e)}), 404
+    etag = f'{store_id}-{version_number}'
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    response = current_app.response_class(
+        stream_item_page(state().session_factory, store_id, store_name, fields, cursor, limit, in_stock),
+        status=200,
+        mimetype='application/json',
+    )
+    response.set_etag(etag)
+    return response
+
+
+def stream_item_page(
+        session_factory: Callable[[], Session], store_id: str, store_name: str, fields: Sequence[str],
+        cursor: Optional[str], limit: Optional[int], in_stock: bool,
+) -> Iterator[str]:
+    # The body is written after the request's session is closed, so it reads from its own
+    session = session_factory()
+    try:
+        columns = list(fields) if 'id' in fields else ['id'] + list(fields)
+        id_index = columns.index('id')
+        projection = [columns.index(field) for field in fields]
+        rows = repository.SqlAlchemyRepository(session).iter_item_rows(
+            store_id, columns, after=cursor, limit=limit + 1 if limit else None, in_stock=in_stock,
+            batch_size=ITEM_STREAM_CHUNK,
+        )
+        yield f'{{"storeId": {json.dumps(store_id)}, "storeName": {json.dumps(store_name)}, "items": ['
+        count, last_id, next_cursor = 0, None, None
+        chunk = []
+        for row in rows:
+            if count == limit:
+                # One row more than the page: there is a next page, starting after the last item sent
+                next_cursor = last_id
+                break
+            chunk.append(json.dumps({field: row[index] for field, index in zip(fields, projection)}))
+            last_id = row[id_index]
+            count += 1
+            if len(chunk) == ITEM_STREAM_CHUNK:
+                yield (',' if count > len(chunk) else '') + ','.join(chunk)
+                chunk = []
+        if chunk:
+            yield (',' if count > len(chunk) else '') + ','.join(chunk)
+        yield f'], "nextCursor": {json.dumps(next_cursor)}}}'
+    finally:
+        session.close()
+
+
+@api.route('/stores/<uuid:store_id>/items/import', methods=['POST'])
+def import_catalog_endpoint(store_id):
+    """Bulk adds the items of a CSV or JSON lines body, read as it is uploaded."""
+    reader = catalog.READERS.get(request.mimetype)
+    if reader is None:
+        return jsonify({
+            'message': f'Unsupported content type {request.mimetype}, use one of {list(catalog.READERS)}'
+        }), 415
+
+    imported = 0
+
+    def progress(count: int):
+        nonlocal imported
+        imported = count
+        logger.info('Imported %d items to store %s', count, store_id)
+
+    # newline='': the csv module reads the line breaks of quoted fields itself
+    lines = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    try:
+        services.import_catalog(
+            str(store_id), reader(lines), unit_of_work.SqlAlchemyUnitOfWork(state().session_factory), progress=progress
+        )
+    except repository.InvalidStoreId as e:
+        return jsonify({'message': str(e)}), 404
+    except (catalog.InvalidCatalog, repository.InvalidItem) as e:
+        # The chunks before the invalid line are committed
+        return jsonify({'message': str(e), 'imported': imported}), 400
+    except repository.DuplicateItem as e:
+        return jsonify({'message': str(e), 'imported': imported}), 409
+    return jsonify({'imported': imported}), 200
+
+
+@api.route('/stores/<uuid:store_id>/orders', methods=['POST'])
 def handle_orders_endpoint(store_id):
-    session = get_session()
-    repo = repository.SqlAlchemyRepository(session)
-    order_provider = provider.OrderSvcProvider()
+    uow = unit_of_work.SqlAlchemyUnitOfWork(state().session_factory)
 
     # Todo: Check Authorization
     # ex) store_id in user.store_ids
@@ -47,9 +344,18 @@ def handle_orders_endpoint(store_id):
     order_status = request.json['order_status']
     if order_status == storesvc.domain.value.OrderStatus.APPROVED.value:
         try:
-            services.approve_order(order_id, repo, order_provider, session)
-        except (model.OutOfStock, model.InvalidOrder) as e:
+            approval_lanes = state().approval_lanes
+            if approval_lanes:
+                approval_lanes.approve(str(store_id), order_id, timeout=config.get_approval_lane_timeout())
+            else:
+                services.approve_order(order_id, uow, state().order_provider, state().reservation_book)
+        except (model.OutOfStock, model.InvalidOrder, provider.InvalidOrderId, repository.InvalidStoreId) as e:
             return jsonify({'message': str(e)}), 400
+        except concurrent.futures.TimeoutError:
+            # Cancelled if still queued, else it may yet commit: a retry is answered either way
+            response = jsonify({'message': f'Approval of order {order_id} timed out, retry later'})
+            response.headers['Retry-After'] = '1'
+            return response, 503
         return jsonify({'result': 'success'}), 200
     elif order_status == storesvc.domain.value.OrderStatus.CANCELED.value:
         # Todo : Publish CancelOrderByStore Event
@@ -57,3 +363,80 @@ def handle_orders_endpoint(store_id):
     elif order_status == storesvc.domain.value.OrderStatus.COMPLETED.value:
         # Todo : Publish CompleteOrder Event
         pass
+
+
+@api.route('/stores/<uuid:store_id>/orders/bulk', methods=['POST'])
+def handle_bulk_orders_endpoint(store_id):
+    uow = unit_of_work.SqlAlchemyUnitOfWork(state().session_factory)
+
+    # Todo: Check Authorization
+    # ex) store_id in user.store_ids
+    order_ids = request.json['order_ids']
+    results = services.approve_orders(
+        order_ids, uow, state().order_provider, store_ids=dict.fromkeys(order_ids, str(store_id)),
+        book=state().reservation_book,
+    )
+    response = []
+    for order_id, error in results.items():
+        if error is None:
+            response.append({'order_id': order_id, 'result': 'success'})
+        else:
+            response.append({'order_id': order_id, 'result': type(error).__name__, 'message': str(error)})
+    return jsonify({'results': response}), 200
+
+
+def reservations_unavailable():
+    """The answer to reservation requests this process cannot take, or None if it can."""
+    if state().reservation_book is None:
+        return jsonify({'message': 'Reservations are disabled'}), 404
+    if request.environ.get('wsgi.multiprocess'):
+        # The reservation would be held in this process only, and not found by the others
+        return jsonify({'message': 'Reservations are disabled when the service runs as several processes'}), 404
+    return None
+
+
+@api.route('/stores/<uuid:store_id>/reservations', methods=['POST'])
+def reserve_order_endpoint(store_id):
+    unavailable = reservations_unavailable()
+    if unavailable:
+        return unavailable
+    uow = unit_of_work.SqlAlchemyUnitOfWork(state().session_factory)
+
+    # Todo: Check Authorization
+    # ex) store_id in user.store_ids
+    order_id = request.json['order_id']
+    try:
+        hold = services.reserve_order(
+            order_id, uow, state().order_provider, state().reservation_book, ttl=request.json.get('ttl'),
+            store_id=str(store_id),
+        )
+    except (model.OutOfStock, model.InvalidOrder, provider.InvalidOrderId, repository.InvalidStoreId) as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({'reservation_id': hold.reservation_id, 'expires_at': hold.expires_at}), 201
+
+
+@api.route('/reservations/<uuid:reservation_id>/confirm', methods=['POST'])
+def confirm_reservation_endpoint(reservation_id):
+    unavailable = reservations_unavailable()
+    if unavailable:
+        return unavailable
+    uow = unit_of_work.SqlAlchemyUnitOfWork(state().session_factory)
+    try:
+        services.confirm_reservation(str(reservation_id), uow, state().reservation_book)
+    except reservation.InvalidReservation as e:
+        return jsonify({'message': str(e)}), 404
+    except (model.OutOfStock, model.InvalidOrder, repository.InvalidStoreId) as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({'result': 'success'}), 200
+
+
+@api.route('/reservations/<uuid:reservation_id>', methods=['DELETE'])
+def release_reservation_endpoint(reservation_id):
+    unavailable = reservations_unavailable()
+    if unavailable:
+        return unavailable
+    try:
+        services.release_reservation(str(reservation_id), state().reservation_book)
+    except reservation.InvalidReservation as e:
+        return jsonify({'message': str(e)}), 404
+    return '', 204
@@ -0,0 +1,50 @@
+"""Bulk imports a catalog file into a store: python -m storesvc.entrypoints.import_catalog STORE_ID FILE"""
+import argparse
+import logging
+import sys
+import time
+
+from storesvc.adapters import catalog, orm, repository
+from storesvc.domain import model
+from storesvc.service_layer import services, unit_of_work
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk import items from a CSV or JSON lines file into a store.')
+    parser.add_argument('store_id')
+    parser.add_argument('path', help='catalog file; .csv is read as CSV, anything else as JSON lines')
+    parser.add_argument('--store-name', help='create the store with this name if it does not exist')
+    parser.add_argument('--chunk-size', type=int, help='items per transaction (CATALOG_IMPORT_CHUNK_SIZE)')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    orm.start_mappers()
+
+    if args.store_name:
+        with unit_of_work.SqlAlchemyUnitOfWork() as uow:
+            try:
+                uow.stores.get_version_number(args.store_id)
+            except repository.InvalidStoreId:
+                uow.stores.new(model.Store(id=args.store_id, name=args.store_name))
+                uow.commit()
+
+    reader = catalog.read_csv if args.path.endswith('.csv') else catalog.read_json_lines
+    start = time.perf_counter()
+
+    def progress(count: int):
+        elapsed = time.perf_counter() - start
+        print(f'{count} items imported in {elapsed:.1f}s ({count / elapsed:.0f} items/s)', file=sys.stderr)
+
+    with open(args.path, encoding='utf-8', newline='') as lines:
+        try:
+            imported = services.import_catalog(
+                args.store_id, reader(lines), unit_of_work.SqlAlchemyUnitOfWork(), args.chunk_size, progress
+            )
+        except (catalog.InvalidCatalog, repository.InvalidStoreId) as e:
+            print(f'Import failed: {e}', file=sys.stderr)
+            return 1
+    print(f'Imported {imported} items to store {args.store_id}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,33 @@
+"""Upgrades the database schema: python -m storesvc.entrypoints.migrate [--native-uuid]"""
+import argparse
+import logging
+import sys
+
+from storesvc import config
+from storesvc.adapters import db, migrations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Create missing tables and indexes, and convert ids to uuid.')
+    parser.add_argument('--uri', help='database to upgrade; the DB_HOST database by default')
+    parser.add_argument(
+        '--native-uuid', action='store_true', default=config.get_db_native_uuid(),
+        help='convert the ids of stores and items to Postgres uuid columns (DB_NATIVE_UUID)',
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    engine = db.create_engine(args.uri)
+    try:
+        with engine.begin() as connection:
+            migrations.upgrade(connection, native_uuid=args.native_uuid)
+    except ValueError as e:
+        print(f'Upgrade failed: {e}', file=sys.stderr)
+        return 1
+    finally:
+        engine.dispose()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
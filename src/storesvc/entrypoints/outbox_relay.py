@@ -0,0 +1,18 @@
+import logging
+import signal
+
+from storesvc.service_layer.outbox_relay import OutboxRelay
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    relay = OutboxRelay()
+    signal.signal(signal.SIGTERM, lambda *_: relay.stop())
+    try:
+        relay.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
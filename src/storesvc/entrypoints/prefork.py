@@ -0,0 +1,233 @@
+"""Pre-fork entrypoint serving the Flask app from a worker process per core:
+python -m storesvc.entrypoints.prefork --bind 0.0.0.0:80 --workers 4 --threads 8
+
+The master binds the listening socket, forks the workers that all accept on it, and restarts
+those that die. Each worker calls create_app after the fork, so its engine, connection pool and
+background threads are its own: nothing holding a connection or a thread crosses the fork.
+Defaults come from WEB_BIND, WEB_WORKERS, WEB_THREADS and WEB_GRACEFUL_TIMEOUT.
+
+Each worker gets WEB_WORKER_INDEX and WEB_WORKERS in its environment, so that create_app can
+tell the workers apart. What lives in a process is per worker:
+- the order replicator runs in worker 0 only, which is restarted as worker 0;
+- reservations are held in memory, where another worker would not find them: with more than
+  one worker, the workers have no reservation book and the reservation endpoints answer 404;
+- approval lanes give one writer per store within a worker only; across workers the approvals
+  of a store race on its version number and are retried, as without lanes;
+- /metrics shows the counts of the worker that answered the scrape, not of the whole server.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+from werkzeug.serving import BaseWSGIServer
+
+from storesvc import config
+from storesvc.entrypoints import flask_app
+
+logger = logging.getLogger(__name__)
+
+# Exit status of a worker whose app could not be created: restarting it would fail the same way
+WORKER_BOOT_ERROR = 3
+
+AppFactory = Callable[[], Callable]
+
+
+class WorkerServer(BaseWSGIServer):
+    """Serves a WSGI app from a listening socket shared with the other workers, on `threads` threads."""
+    multithread = True
+
+    def __init__(self, sock: socket.socket, app: Callable, threads: int, multiprocess: bool = False):
+        host, port = sock.getsockname()[:2]
+        super().__init__(host, port, app, fd=sock.fileno())
+        # wsgi.multiprocess of the requests: whether other workers serve the app too
+        self.multiprocess = multiprocess
+        # The workers race to accept each connection: the losers must not block in accept()
+        self.socket.setblocking(False)
+        self._slots = threading.BoundedSemaphore(threads)
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix='http')
+        self._master_pid = os.getppid()
+        self._stopping = False
+
+    def stop(self):
+        if not self._stopping:
+            self._stopping = True
+            # shutdown() waits for serve_forever to return, so it cannot run on the serving thread
+            threading.Thread(target=self.shutdown).start()
+
+    def service_actions(self):
+        if os.getppid() != self._master_pid:
+            logger.warning('Worker %d lost its master, stopping', os.getpid())
+            self.stop()
+
+    def get_request(self):
+        # Without a free thread, leave the connections to the other workers
+        self._slots.acquire()
+        try:
+            return super().get_request()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def server_close(self):
+        super().server_close()
+        # Let the requests in flight finish
+        self._executor.shutdown(wait=True)
+
+
+def run_worker(sock: socket.socket, app_factory: AppFactory, threads: int, multiprocess: bool = False) -> int:
+    try:
+        app = app_factory()
+    except Exception:
+        logger.exception('Worker %d failed to start', os.getpid())
+        return WORKER_BOOT_ERROR
+    server = WorkerServer(sock, app, threads, multiprocess)
+    signal.signal(signal.SIGTERM, lambda *_: server.stop())
+    try:
+        server.serve_forever()
+    finally:
+        # The worker leaves with os._exit, which skips the atexit hooks: stop the app's background
+        # workers here, e.g. draining approval lanes
+        storesvc = getattr(app, 'extensions', {}).get('storesvc')
+        if storesvc is not None:
+            storesvc.close()
+    return 0
+
+
+class Arbiter:
+    """Keeps `workers` worker processes serving `sock` until SIGTERM or SIGINT."""
+
+    def __init__(
+            self, sock: socket.socket, app_factory: AppFactory, workers: int, threads: int,
+            graceful_timeout: float = None,
+    ):
+        self.sock = sock
+        self.app_factory = app_factory
+        self.workers = workers
+        self.threads = threads
+        self.graceful_timeout = graceful_timeout if graceful_timeout is not None else config.get_web_graceful_timeout()
+        # Index of each worker, by pid
+        self.pids = {}  # type: Dict[int, int]
+        self._stopping = False
+        self._status = 0
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        logger.info(
+            'Listening on %s with %d workers of %d threads', self.sock.getsockname(), self.workers, self.threads
+        )
+        try:
+            while not self._stopping:
+                self._reap()
+                for index in sorted(set(range(self.workers)) - set(self.pids.values())):
+                    if self._stopping:
+                        break
+                    self._spawn(index)
+                time.sleep(0.1)
+        finally:
+            self._stop_workers()
+        return self._status
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+
+    def _spawn(self, index: int):
+        pid = os.fork()
+        if pid:
+            self.pids[pid] = index
+            return
+        status = 1
+        try:
+            os.environ['WEB_WORKER_INDEX'] = str(index)
+            os.environ['WEB_WORKERS'] = str(self.workers)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            # Ctrl-C reaches the whole process group: the master stops the workers
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            status = run_worker(self.sock, self.app_factory, self.threads, multiprocess=self.workers > 1)
+        except BaseException:
+            logger.exception('Worker %d failed', os.getpid())
+        finally:
+            os._exit(status)
+
+    def _reap(self):
+        while self.pids:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if not pid:
+                return
+            self.pids.pop(pid, None)
+            if self._stopping:
+                continue
+            exit_status = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+            if exit_status == WORKER_BOOT_ERROR:
+                logger.error('Worker %d failed to start, stopping', pid)
+                self._status = 1
+                self._stopping = True
+            else:
+                logger.warning('Worker %d exited with status %d, restarting it', pid, exit_status)
+
+    def _stop_workers(self):
+        self._stopping = True
+        self._signal_workers(signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.pids and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.05)
+        if self.pids:
+            logger.warning('Killing %d workers still running after %.0fs', len(self.pids), self.graceful_timeout)
+            self._signal_workers(signal.SIGKILL)
+            for pid in list(self.pids):
+                os.waitpid(pid, 0)
+                self.pids.pop(pid, None)
+
+    def _signal_workers(self, signum: int):
+        for pid in self.pids:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+
+def bind(address: str, backlog: int = 2048) -> socket.socket:
+    """Listens on HOST:PORT, before forking, so that the workers share the socket."""
+    host, _, port = address.rpartition(':')
+    host = host.strip('[]')
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, int(port)))
+    sock.listen(backlog)
+    return sock
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the Flask app from pre-forked worker processes.')
+    parser.add_argument('--bind', default=config.get_web_bind(), help='HOST:PORT to listen on (WEB_BIND)')
+    parser.add_argument('--workers', type=int, default=config.get_web_workers(), help='processes (WEB_WORKERS)')
+    parser.add_argument(
+        '--threads', type=int, default=config.get_web_threads(), help='requests in flight per process (WEB_THREADS)'
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    return Arbiter(bind(args.bind), flask_app.create_app, args.workers, args.threads).run()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
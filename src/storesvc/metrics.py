@@ -0,0 +1,188 @@
+"""In-process counters and latency histograms, rendered in the Prometheus text format.
+
+Recording is a lock, a bisect and two additions, so metrics can stay on the hot path.
+"""
+import bisect
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple, TypeVar
+
+# Seconds, from sub-millisecond domain work up to slow order service calls
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Metric:
+    type = ''
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _check_labels(self, labels: Tuple[str, ...]):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f'{self.name} takes labels {self.labelnames}, got {labels}')
+
+    def _format_labels(self, labels: Tuple[str, ...], **extra: str) -> str:
+        pairs = list(zip(self.labelnames, labels)) + list(extra.items())
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + '}'
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}'] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values = {}  # type: Dict[Tuple[str, ...], float]
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            value = self._values.get(labels)
+            if value is None:
+                self._check_labels(labels)
+                value = 0.0
+            self._values[labels] = value + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}_total{self._format_labels(labels)} {value}' for labels, value in values]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(
+            self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: a count per bucket (not cumulative), then the overflow count, and the sum
+        self._counts = {}  # type: Dict[Tuple[str, ...], List[int]]
+        self._sums = {}  # type: Dict[Tuple[str, ...], float]
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(labels)
+            if counts is None:
+                # Labels are only checked for a new series, to keep the common case short
+                self._check_labels(labels)
+                counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+                self._sums[labels] = 0.0
+            counts[index] += 1
+            self._sums[labels] += value
+
+    def time(self, *labels: str) -> 'Timer':
+        """Context manager observing the time spent in its block."""
+        return Timer(self, labels)
+
+    def count(self, *labels: str) -> int:
+        return sum(self._counts.get(labels, ()))
+
+    def sum(self, *labels: str) -> float:
+        return self._sums.get(labels, 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((labels, list(counts), self._sums[labels]) for labels, counts in self._counts.items())
+        samples = []
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append(f'{self.name}_bucket{self._format_labels(labels, le=repr(bound))} {cumulative}')
+            cumulative += counts[-1]
+            samples.append(f'{self.name}_bucket{self._format_labels(labels, le="+Inf")} {cumulative}')
+            samples.append(f'{self.name}_sum{self._format_labels(labels)} {total}')
+            samples.append(f'{self.name}_count{self._format_labels(labels)} {cumulative}')
+        return samples
+
+
+class Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram: Histogram, labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> 'Timer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+M = TypeVar('M', bound=Metric)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}  # type: Dict[str, Metric]
+
+    def register(self, metric: M) -> M:
+        if metric.name in self._metrics:
+            raise ValueError(f'Metric {metric.name} is already registered')
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    'storesvc_http_requests', 'HTTP requests handled, by endpoint and status code', ('endpoint', 'status'),
+))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'storesvc_http_request_seconds', 'Time spent handling HTTP requests, by endpoint', ('endpoint',),
+))
+HTTP_REQUEST_DB_STATEMENTS = REGISTRY.register(Histogram(
+    'storesvc_http_request_db_statements', 'SQL statements run per HTTP request, by endpoint', ('endpoint',),
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100, 250),
+))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'storesvc_stage_seconds',
+    'Time spent in each stage of handling orders: get_order, get_store, approve, commit, publish_events',
+    ('stage',),
+))
+APPROVALS = REGISTRY.register(Counter(
+    'storesvc_approvals', 'Order approvals, by outcome: approved or the name of the error', ('outcome',),
+))
+REJECTED_EVENTS = REGISTRY.register(Counter(
+    'storesvc_rejected_events',
+    'Events of committed changes the message bus rejected, by where they went: outbox, or lost',
+    ('result',),
+))
+APPROVAL_RETRIES = REGISTRY.register(Counter(
+    'storesvc_approval_retries', 'Approvals run again after losing a race on their store',
+))
+INVALID_ORDER_EVENTS = REGISTRY.register(Counter(
+    'storesvc_invalid_order_events', 'Order event messages the order replica skipped because they could not be read',
+))
+ORDER_REPLICA_LOOKUPS = REGISTRY.register(Counter(
+    'storesvc_order_replica_lookups',
+    'Orders looked up in the local replica, by result: hit, or miss when asking the order service',
+    ('result',),
+))
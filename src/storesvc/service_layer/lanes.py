@@ -0,0 +1,111 @@
+import concurrent.futures
+import logging
+import queue
+import threading
+import zlib
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+from storesvc.adapters.provider import AbstractOrderProvider
+from storesvc.domain.reservation import ReservationBook
+from storesvc.service_layer import services
+from storesvc.service_layer.unit_of_work import AbstractUnitOfWork
+
+logger = logging.getLogger(__name__)
+
+
+class ApprovalLanes:
+    """Runs approvals on single-writer lanes, one worker thread per bucket of store ids.
+
+    All approvals of a store go through the same lane and so never race each other for the
+    store's rows: an order of another store than the one it was queued for is rejected, as
+    its lane is another one. A lane takes up to `group_commit_size` queued approvals at a time
+    and commits them in one transaction, each order still getting its own result.
+    """
+
+    def __init__(
+            self, uow_factory: Callable[[], AbstractUnitOfWork], provider: AbstractOrderProvider,
+            lanes: int, group_commit_size: int = 1, book: ReservationBook = None,
+    ):
+        self.uow_factory = uow_factory
+        self.provider = provider
+        # Stock held by its reservations is not approved, see services.approve_orders
+        self.book = book
+        self.group_commit_size = group_commit_size
+        self._queues = [queue.Queue() for _ in range(lanes)]  # type: List[queue.Queue]
+        self._workers = [
+            threading.Thread(target=self._work, args=(q,), name=f'approval-lane-{i}', daemon=True)
+            for i, q in enumerate(self._queues)
+        ]
+
+    def start(self):
+        for worker in self._workers:
+            worker.start()
+
+    def shutdown(self, timeout: float = None):
+        """Stops the lanes after the approvals already queued."""
+        for q in self._queues:
+            q.put(None)
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def submit(self, store_id: str, order_id: str) -> Future:
+        """Queues the approval on the lane of the store. The future raises what approve_order would;
+        cancelling it before its lane takes it skips the approval."""
+        future = Future()  # type: Future
+        self._queues[zlib.crc32(store_id.encode()) % len(self._queues)].put((store_id, order_id, future))
+        return future
+
+    def approve(self, store_id: str, order_id: str, timeout: float = None):
+        """Approves the order on its lane, waiting at most `timeout` seconds.
+
+        On timeout the approval is cancelled if it is still queued; if it is already running, it
+        may still commit. Either way concurrent.futures.TimeoutError is raised.
+        """
+        future = self.submit(store_id, order_id)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def _work(self, lane: queue.Queue):
+        while True:
+            command = lane.get()
+            if command is None:
+                return
+            batch = [command]
+            stopping = False
+            while len(batch) < self.group_commit_size:
+                try:
+                    command = lane.get_nowait()
+                except queue.Empty:
+                    break
+                if command is None:
+                    stopping = True
+                    break
+                batch.append(command)
+            self._approve(batch)
+            if stopping:
+                return
+
+    def _approve(self, batch: List[Tuple[str, str, Future]]):
+        batch = [command for command in batch if command[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            results = services.approve_orders(
+                [order_id for _, order_id, _ in batch], self.uow_factory(), self.provider,
+                store_ids={order_id: store_id for store_id, order_id, _ in batch}, book=self.book,
+            )
+        except Exception as e:
+            logger.exception('Failed to approve a batch of %d orders', len(batch))
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for _, order_id, future in batch:
+            error = results[order_id]  # type: Optional[Exception]
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
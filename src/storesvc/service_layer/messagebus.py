@@ -1,9 +1,24 @@
-from typing import List, Dict, Callable, Type
+import enum
+import logging
+import queue
+import threading
+import time
+from typing import List, Dict, Callable, Optional, Type
 
 from storesvc.domain import events
 
+logger = logging.getLogger(__name__)
+
 
 def handle(event: events.Event):
+    if _dispatcher is not None:
+        _dispatcher.submit(event)
+    else:
+        dispatch(event)
+
+
+def dispatch(event: events.Event):
+    """Runs the handlers of the event on the calling thread."""
     for handler in HANDLERS[type(event)]:
         handler(event)
 
@@ -16,3 +31,134 @@ def publish_approved_order_event_message(event: events.ApprovedOrder):
 HANDLERS = {
     events.ApprovedOrder: [publish_approved_order_event_message],
 }  # type: Dict[Type[events.Event], List[Callable]]
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Backpressure(enum.Enum):
+    BLOCK = 'block'  # wait for room in the queue
+    DROP = 'drop'  # discard the event
+    REJECT = 'reject'  # raise QueueFull to the publisher, see AbstractUnitOfWork.publish_events
+
+
+class AsyncDispatcher:
+    """Dispatches events on a pool of worker threads fed by a bounded queue."""
+
+    def __init__(self, workers: int, queue_size: int, backpressure: Backpressure = Backpressure.BLOCK):
+        self.backpressure = backpressure
+        self._queue = queue.Queue(maxsize=queue_size)  # type: queue.Queue
+        self._workers = [
+            threading.Thread(target=self._work, name=f'messagebus-{i}', daemon=True) for i in range(workers)
+        ]
+        self._accepting = False
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.handled = 0
+        self.failed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+        self.handler_seconds_total = 0.0
+        self.handler_seconds_max = 0.0
+
+    def start(self):
+        self._accepting = True
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, event: events.Event):
+        if not self._accepting:
+            raise RuntimeError('dispatcher is not running')
+        try:
+            self._queue.put(event, block=self.backpressure is Backpressure.BLOCK)
+        except queue.Full:
+            if self.backpressure is Backpressure.REJECT:
+                with self._lock:
+                    self.rejected += 1
+                raise QueueFull(f'{type(event).__name__} rejected: {self._queue.maxsize} events are waiting')
+            with self._lock:
+                self.dropped += 1
+            logger.warning('Dropped %s: message bus queue is full', type(event).__name__)
+            return
+        with self._lock:
+            self.submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+
+    def shutdown(self, drain: bool = True, timeout: float = None):
+        """Stops accepting events and waits for the workers, after they handled the queued events if `drain`."""
+        self._accepting = False
+        if not drain:
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                with self._lock:
+                    self.dropped += 1
+        for _ in self._workers:
+            self._queue.put(None)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'submitted': self.submitted,
+                'handled': self.handled,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'rejected': self.rejected,
+                'handler_seconds_total': self.handler_seconds_total,
+                'handler_seconds_max': self.handler_seconds_max,
+            }
+
+    def _work(self):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                return
+            start = time.perf_counter()
+            try:
+                dispatch(event)
+                failed = False
+            except Exception:
+                logger.exception('Failed to handle %s', type(event).__name__)
+                failed = True
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                if failed:
+                    self.failed += 1
+                else:
+                    self.handled += 1
+                self.handler_seconds_total += elapsed
+                self.handler_seconds_max = max(self.handler_seconds_max, elapsed)
+
+
+_dispatcher = None  # type: Optional[AsyncDispatcher]
+
+
+def start_async_dispatch(workers: int, queue_size: int, backpressure: Backpressure = Backpressure.BLOCK):
+    """Dispatches events on `workers` threads from now on, in place of the dispatcher started before,
+    which is stopped after the events it queued."""
+    global _dispatcher
+    stop_async_dispatch()
+    dispatcher = AsyncDispatcher(workers, queue_size, backpressure)
+    dispatcher.start()
+    _dispatcher = dispatcher
+    return dispatcher
+
+
+def stop_async_dispatch(drain: bool = True, timeout: float = None, dispatcher: AsyncDispatcher = None):
+    """Stops the running dispatcher; with `dispatcher`, only if it is still the one running."""
+    global _dispatcher
+    if dispatcher is not None and dispatcher is not _dispatcher:
+        # Stopped already, when it was replaced or stopped by another caller
+        return
+    dispatcher, _dispatcher = _dispatcher, None
+    if dispatcher is not None:
+        dispatcher.shutdown(drain, timeout)
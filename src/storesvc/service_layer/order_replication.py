@@ -0,0 +1,66 @@
+import logging
+import threading
+from typing import Optional
+
+from storesvc import config
+from storesvc.adapters.order_events import AbstractOrderEventSource
+from storesvc.adapters.order_replica import SqlAlchemyOrderReplica
+from storesvc.service_layer import unit_of_work
+
+logger = logging.getLogger(__name__)
+
+
+class OrderReplicator:
+    """Applies order events to the local order replica, in batches.
+
+    The replica's orders and the position read in the source are committed together, so after
+    a restart replication goes on from the first event not applied yet.
+    """
+
+    def __init__(
+            self, source: AbstractOrderEventSource, session_factory=None, batch_size: int = None,
+            poll_interval: float = None,
+    ):
+        self.source = source
+        self.session_factory = session_factory or unit_of_work.new_session
+        self.batch_size = batch_size or config.get_order_replication_batch_size()
+        self.poll_interval = poll_interval or config.get_order_replication_poll_interval()
+        self._stop = threading.Event()
+        self._thread = None  # type: Optional[threading.Thread]
+
+    def replicate_once(self) -> int:
+        """Applies one batch and returns how many events it had."""
+        session = self.session_factory()
+        try:
+            replica = SqlAlchemyOrderReplica(session)
+            position = replica.get_position(self.source.name)
+            order_events, next_position = self.source.read(position, self.batch_size)
+            if next_position == position:
+                return 0
+            replica.save(event.order for event in order_events)
+            replica.set_position(self.source.name, next_position)
+            session.commit()
+            return len(order_events)
+        finally:
+            session.close()
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                replicated = self.replicate_once()
+            except Exception:
+                logger.exception('Failed to replicate order events from %s', self.source.name)
+                replicated = 0
+            if replicated < self.batch_size:
+                self._stop.wait(self.poll_interval)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='order-replication', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
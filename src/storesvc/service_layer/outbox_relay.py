@@ -0,0 +1,65 @@
+import logging
+import threading
+from typing import Optional
+
+from storesvc import config
+from storesvc.adapters import outbox
+from storesvc.service_layer import messagebus, unit_of_work
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxRelay:
+    """Hands events committed to the outbox to the message bus handlers, in batches.
+
+    An event is removed from the outbox only after its handlers succeeded, so delivery is
+    at-least-once: handlers may see an event again if the relay stops before committing.
+    """
+
+    def __init__(self, session_factory=None, batch_size: int = None, poll_interval: float = None):
+        self.session_factory = session_factory or unit_of_work.new_session
+        self.batch_size = batch_size or config.get_outbox_batch_size()
+        self.poll_interval = poll_interval or config.get_outbox_poll_interval()
+        self._stop = threading.Event()
+        self._thread = None  # type: Optional[threading.Thread]
+
+    def relay_once(self) -> int:
+        """Relays one batch and returns how many events were handled."""
+        session = self.session_factory()
+        try:
+            event_outbox = outbox.SqlAlchemyOutbox(session)
+            handled = []
+            for id, event in event_outbox.pending(self.batch_size):
+                try:
+                    messagebus.dispatch(event)
+                except Exception:
+                    # Keep the failed event and everything after it for the next poll
+                    logger.exception('Failed to relay outbox event %s', id)
+                    break
+                handled.append(id)
+            event_outbox.remove(handled)
+            session.commit()
+            return len(handled)
+        finally:
+            session.close()
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                relayed = self.relay_once()
+            except Exception:
+                logger.exception('Failed to read the outbox')
+                relayed = 0
+            if relayed < self.batch_size:
+                self._stop.wait(self.poll_interval)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='outbox-relay', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
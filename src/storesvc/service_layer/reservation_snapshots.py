@@ -0,0 +1,65 @@
+import logging
+import threading
+from typing import Optional
+
+from storesvc import config
+from storesvc.adapters.reservation_store import SqlAlchemyReservationStore
+from storesvc.domain.reservation import ReservationBook
+from storesvc.service_layer import unit_of_work
+
+logger = logging.getLogger(__name__)
+
+
+class ReservationSnapshotter:
+    """Reclaims expired holds and saves the book to the database every `interval` seconds,
+    as the holds of `owner` (RESERVATION_OWNER)."""
+
+    def __init__(self, book: ReservationBook, session_factory=None, interval: float = None, owner: str = None):
+        self.book = book
+        self.session_factory = session_factory or unit_of_work.new_session
+        self.interval = interval or config.get_reservation_snapshot_interval()
+        self.owner = owner or config.get_reservation_owner()
+        self._stop = threading.Event()
+        self._thread = None  # type: Optional[threading.Thread]
+
+    def restore(self):
+        session = self.session_factory()
+        try:
+            self.book.restore(SqlAlchemyReservationStore(session, self.owner).load())
+        finally:
+            session.close()
+
+    def snapshot(self):
+        self.book.expire()
+        session = self.session_factory()
+        try:
+            SqlAlchemyReservationStore(session, self.owner).save(self.book.holds())
+            session.commit()
+        finally:
+            session.close()
+
+    def run(self):
+        try:
+            self.restore()
+        except Exception:
+            logger.exception('Failed to restore reservations')
+        while not self._stop.wait(self.interval):
+            try:
+                self.snapshot()
+            except Exception:
+                logger.exception('Failed to save reservations')
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='reservation-snapshots', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        try:
+            self.snapshot()
+        except Exception:
+            logger.exception('Failed to save reservations')
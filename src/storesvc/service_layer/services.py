@@ -1,13 +1,387 @@
-from storesvc.adapters.provider import AbstractOrderProvider
-from storesvc.service_layer.unit_of_work import AbstractUnitOfWork
+import asyncio
+import itertools
+import random
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, TypeVar
 
+from storesvc import config, metrics
+from storesvc.adapters import cache
+from storesvc.adapters.provider import AbstractAsyncOrderProvider, AbstractOrderProvider
+from storesvc.adapters.repository import DuplicateApproval, InvalidStoreId
+from storesvc.domain import events, model
+from storesvc.domain.reservation import Hold, ReservationBook
+from storesvc.domain.value import Order
+from storesvc.service_layer.unit_of_work import AbstractAsyncUnitOfWork, AbstractUnitOfWork, ConcurrentUpdate
 
-def approve_order(order_id: str, uow: AbstractUnitOfWork, provider: AbstractOrderProvider):
-    order = provider.get_order(order_id)
+T = TypeVar('T')
+
+# Orders this process saw approved, in front of the processed_orders ledger: the order service
+# retries its webhook calls, and a retry is answered without calling it back or loading the store
+approved_orders = cache.LRUCache(
+    maxsize=config.get_approved_orders_cache_size(), ttl=config.get_approved_orders_cache_ttl()
+)
+
+
+def retry_on_concurrent_update(fn: Callable[[], T]) -> T:
+    """Runs `fn` again, after a jittered exponential backoff, each time it loses a race on a store."""
+    max_retries = config.get_approve_max_retries()
+    backoff = config.get_approve_retry_backoff()
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except ConcurrentUpdate:
+            if attempt >= max_retries:
+                raise
+            metrics.APPROVAL_RETRIES.inc()
+            time.sleep(random.uniform(0, backoff * 2 ** attempt))
+            attempt += 1
+
+
+async def retry_on_concurrent_update_async(fn: Callable[[], Awaitable[T]]) -> T:
+    """retry_on_concurrent_update for coroutines: the backoff waits without blocking the event loop."""
+    max_retries = config.get_approve_max_retries()
+    backoff = config.get_approve_retry_backoff()
+    attempt = 0
+    while True:
+        try:
+            return await fn()
+        except ConcurrentUpdate:
+            if attempt >= max_retries:
+                raise
+            metrics.APPROVAL_RETRIES.inc()
+            await asyncio.sleep(random.uniform(0, backoff * 2 ** attempt))
+            attempt += 1
+
+
+def _held_counts(book: Optional[ReservationBook], order: Order) -> Optional[Dict[str, int]]:
+    """Stock of the order's items held by reservations, which approvals must leave alone. The
+    order's own hold holds stock for it: it is not counted, and the approval releases it."""
+    return book.held_counts(order.store_id, order.item_ids, excluding=[order.order_id]) if book is not None else None
+
+
+def approve_order(
+        order_id: str, uow: AbstractUnitOfWork, provider: AbstractOrderProvider, book: ReservationBook = None
+):
+    """Approves the order, once: approving an order again succeeds without changing anything.
+    With `book`, the stock its reservations hold is not available to the order, but for the
+    order's own hold, which ends once the order is approved."""
+    try:
+        outcome = _approve_order(order_id, uow, provider, book)
+    except Exception as e:
+        metrics.APPROVALS.inc(type(e).__name__)
+        raise
+    if book is not None:
+        book.release_orders([order_id])
+    metrics.APPROVALS.inc(outcome)
+
+
+def _approve_order(
+        order_id: str, uow: AbstractUnitOfWork, provider: AbstractOrderProvider, book: Optional[ReservationBook]
+) -> str:
+    if approved_orders.get(order_id):
+        return 'duplicate'
     with uow:
-        store = uow.stores.get(order.store_id)
-        store.approve(order)
-        # Todo : Implement Publish PublishedOrder Event Message
-        # ex) order = KafkaEventProvider.publish(approved_order)
-        #     if fail publish event message then raise Exception
+        if uow.stores.get_approved_order_ids([order_id]):
+            approved_orders.set(order_id, True)
+            return 'duplicate'
+    with metrics.STAGE_SECONDS.time('get_order'):
+        order = provider.get_order(order_id)
+
+    def approve():
+        with uow:
+            with metrics.STAGE_SECONDS.time('get_store'):
+                store = uow.stores.get(order.store_id, item_ids=order.item_ids)
+            with metrics.STAGE_SECONDS.time('approve'):
+                store.approve(order, held=_held_counts(book, order))
+            uow.stores.add_approved_orders([order])
+            # Todo : Implement Publish PublishedOrder Event Message
+            # ex) order = KafkaEventProvider.publish(approved_order)
+            #     if fail publish event message then raise Exception
+            uow.commit()
+
+    try:
+        if config.get_approval_strategy() == 'set_based':
+            retry_on_concurrent_update(lambda: _approve_order_set_based(order, uow, _held_counts(book, order)))
+        else:
+            retry_on_concurrent_update(approve)
+    except DuplicateApproval:
+        # A retry of the same webhook call won the race, and nothing of this one was committed
+        outcome = 'duplicate'
+    else:
+        outcome = 'approved'
+    approved_orders.set(order_id, True)
+    return outcome
+
+
+def _approve_order_set_based(order: Order, uow: AbstractUnitOfWork, held: Dict[str, int] = None):
+    ordered_counts = model.count_order_lines(order)
+    with uow:
+        if uow.stores.decrement_quantities(order.store_id, ordered_counts, held) < len(ordered_counts):
+            uow.rollback()
+            _raise_shortfall(
+                order, ordered_counts, uow.stores.get_quantities(order.store_id, ordered_counts), held
+            )
+        uow.stores.add_approved_orders([order])
+        uow.stores.events.append(events.ApprovedOrder(order=order))
         uow.commit()
+
+
+def _raise_shortfall(
+        order: Order, ordered_counts: Dict[str, int], quantities: Dict[str, int], held: Dict[str, int] = None
+):
+    for item_id, ordered_count in ordered_counts.items():
+        if item_id not in quantities:
+            raise model.InvalidOrder(
+                f'item does not exist : item_id of the order({order.order_id}) is {item_id}'
+            )
+        if quantities[item_id] - (held or {}).get(item_id, 0) < ordered_count:
+            raise model.OutOfStock(
+                f'Out of stock for store_id {order.store_id}, item {item_id}, order_id {order.order_id}'
+            )
+    # Enough stock by now: another approval released it between the two statements
+    raise ConcurrentUpdate(f'stock of store {order.store_id} changed during approval')
+
+
+async def approve_order_async(order_id: str, uow: AbstractAsyncUnitOfWork, provider: AbstractAsyncOrderProvider):
+    """approve_order for the ASGI entrypoint."""
+    try:
+        outcome = await _approve_order_async(order_id, uow, provider)
+    except Exception as e:
+        metrics.APPROVALS.inc(type(e).__name__)
+        raise
+    metrics.APPROVALS.inc(outcome)
+
+
+async def _approve_order_async(
+        order_id: str, uow: AbstractAsyncUnitOfWork, provider: AbstractAsyncOrderProvider
+) -> str:
+    if approved_orders.get(order_id):
+        return 'duplicate'
+    async with uow:
+        if await uow.stores.get_approved_order_ids([order_id]):
+            approved_orders.set(order_id, True)
+            return 'duplicate'
+    with metrics.STAGE_SECONDS.time('get_order'):
+        order = await provider.get_order(order_id)
+
+    async def approve():
+        async with uow:
+            with metrics.STAGE_SECONDS.time('get_store'):
+                store = await uow.stores.get(order.store_id, item_ids=order.item_ids)
+            with metrics.STAGE_SECONDS.time('approve'):
+                store.approve(order)
+            await uow.stores.add_approved_orders([order])
+            await uow.commit()
+
+    try:
+        if config.get_approval_strategy() == 'set_based':
+            await retry_on_concurrent_update_async(lambda: _approve_order_set_based_async(order, uow))
+        else:
+            await retry_on_concurrent_update_async(approve)
+    except DuplicateApproval:
+        outcome = 'duplicate'
+    else:
+        outcome = 'approved'
+    approved_orders.set(order_id, True)
+    return outcome
+
+
+async def _approve_order_set_based_async(order: Order, uow: AbstractAsyncUnitOfWork):
+    ordered_counts = model.count_order_lines(order)
+    async with uow:
+        if await uow.stores.decrement_quantities(order.store_id, ordered_counts) < len(ordered_counts):
+            await uow.rollback()
+            _raise_shortfall(order, ordered_counts, await uow.stores.get_quantities(order.store_id, ordered_counts))
+        await uow.stores.add_approved_orders([order])
+        uow.stores.events.append(events.ApprovedOrder(order=order))
+        await uow.commit()
+
+
+def approve_orders(
+        order_ids: List[str], uow: AbstractUnitOfWork, provider: AbstractOrderProvider,
+        store_ids: Dict[str, str] = None, book: ReservationBook = None,
+) -> Dict[str, Optional[model.CannotApprove]]:
+    """Approves many orders in one transaction, loading each store once.
+
+    Returns the result of every order keyed by order id: None if the order was approved,
+    now or before, otherwise the OutOfStock / InvalidOrder error that rejected it. A rejected
+    order does not prevent the others from being approved. With `store_ids`, the store each
+    order was requested for by order id, an order of another store is rejected as InvalidOrder.
+    With `book`, the stock its reservations hold is not available to the orders, but for the
+    orders' own holds, which end once the orders are approved.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    try:
+        results, approved_ids = _approve_orders(order_ids, uow, provider, store_ids, book)
+    except Exception as e:
+        if order_ids:
+            metrics.APPROVALS.inc(type(e).__name__, amount=len(order_ids))
+        raise
+    if book is not None:
+        book.release_orders([order_id for order_id, error in results.items() if error is None])
+    for order_id, error in results.items():
+        if error is not None:
+            metrics.APPROVALS.inc(type(error).__name__)
+        else:
+            metrics.APPROVALS.inc('approved' if order_id in approved_ids else 'duplicate')
+    return results
+
+
+def _approve_orders(
+        order_ids: List[str], uow: AbstractUnitOfWork, provider: AbstractOrderProvider,
+        store_ids: Optional[Dict[str, str]], book: Optional[ReservationBook],
+) -> Tuple[Dict[str, Optional[model.CannotApprove]], Set[str]]:
+    """The results of approve_orders, and the ids of the orders it approved rather than found approved."""
+    unseen_ids = [order_id for order_id in order_ids if not approved_orders.get(order_id)]
+    if unseen_ids:
+        with uow:
+            approved_ids = uow.stores.get_approved_order_ids(unseen_ids)
+        unseen_ids = [order_id for order_id in unseen_ids if order_id not in approved_ids]
+    orders = provider.get_orders(unseen_ids) if unseen_ids else {}
+    unseen_ids = set(unseen_ids)
+
+    def approve():
+        results = {
+            order_id: None if order_id in orders or order_id not in unseen_ids
+            else model.InvalidOrder(f'order does not exist : order_id is {order_id}')
+            for order_id in order_ids
+        }  # type: Dict[str, Optional[model.CannotApprove]]
+        with uow:
+            # Orders approved since the check above, by a duplicate that won the race on their store
+            approved_ids = uow.stores.get_approved_order_ids(orders) if orders else set()
+            orders_by_store = defaultdict(list)
+            for order_id, order in orders.items():
+                if order_id in approved_ids:
+                    continue
+                if store_ids is not None and order.store_id != store_ids.get(order_id):
+                    results[order_id] = model.InvalidOrder(
+                        f'store id is not matched : store_id of the order({order_id}) is {order.store_id} '
+                        f'but current store_id is {store_ids.get(order_id)}'
+                    )
+                    continue
+                orders_by_store[order.store_id].append(order)
+            approved = []
+            for store_id, store_orders in orders_by_store.items():
+                item_ids = {item_id for order in store_orders for item_id in order.item_ids}
+                try:
+                    store = uow.stores.get(store_id, item_ids=item_ids)
+                except InvalidStoreId as e:
+                    for order in store_orders:
+                        results[order.order_id] = model.InvalidOrder(str(e))
+                    continue
+                # The holds of the orders approved so far hold stock they took already
+                store_approved_ids = []
+                for order in store_orders:
+                    held = book.held_counts(
+                        store_id, item_ids, excluding=store_approved_ids + [order.order_id]
+                    ) if book is not None else None
+                    try:
+                        store.approve(order, held=held)
+                    except model.CannotApprove as e:
+                        results[order.order_id] = e
+                    else:
+                        approved.append(order)
+                        store_approved_ids.append(order.order_id)
+            try:
+                uow.stores.add_approved_orders(approved)
+            except DuplicateApproval as e:
+                # Retried from the start, the check above skips the orders approved in the meantime
+                raise ConcurrentUpdate(str(e)) from e
+            uow.commit()
+        for order in approved:
+            approved_orders.set(order.order_id, True)
+        return results, {order.order_id for order in approved}
+
+    return retry_on_concurrent_update(approve)
+
+
+def reserve_order(
+        order_id: str, uow: AbstractUnitOfWork, provider: AbstractOrderProvider, book: ReservationBook,
+        ttl: float = None, store_id: str = None,
+) -> Hold:
+    """Holds the stock of a published order for `ttl` seconds, until it is confirmed or released.
+
+    An order has one hold: reserving it again returns the hold it has. An approved order cannot
+    be reserved, nor, with `store_id`, an order of another store.
+    """
+    if approved_orders.get(order_id):
+        raise model.InvalidOrder(f'order already approved : order_id is {order_id}')
+    with uow:
+        if uow.stores.get_approved_order_ids([order_id]):
+            approved_orders.set(order_id, True)
+            raise model.InvalidOrder(f'order already approved : order_id is {order_id}')
+    order = provider.get_order(order_id)
+    if store_id is not None and order.store_id != store_id:
+        raise model.InvalidOrder(
+            f'store id is not matched : store_id of the order({order_id}) is {order.store_id} '
+            f'but current store_id is {store_id}'
+        )
+    with uow:
+        store = uow.stores.get(order.store_id, item_ids=order.item_ids)
+        return book.reserve(store, order, ttl or config.get_reservation_ttl())
+
+
+def confirm_reservation(reservation_id: str, uow: AbstractUnitOfWork, book: ReservationBook):
+    """Approves the held order, taking its items out of stock, and ends the hold.
+
+    The hold is taken out of the book first, so a concurrent confirmation of the reservation
+    finds none; it is put back if the approval fails. The approval is recorded in the
+    processed_orders ledger like any other: an order approved already, e.g. by the webhook, is
+    not taken out of stock again, nor is it by the webhook after the confirmation.
+    """
+    hold = book.release(reservation_id)
+    order = hold.order
+
+    def approve():
+        if approved_orders.get(order.order_id):
+            return
+        with uow:
+            if uow.stores.get_approved_order_ids([order.order_id]):
+                return
+            store = uow.stores.get(order.store_id, item_ids=order.item_ids)
+            # Only the other holds: this one is out of the book
+            store.approve(order, held=_held_counts(book, order))
+            uow.stores.add_approved_orders([order])
+            uow.commit()
+
+    try:
+        retry_on_concurrent_update(approve)
+    except DuplicateApproval:
+        # Approved by another transaction first, and nothing of this one was committed
+        pass
+    except Exception:
+        book.restore([hold])
+        raise
+    approved_orders.set(order.order_id, True)
+
+
+def release_reservation(reservation_id: str, book: ReservationBook):
+    book.release(reservation_id)
+
+
+def import_catalog(
+        store_id: str, rows: Iterable[Dict], uow: AbstractUnitOfWork, chunk_size: int = None,
+        progress: Callable[[int], None] = None,
+) -> int:
+    """Adds the items in `rows` to the store, `chunk_size` items per transaction.
+
+    `rows` is consumed lazily, so a catalog can be streamed from a file or a request. Each chunk
+    is committed on its own: if the import fails, the chunks before it stay imported, and
+    `progress` has been called with the number of items imported so far after each of them.
+    Returns the number of items imported.
+    """
+    chunk_size = chunk_size or config.get_catalog_import_chunk_size()
+    rows = iter(rows)
+    imported = 0
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return imported
+        with uow:
+            uow.stores.insert_items(store_id, chunk)
+            uow.commit()
+        imported += len(chunk)
+        if progress:
+            progress(imported)
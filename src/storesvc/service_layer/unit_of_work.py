@@ -1,13 +1,31 @@
 from __future__ import annotations
 import abc
-from sqlalchemy import create_engine
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.exc import StaleDataError
 from sqlalchemy.orm.session import Session
+from typing import Any, Callable, Iterator, List, Optional
 
-from storesvc import config
-from storesvc.adapters import repository
+from storesvc import config, metrics
+from storesvc.adapters import db, outbox, repository
+from storesvc.domain import events
 from storesvc.service_layer import messagebus
 
+logger = logging.getLogger(__name__)
+
+
+class ConcurrentUpdate(Exception):
+    """The store was changed by another transaction; the work can be retried from the start."""
+    pass
+
 
 class AbstractUnitOfWork(abc.ABC):
     stores: repository.AbstractRepository
@@ -19,14 +37,36 @@ class AbstractUnitOfWork(abc.ABC):
         self.rollback()
 
     def commit(self):
-        self._commit()
-        self.publish_events()
+        with metrics.STAGE_SECONDS.time('commit'):
+            self._commit()
+        with metrics.STAGE_SECONDS.time('publish_events'):
+            self.publish_events()
 
-    def publish_events(self):
+    def collect_new_events(self) -> Iterator[events.Event]:
+        # Take the pending events a batch at a time: pop(0) would make this quadratic
         for store in self.stores.seen:
             while store.events:
-                event = store.events.pop(0)
+                pending, store.events = store.events, []
+                yield from pending
+        while self.stores.events:
+            pending, self.stores.events = self.stores.events, []
+            yield from pending
+
+    def publish_events(self):
+        rejected = []  # type: List[events.Event]
+        for event in self.collect_new_events():
+            try:
                 messagebus.handle(event)
+            except messagebus.QueueFull:
+                rejected.append(event)
+        if rejected:
+            # The changes are committed: raising now would report them as failed
+            self.keep_rejected_events(rejected)
+
+    def keep_rejected_events(self, rejected: List[events.Event]):
+        """Takes the events the message bus rejected after the commit; here they are lost."""
+        metrics.REJECTED_EVENTS.inc('lost', amount=len(rejected))
+        logger.error('Lost %d events rejected by the message bus: %s', len(rejected), rejected)
 
     @abc.abstractmethod
     def _commit(self):
@@ -37,27 +77,214 @@ class AbstractUnitOfWork(abc.ABC):
         raise NotImplementedError
 
 
-DEFAULT_SESSION_FACTORY = sessionmaker(bind=create_engine(
-    config.get_postgres_uri(),
-    isolation_level="REPEATABLE READ"
-))
+# serialization_failure, deadlock_detected
+SERIALIZATION_FAILURE_CODES = {'40001', '40P01'}
+
+
+def is_concurrent_update(e: BaseException) -> bool:
+    if isinstance(e, StaleDataError):
+        return True
+    return isinstance(e, OperationalError) and getattr(e.orig, 'pgcode', None) in SERIALIZATION_FAILURE_CODES
+
+
+_default_session_factory = None  # type: Optional[sessionmaker]
+_default_session_factory_lock = threading.Lock()
+
+
+def get_session_factory() -> sessionmaker:
+    """Session factory of the process's default engine, both created on first use."""
+    global _default_session_factory
+    if _default_session_factory is None:
+        with _default_session_factory_lock:
+            if _default_session_factory is None:
+                _default_session_factory = sessionmaker(bind=db.get_engine(isolation_level='REPEATABLE READ'))
+    return _default_session_factory
+
+
+def new_session() -> Session:
+    """Opens a session on the default engine: the default `session_factory` everywhere."""
+    return get_session_factory()()
+
+
+def _forget_session_factory():
+    # In a forked child: the factory is bound to the parent's engine, see db._forget_engines
+    global _default_session_factory, _default_session_factory_lock
+    _default_session_factory = None
+    _default_session_factory_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_session_factory)
 
 
 class SqlAlchemyUnitOfWork(AbstractUnitOfWork):
-    def __init__(self, session_factory=DEFAULT_SESSION_FACTORY):
-        self.session_factory = session_factory
+    def __init__(self, session_factory: Callable[[], Session] = None, use_outbox: bool = None):
+        self.session_factory = session_factory or new_session
+        # With the outbox, events are committed with the changes and published later by the OutboxRelay
+        self.use_outbox = config.get_outbox_enabled() if use_outbox is None else use_outbox
 
     def __enter__(self):
         self.session: Session = self.session_factory()
         self.stores = repository.SqlAlchemyRepository(self.session)
+        # Statements run by this unit of work, see db.track_queries
+        self.queries, self._queries_token = db.start_tracking()
         return super().__enter__()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        super().__exit__(exc_type, exc_val, exc_tb)
-        self.session.close()
+        try:
+            super().__exit__(exc_type, exc_val, exc_tb)
+            self.session.close()
+        finally:
+            db.stop_tracking(self._queries_token)
+            logger.debug('Unit of work ran %s', self.queries)
+        if exc_val is not None and is_concurrent_update(exc_val):
+            raise ConcurrentUpdate(str(exc_val)) from exc_val
 
     def _commit(self):
+        if self.use_outbox:
+            event_outbox = outbox.SqlAlchemyOutbox(self.session)
+            for event in self.collect_new_events():
+                event_outbox.add(event)
         self.session.commit()
 
+    def keep_rejected_events(self, rejected: List[events.Event]):
+        # In a transaction of their own, for the OutboxRelay to publish
+        try:
+            event_outbox = outbox.SqlAlchemyOutbox(self.session)
+            for event in rejected:
+                event_outbox.add(event)
+            self.session.commit()
+        except Exception:
+            logger.exception('Failed to write %d rejected events to the outbox', len(rejected))
+            self.session.rollback()
+            super().keep_rejected_events(rejected)
+            return
+        metrics.REJECTED_EVENTS.inc('outbox', amount=len(rejected))
+        logger.warning('Wrote %d events rejected by the message bus to the outbox', len(rejected))
+
     def rollback(self):
         self.session.rollback()
+
+
+class AbstractAsyncUnitOfWork(abc.ABC):
+    stores: repository.AbstractAsyncRepository
+
+    async def __aenter__(self) -> AbstractAsyncUnitOfWork:
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.rollback()
+
+    async def commit(self):
+        with metrics.STAGE_SECONDS.time('commit'):
+            await self._commit()
+        with metrics.STAGE_SECONDS.time('publish_events'):
+            await self.publish_events()
+
+    @abc.abstractmethod
+    async def publish_events(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def _commit(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def rollback(self):
+        raise NotImplementedError
+
+
+class AsyncDbExecutor:
+    """Threads running the blocking session calls of AsyncSqlAlchemyUnitOfWork.
+
+    At most `workers` units of work are open at once. Without the cap every request on the
+    event loop would open a transaction, and each would then wait behind all the others'
+    queries for its next one, holding its connection and locks for the whole time.
+    """
+
+    def __init__(self, workers: int = None):
+        self.workers = workers or config.get_async_db_workers()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='db-async')
+        self._slots = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+
+    def slots(self) -> asyncio.Semaphore:
+        # A semaphore belongs to one event loop
+        loop = asyncio.get_running_loop()
+        if loop not in self._slots:
+            self._slots[loop] = asyncio.Semaphore(self.workers)
+        return self._slots[loop]
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+_async_db_executor = None  # type: Optional[AsyncDbExecutor]
+
+
+def get_async_db_executor() -> AsyncDbExecutor:
+    global _async_db_executor
+    if _async_db_executor is None:
+        _async_db_executor = AsyncDbExecutor()
+    return _async_db_executor
+
+
+class AsyncSqlAlchemyUnitOfWork(AbstractAsyncUnitOfWork):
+    """SqlAlchemyUnitOfWork driven from an event loop.
+
+    SQLAlchemy 1.3 has no asyncio support, so the session's blocking calls run on the threads
+    of an AsyncDbExecutor. They are awaited one after the other, so a session is only ever used
+    by one thread at a time, and the event loop is free while a query is running.
+    """
+
+    def __init__(self, session_factory=None, use_outbox: bool = None, executor: AsyncDbExecutor = None):
+        self._uow = SqlAlchemyUnitOfWork(session_factory, use_outbox)
+        self._executor = executor or get_async_db_executor()
+        self._slots = None  # type: Optional[asyncio.Semaphore]
+        self._context = None  # type: Optional[contextvars.Context]
+
+    @property
+    def queries(self) -> db.QueryStats:
+        return self._uow.queries
+
+    async def _run(self, fn: Callable[..., Any], *args) -> Any:
+        loop = asyncio.get_running_loop()
+        # Each call may land on another thread: run them all in one context, so that the query
+        # tracking started by __enter__ sees them. The calls never overlap, as a context requires.
+        future = loop.run_in_executor(self._executor.executor, functools.partial(self._context.run, fn, *args))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The call goes on running on its thread: it must finish before __aexit__ closes the session
+            while not future.done():
+                try:
+                    await asyncio.wait({future})
+                except asyncio.CancelledError:
+                    pass
+            raise
+
+    async def __aenter__(self) -> AsyncSqlAlchemyUnitOfWork:
+        self._slots = self._executor.slots()
+        await self._slots.acquire()
+        self._context = contextvars.copy_context()
+        try:
+            await self._run(self._uow.__enter__)
+        except BaseException:
+            self._slots.release()
+            raise
+        self.stores = repository.ExecutorRepository(self._uow.stores, self._run)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        try:
+            await self._run(self._uow.__exit__, exc_type, exc_val, exc_tb)
+        finally:
+            self._slots.release()
+
+    async def publish_events(self):
+        # Handlers are blocking as well
+        await self._run(self._uow.publish_events)
+
+    async def _commit(self):
+        await self._run(self._uow._commit)
+
+    async def rollback(self):
+        await self._run(self._uow.rollback)
@@ -0,0 +1,177 @@
+import json
+import platform
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, clear_mappers
+
+from storesvc.adapters import orm
+from storesvc.adapters.orm import metadata, start_mappers
+from storesvc.entrypoints.flask_app import create_app
+
+_results = []  # type: List[Dict]
+_regressions = []  # type: List[Dict]
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('benchmarks')
+    group.addoption('--benchmark-json', metavar='PATH', help='write the benchmark results to PATH as JSON')
+    group.addoption(
+        '--benchmark-baseline', metavar='PATH',
+        help='compare with the results saved by --benchmark-json and fail on regressions',
+    )
+    group.addoption(
+        '--benchmark-tolerance', type=float, default=0.25,
+        help='relative slowdown of a median over the baseline counted as a regression (default 0.25)',
+    )
+
+
+class Benchmark:
+    """`benchmark(fn)` times `fn` and returns its median. The figures a test computes from its timings or
+    measures otherwise (throughputs, peak memory, query plans) go in `benchmark.extra`, which is reported
+    with the results of the test."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.extra = {}  # type: Dict[str, Any]
+
+    def __call__(self, fn: Callable, name: str = None, rounds: int = 20, setup: Callable = None) -> float:
+        timings = []
+        for _ in range(rounds):
+            args = setup() if setup else ()
+            start = time.perf_counter()
+            fn(*args)
+            timings.append(time.perf_counter() - start)
+        median = statistics.median(timings)
+        _results.append({
+            'name': name or self.name,
+            'rounds': rounds,
+            'median': median,
+            'min': min(timings),
+        })
+        return median
+
+
+@pytest.fixture
+def benchmark(request):
+    bench = Benchmark(request.node.name)
+    yield bench
+    if bench.extra:
+        _results.append({'name': request.node.name, 'extra': bench.extra})
+
+
+@pytest.fixture
+def file_session_factory(tmp_path):
+    """SQLite file database shared by many threads, for contention benchmarks."""
+    engine = create_engine(
+        f'sqlite:///{tmp_path / "storesvc.db"}', connect_args={'check_same_thread': False, 'timeout': 30}
+    )
+    metadata.create_all(engine)
+    start_mappers()
+    yield sessionmaker(bind=engine)
+    clear_mappers()
+    engine.dispose()
+
+
+@pytest.fixture
+def flask_app(tmp_path, monkeypatch):
+    """App of flask_app.create_app on a SQLite file database without fsync."""
+    engine = create_engine(
+        f'sqlite:///{tmp_path / "storesvc.db"}', connect_args={'check_same_thread': False, 'timeout': 30}
+    )
+
+    @event.listens_for(engine, 'connect')
+    def skip_fsync(dbapi_connection, connection_record):
+        # Measure the application, not the disk
+        dbapi_connection.execute('PRAGMA synchronous=OFF')
+
+    metadata.create_all(engine)
+    monkeypatch.setenv('RESERVATION_SNAPSHOTS_ENABLED', 'false')
+    app = create_app(session_factory=sessionmaker(bind=engine))
+    yield app
+    app.extensions['storesvc'].close()
+    clear_mappers()
+    engine.dispose()
+
+
+@pytest.fixture
+def insert_catalog():
+    """Inserts a store with `item_count` items through Core and returns the store id and item ids."""
+    def _insert_catalog(session, item_count: int, quantity: int = 10 ** 9) -> Tuple[str, List[str]]:
+        store_id = str(uuid4())
+        item_ids = [str(uuid4()) for _ in range(item_count)]
+        session.execute(orm.stores.insert(), [dict(id=store_id, name='Store_001')])
+        session.execute(orm.items.insert(), [
+            dict(id=item_id, name=f'Item_{i:06}', price=1000.0, quantity=quantity) for i, item_id in enumerate(item_ids)
+        ])
+        session.execute(orm.store_items_mappings.insert(), [
+            dict(store_id=store_id, item_id=item_id) for item_id in item_ids
+        ])
+        session.commit()
+        return store_id, item_ids
+
+    return _insert_catalog
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[Dict]:
+    """Returns the results whose median is more than `tolerance` slower than the baseline's."""
+    baseline_medians = {result['name']: result['median'] for result in baseline if 'median' in result}
+    regressions = []
+    for result in results:
+        baseline_median = baseline_medians.get(result['name'])
+        if baseline_median and 'median' in result and result['median'] > baseline_median * (1 + tolerance):
+            regressions.append(dict(result, baseline=baseline_median, ratio=result['median'] / baseline_median))
+    return regressions
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    if not _results:
+        return
+    json_path = config.getoption('--benchmark-json')
+    if json_path:
+        Path(json_path).write_text(json.dumps({
+            'machine': {'python': platform.python_version(), 'platform': platform.platform()},
+            'benchmarks': _results,
+        }, indent=2))
+    baseline_path = config.getoption('--benchmark-baseline')
+    if baseline_path:
+        baseline = json.loads(Path(baseline_path).read_text())['benchmarks']
+        _regressions.extend(compare(_results, baseline, config.getoption('--benchmark-tolerance')))
+        if _regressions and session.exitstatus == pytest.ExitCode.OK:
+            session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _results:
+        return
+    terminalreporter.section('benchmarks')
+    for result in _results:
+        if 'median' in result:
+            terminalreporter.write_line(
+                f"{result['name']:<60} median {result['median'] * 1e6:>12.1f}us"
+                f"  min {result['min'] * 1e6:>12.1f}us  ({result['rounds']} rounds)"
+            )
+    for result in _results:
+        if 'extra' in result:
+            terminalreporter.write_line(f"{result['name']}:")
+            for key, value in result['extra'].items():
+                if isinstance(value, list):
+                    terminalreporter.write_line(f'    {key}:')
+                    for line in value:
+                        terminalreporter.write_line(f'        {line}')
+                else:
+                    terminalreporter.write_line(f"    {key}: {f'{value:.6g}' if isinstance(value, float) else value}")
+    if _regressions:
+        terminalreporter.section('benchmark regressions', red=True)
+        for result in _regressions:
+            terminalreporter.write_line(
+                f"{result['name']:<60} median {result['median'] * 1e6:>12.1f}us"
+                f"  baseline {result['baseline'] * 1e6:>12.1f}us  x{result['ratio']:.2f}",
+                red=True,
+            )
@@ -0,0 +1,134 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from storesvc.domain.model import Store, Item
+from storesvc.domain.value import OrderStatus, Order
+from storesvc.service_layer import lanes, services, unit_of_work
+
+from fakes import FakeOrderProvider
+
+THREADS = 8
+ORDERS_PER_THREAD = 25
+
+
+class CountingUnitOfWork(unit_of_work.SqlAlchemyUnitOfWork):
+    def __init__(self, session_factory, attempts):
+        super().__init__(session_factory)
+        self.attempts = attempts
+
+    def __enter__(self):
+        self.attempts.append(1)
+        return super().__enter__()
+
+
+def run_contention(session_factory, item_id, order_provider, order_ids):
+    attempts, failures = [], []
+
+    def worker(thread_order_ids):
+        for order_id in thread_order_ids:
+            try:
+                services.approve_order(order_id, CountingUnitOfWork(session_factory, attempts), order_provider)
+            except unit_of_work.ConcurrentUpdate:
+                failures.append(order_id)
+
+    threads = [threading.Thread(target=worker, args=(order_ids[i::THREADS],)) for i in range(THREADS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    [[quantity]] = session_factory().execute('SELECT quantity FROM items WHERE id=:id', dict(id=item_id))
+    approved = len(order_ids) - len(failures)
+    return {
+        'approved': approved,
+        'failed': len(failures),
+        'retries': len(attempts) - len(order_ids),
+        'throughput': approved / elapsed,
+        'quantity': quantity,
+    }
+
+
+@pytest.mark.parametrize('max_retries', [0, 20])
+def test_concurrent_approvals_on_one_store(benchmark, file_session_factory, monkeypatch, max_retries):
+    monkeypatch.setenv('APPROVE_MAX_RETRIES', str(max_retries))
+    monkeypatch.setenv('APPROVE_RETRY_BACKOFF', '0.002')
+    initial_quantity = THREADS * ORDERS_PER_THREAD
+    store = Store(name='Store_001')
+    item = Item(name='Item_001', price=1000.0, quantity=initial_quantity)
+    store.add_item(item)
+    session = file_session_factory()
+    session.add(store)
+    session.commit()
+    store_id, item_id = store.id, item.id
+    session.close()
+
+    orders = [
+        Order(order_id=f'o{i}', order_datetime=datetime.now(), customer_phone='01012341234',
+              store_id=store_id, item_ids=[item_id], order_status=OrderStatus.PUBLISHED.value)
+        for i in range(initial_quantity)
+    ]
+    result = run_contention(file_session_factory, item_id, FakeOrderProvider(orders), [o.order_id for o in orders])
+
+    benchmark.extra.update(
+        approved=result['approved'], failed=result['failed'], retries=result['retries'],
+        retries_per_order=result['retries'] / len(orders), approvals_per_s=result['throughput'],
+    )
+    # No lost updates: every approval that reported success is reflected in the stock
+    assert result['quantity'] == initial_quantity - result['approved']
+    if max_retries:
+        assert result['failed'] == 0
+
+
+@pytest.mark.parametrize('execution, group_commit_size', [('direct', 1), ('lanes', 1), ('lanes', 16)])
+def test_hot_store_throughput(benchmark, file_session_factory, monkeypatch, execution, group_commit_size):
+    monkeypatch.setenv('APPROVE_MAX_RETRIES', '50')
+    monkeypatch.setenv('APPROVE_RETRY_BACKOFF', '0.002')
+    order_count = THREADS * ORDERS_PER_THREAD
+    store = Store(name='Store_001')
+    item = Item(name='Item_001', price=1000.0, quantity=order_count)
+    store.add_item(item)
+    session = file_session_factory()
+    session.add(store)
+    session.commit()
+    store_id, item_id = store.id, item.id
+    session.close()
+    orders = [
+        Order(order_id=f'o{i}', order_datetime=datetime.now(), customer_phone='01012341234',
+              store_id=store_id, item_ids=[item_id], order_status=OrderStatus.PUBLISHED.value)
+        for i in range(order_count)
+    ]
+    order_provider = FakeOrderProvider(orders)
+    approval_lanes = lanes.ApprovalLanes(
+        lambda: unit_of_work.SqlAlchemyUnitOfWork(file_session_factory), order_provider,
+        lanes=4, group_commit_size=group_commit_size,
+    )
+    approval_lanes.start()
+
+    def approve(order_id):
+        if execution == 'lanes':
+            approval_lanes.approve(store_id, order_id, timeout=30)
+        else:
+            services.approve_order(order_id, unit_of_work.SqlAlchemyUnitOfWork(file_session_factory), order_provider)
+
+    threads = [
+        threading.Thread(target=lambda ids: [approve(order_id) for order_id in ids], args=(
+            [order.order_id for order in orders[i::THREADS]],
+        ))
+        for i in range(THREADS)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    approval_lanes.shutdown()
+
+    [[quantity]] = file_session_factory().execute('SELECT quantity FROM items WHERE id=:id', dict(id=item_id))
+    benchmark.extra['approvals_per_s'] = order_count / elapsed
+    assert quantity == 0
@@ -0,0 +1,92 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from storesvc.adapters import provider
+from storesvc.domain import model
+from storesvc.domain.value import OrderStatus, Order
+from storesvc.entrypoints.asgi_app import StoreSvcApp
+from storesvc.service_layer import unit_of_work
+
+STORES = 16
+REQUESTS = 400
+LATENCY = 0.05
+FLASK_THREADS = 8
+# SQLite takes one writer at a time: more sessions in flight only wait on its lock
+DB_WORKERS = 4
+
+
+def add_orders(session_factory, order_svc_stub, prefix: str):
+    order_ids = []
+    session = session_factory()
+    stores = []
+    for _ in range(STORES):
+        store = model.Store(name='Store_001')
+        store.add_item(model.Item(name='Item_001', price=1000.0, quantity=REQUESTS))
+        session.add(store)
+        stores.append((store.id, store.list_items()[0].id))
+    session.commit()
+    session.close()
+    for i in range(REQUESTS):
+        store_id, item_id = stores[i % STORES]
+        order = Order(order_id=f'{prefix}{i}', order_datetime=datetime.now(), customer_phone='01012341234',
+                      store_id=store_id, item_ids=[item_id], order_status=OrderStatus.PUBLISHED.value)
+        order_svc_stub.add_order(order)
+        order_ids.append((store_id, order.order_id))
+    return order_ids
+
+
+def test_asgi_keeps_more_approvals_in_flight_than_flask_threads(
+        benchmark, flask_app, order_svc_stub, monkeypatch
+):
+    monkeypatch.setenv('APPROVE_MAX_RETRIES', '20')
+    order_svc_stub.latency = LATENCY
+    session_factory = flask_app.extensions['storesvc'].session_factory
+    flask_orders = add_orders(session_factory, order_svc_stub, 'flask-')
+    asgi_orders = add_orders(session_factory, order_svc_stub, 'asgi-')
+
+    sync_provider = provider.OrderSvcProvider(url=order_svc_stub.url, pool_size=64)
+    monkeypatch.setattr(flask_app.extensions['storesvc'], 'order_provider', sync_provider)
+    client = flask_app.test_client()
+
+    def approve_with_flask(store_id, order_id):
+        response = client.post(f'/stores/{store_id}/orders', json={'order_id': order_id, 'order_status': 1})
+        assert response.status_code == 200
+
+    def run_flask():
+        with ThreadPoolExecutor(max_workers=FLASK_THREADS) as executor:
+            list(executor.map(lambda args: approve_with_flask(*args), flask_orders))
+
+    db_executor = unit_of_work.AsyncDbExecutor(DB_WORKERS)
+    asgi_app = StoreSvcApp(
+        lambda: unit_of_work.AsyncSqlAlchemyUnitOfWork(session_factory, executor=db_executor),
+        provider.ExecutorOrderProvider(sync_provider, workers=64),
+    )
+
+    async def approve_with_asgi(store_id, order_id):
+        sent = []
+        body = json.dumps({'order_id': order_id, 'order_status': 1}).encode()
+
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            sent.append(message)
+
+        await asgi_app({'type': 'http', 'method': 'POST', 'path': f'/stores/{store_id}/orders'}, receive, send)
+        return sent[0]['status']
+
+    async def approve_all_with_asgi():
+        statuses = await asyncio.gather(*(approve_with_asgi(*args) for args in asgi_orders))
+        assert set(statuses) == {200}
+
+    flask_elapsed = benchmark(run_flask, name=f'flask, {FLASK_THREADS} threads: {REQUESTS} approvals', rounds=1)
+    asgi_elapsed = benchmark(
+        lambda: asyncio.run(approve_all_with_asgi()), name=f'asgi, one event loop: {REQUESTS} approvals', rounds=1
+    )
+    sync_provider.close()
+    db_executor.shutdown()
+    benchmark.extra.update(flask_approvals_per_s=REQUESTS / flask_elapsed, asgi_approvals_per_s=REQUESTS / asgi_elapsed)
+
+    assert asgi_elapsed < flask_elapsed
@@ -0,0 +1,62 @@
+import io
+from uuid import uuid4
+
+from storesvc.domain import model
+from storesvc.service_layer import services, unit_of_work
+
+CATALOG_SIZE = 20_000
+
+
+def catalog_rows(count: int):
+    return [{'id': str(uuid4()), 'name': f'Item_{i:06}', 'price': 1000.0, 'quantity': 10} for i in range(count)]
+
+
+def test_bulk_import_is_faster_than_adding_items_through_the_orm(benchmark, file_session_factory):
+    def new_store() -> tuple:
+        with unit_of_work.SqlAlchemyUnitOfWork(file_session_factory, use_outbox=False) as uow:
+            store = model.Store(name='Store_001')
+            uow.stores.new(store)
+            uow.commit()
+            return (store.id,)
+
+    def add_through_orm(store_id: str):
+        with unit_of_work.SqlAlchemyUnitOfWork(file_session_factory, use_outbox=False) as uow:
+            store = uow.stores.get(store_id)
+            for row in catalog_rows(CATALOG_SIZE):
+                store.add_item(model.Item(**row))
+            uow.commit()
+
+    def bulk_import(store_id: str):
+        services.import_catalog(
+            store_id, catalog_rows(CATALOG_SIZE), unit_of_work.SqlAlchemyUnitOfWork(file_session_factory)
+        )
+
+    orm_path = benchmark(add_through_orm, name=f'add items through the ORM / {CATALOG_SIZE} items', rounds=3,
+                         setup=new_store)
+    bulk = benchmark(bulk_import, name=f'bulk import items / {CATALOG_SIZE} items', rounds=3, setup=new_store)
+    benchmark.extra.update(orm_items_per_s=CATALOG_SIZE / orm_path, bulk_import_items_per_s=CATALOG_SIZE / bulk)
+
+    assert bulk < orm_path / 2
+
+
+def test_import_endpoint_streams_a_csv_body(benchmark, flask_app):
+    client = flask_app.test_client()
+    session_factory = flask_app.extensions['storesvc'].session_factory
+    body = ('name,price,quantity\n' + ''.join(f'Item_{i:06},1000,10\n' for i in range(CATALOG_SIZE))).encode()
+
+    def new_store() -> tuple:
+        with unit_of_work.SqlAlchemyUnitOfWork(session_factory, use_outbox=False) as uow:
+            store = model.Store(name='Store_001')
+            uow.stores.new(store)
+            uow.commit()
+            return (store.id,)
+
+    def post(store_id: str):
+        response = client.post(
+            f'/stores/{store_id}/items/import', input_stream=io.BytesIO(body), content_type='text/csv',
+            content_length=len(body),
+        )
+        assert response.status_code == 200, response.get_data()
+        assert response.get_json() == {'imported': CATALOG_SIZE}
+
+    benchmark(post, name=f'POST items/import csv / {CATALOG_SIZE} items', rounds=3, setup=new_store)
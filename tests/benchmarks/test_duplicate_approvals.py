@@ -0,0 +1,51 @@
+import time
+from datetime import datetime
+
+from storesvc.adapters import provider
+from storesvc.domain.value import OrderStatus, Order
+from storesvc.service_layer import services, unit_of_work
+
+ORDER_COUNT = 200
+# Round trip to the order service, as in test_provider_concurrency
+ORDER_SVC_LATENCY = 0.005
+
+
+class SlowOrderProvider(provider.AbstractOrderProvider):
+    def __init__(self, orders):
+        self._orders = {order.order_id: order for order in orders}
+
+    def get_order(self, order_id):
+        time.sleep(ORDER_SVC_LATENCY)
+        return self._orders[order_id]
+
+    def list_orders(self, store_id):
+        return [order for order in self._orders.values() if order.store_id == store_id]
+
+
+def test_duplicate_approvals_skip_the_order_service_and_the_store(benchmark, file_session_factory, insert_catalog):
+    store_id, item_ids = insert_catalog(file_session_factory(), 1_000)
+    orders = [
+        Order(order_id=f'o{i}', order_datetime=datetime.now(), customer_phone='01012341234', store_id=store_id,
+              item_ids=item_ids[:5], order_status=OrderStatus.PUBLISHED.value)
+        for i in range(ORDER_COUNT)
+    ]
+    order_provider = SlowOrderProvider(orders)
+
+    def approve_all():
+        for order in orders:
+            services.approve_order(order.order_id, unit_of_work.SqlAlchemyUnitOfWork(file_session_factory),
+                                   order_provider)
+
+    first = benchmark(approve_all, name=f'approve {ORDER_COUNT} orders', rounds=1)
+    cached = benchmark(approve_all, name=f'approve {ORDER_COUNT} orders again, cached', rounds=5)
+    from_ledger = benchmark(
+        approve_all, name=f'approve {ORDER_COUNT} orders again, from the ledger', rounds=5,
+        setup=lambda: services.approved_orders.clear() or (),
+    )
+    benchmark.extra.update(
+        first_us_per_approval=first / ORDER_COUNT * 1e6,
+        cached_duplicate_us_per_approval=cached / ORDER_COUNT * 1e6,
+        ledger_duplicate_us_per_approval=from_ledger / ORDER_COUNT * 1e6,
+    )
+
+    assert cached < from_ledger < first / 5
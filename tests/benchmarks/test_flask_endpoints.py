@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from storesvc.domain.value import OrderStatus, Order
+
+from fakes import FakeOrderProvider
+
+CATALOG_SIZE = 1_000
+ORDER_COUNT = 200
+
+
+def test_list_items_endpoint(benchmark, flask_app, insert_catalog):
+    store_id, _ = insert_catalog(flask_app.extensions['storesvc'].session_factory(), CATALOG_SIZE)
+    client = flask_app.test_client()
+
+    def list_items():
+        response = client.get(f'/stores/{store_id}/items')
+        assert response.status_code == 200
+        return response
+
+    etag = list_items().headers['ETag'].strip('"')
+    flask_app.extensions['storesvc'].items_cache.clear()
+    benchmark(list_items, name=f'GET items, uncached / {CATALOG_SIZE} items', rounds=20,
+              setup=lambda: flask_app.extensions['storesvc'].items_cache.clear() or ())
+    benchmark(list_items, name=f'GET items, cached / {CATALOG_SIZE} items', rounds=200)
+    benchmark(
+        lambda: client.get(f'/stores/{store_id}/items', headers={'If-None-Match': f'"{etag}"'}),
+        name=f'GET items, not modified / {CATALOG_SIZE} items', rounds=200,
+    )
+
+
+def test_approve_order_endpoint(benchmark, flask_app, insert_catalog, monkeypatch):
+    store_id, item_ids = insert_catalog(flask_app.extensions['storesvc'].session_factory(), CATALOG_SIZE)
+    orders = [
+        Order(order_id=f'o{i}', order_datetime=datetime.now(), customer_phone='01012341234', store_id=store_id,
+              item_ids=item_ids[i % CATALOG_SIZE:i % CATALOG_SIZE + 3], order_status=OrderStatus.PUBLISHED.value)
+        for i in range(ORDER_COUNT)
+    ]
+    monkeypatch.setattr(flask_app.extensions['storesvc'], 'order_provider', FakeOrderProvider(orders))
+    client = flask_app.test_client()
+    order_ids = iter(order.order_id for order in orders)
+
+    def approve():
+        response = client.post(f'/stores/{store_id}/orders', json={'order_id': next(order_ids), 'order_status': 1})
+        assert response.status_code == 200
+
+    benchmark(approve, name=f'POST orders, approve 3 lines / {CATALOG_SIZE} items', rounds=ORDER_COUNT)
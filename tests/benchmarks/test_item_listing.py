@@ -0,0 +1,49 @@
+import json
+import tracemalloc
+
+CATALOG_SIZE = 20_000
+PAGE_SIZE = 100
+
+
+def test_pages_and_projection_are_cheaper_than_the_full_listing(benchmark, flask_app, insert_catalog):
+    store_id, item_ids = insert_catalog(flask_app.extensions['storesvc'].session_factory(), CATALOG_SIZE)
+    client = flask_app.test_client()
+
+    def get(query_string=None):
+        response = client.get(f'/stores/{store_id}/items', query_string=query_string)
+        assert response.status_code == 200
+        return response.get_data()
+
+    def peak_memory(query_string=None) -> int:
+        tracemalloc.start()
+        get(query_string)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+
+    full_body = json.loads(get())
+    streamed_body = json.loads(get({'fields': 'id,name,price,quantity'}))
+    assert sorted(streamed_body['items'], key=lambda item: item['id']) == sorted(
+        full_body['items'], key=lambda item: item['id']
+    )
+
+    def setup():
+        flask_app.extensions['storesvc'].items_cache.clear()
+        return ()
+
+    full = benchmark(get, name=f'GET items, full uncached / {CATALOG_SIZE} items', rounds=5, setup=setup)
+    streamed = benchmark(
+        lambda: get({'fields': 'id,quantity'}), name=f'GET items, streamed id,quantity / {CATALOG_SIZE} items',
+        rounds=5,
+    )
+    page = benchmark(
+        lambda: get({'limit': PAGE_SIZE, 'cursor': item_ids[len(item_ids) // 2]}),
+        name=f'GET items, page of {PAGE_SIZE} / {CATALOG_SIZE} items', rounds=20,
+    )
+    flask_app.extensions['storesvc'].items_cache.clear()
+    full_memory, streamed_memory = peak_memory(), peak_memory({'fields': 'id,quantity'})
+    benchmark.extra.update(full_peak_memory_bytes=full_memory, streamed_peak_memory_bytes=streamed_memory)
+
+    assert page < full / 10
+    assert streamed < full
+    assert streamed_memory < full_memory / 2
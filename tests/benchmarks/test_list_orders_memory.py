@@ -0,0 +1,34 @@
+import tracemalloc
+from datetime import datetime
+
+from storesvc.adapters import provider
+from storesvc.domain.value import OrderStatus, Order
+
+PAGE_SIZE = 50
+
+
+def peak_memory_listing(order_svc_stub, order_count: int) -> int:
+    order_svc_stub.orders.clear()
+    for i in range(order_count):
+        order_svc_stub.add_order(Order(
+            order_id=f'o{i}', order_datetime=datetime.now(), customer_phone='01012341234',
+            store_id='s1', item_ids=['i1', 'i2', 'i3'], order_status=OrderStatus.COMPLETED.value,
+        ))
+    order_provider = provider.OrderSvcProvider(url=order_svc_stub.url, page_size=PAGE_SIZE)
+
+    tracemalloc.start()
+    listed = sum(1 for _ in order_provider.list_orders('s1'))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    order_provider.close()
+
+    assert listed == order_count
+    return peak
+
+
+def test_list_orders_memory_is_flat_in_history_size(benchmark, order_svc_stub):
+    small = peak_memory_listing(order_svc_stub, 500)
+    large = peak_memory_listing(order_svc_stub, 10_000)
+
+    benchmark.extra.update(peak_memory_bytes_500_orders=small, peak_memory_bytes_10000_orders=large)
+    assert large < small * 2
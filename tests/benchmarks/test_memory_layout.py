@@ -0,0 +1,45 @@
+import gc
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List
+
+from storesvc.domain.value import OrderStatus, Order
+
+COUNT = 1_000_000
+
+
+@dataclass(frozen=True)
+class DictBackedOrder:
+    """The previous layout of value.Order, for comparison."""
+    order_id: str
+    order_datetime: datetime
+    customer_phone: str
+    store_id: str
+    item_ids: List[str]
+    order_status: OrderStatus
+
+
+def allocated_per_object(factory) -> float:
+    order_datetime = datetime.now()
+    gc.collect()
+    tracemalloc.start()
+    objects = [factory('o1', order_datetime, ['i1', 'i2', 'i3']) for _ in range(COUNT)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return current / COUNT
+
+
+def test_slotted_order_uses_less_memory(benchmark):
+    def order(cls):
+        return lambda order_id, order_datetime, item_ids: cls(
+            order_id=order_id, order_datetime=order_datetime, customer_phone='01012341234',
+            store_id='s1', item_ids=item_ids, order_status=OrderStatus.PUBLISHED.value,
+        )
+
+    dict_backed = allocated_per_object(order(DictBackedOrder))
+    slotted = allocated_per_object(order(Order))
+
+    benchmark.extra.update(dict_backed_bytes_per_order=dict_backed, slotted_bytes_per_order=slotted)
+    assert slotted < dict_backed * 0.8
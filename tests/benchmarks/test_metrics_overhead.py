@@ -0,0 +1,32 @@
+from storesvc import metrics
+
+CALLS = 10_000
+
+
+def test_metrics_overhead_is_negligible_next_to_an_approval(benchmark, flask_app, insert_catalog):
+    def time_stages():
+        # What one approval records: five stages and an outcome
+        for _ in range(CALLS):
+            for stage in ('get_order', 'get_store', 'approve', 'commit', 'publish_events'):
+                with metrics.STAGE_SECONDS.time(stage):
+                    pass
+            metrics.APPROVALS.inc('approved')
+
+    per_approval = benchmark(time_stages, name=f'approval metrics x {CALLS}', rounds=5) / CALLS
+    observe = benchmark(
+        lambda: [metrics.STAGE_SECONDS.observe(0.001, 'approve') for _ in range(CALLS)],
+        name=f'histogram observe x {CALLS}', rounds=5,
+    ) / CALLS
+
+    store_id, _ = insert_catalog(flask_app.extensions['storesvc'].session_factory(), 10)
+    client = flask_app.test_client()
+    request = benchmark(lambda: client.get(f'/stores/{store_id}/items'), name='GET items, cached / 10 items', rounds=200)
+    r = client.get('/metrics')
+    benchmark.extra.update(
+        observe_ns=observe * 1e9, approval_metrics_us=per_approval * 1e6, cached_get_us=request * 1e6,
+        metrics_bytes=len(r.data),
+    )
+
+    assert 'storesvc_stage_seconds_bucket{stage="approve",le="0.001"}' in r.get_data(as_text=True)
+    # Even the cheapest request is 20 times more than an approval's metrics
+    assert per_approval < request / 20
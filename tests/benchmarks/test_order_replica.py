@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from storesvc.adapters import provider
+from storesvc.adapters.order_events import FileOrderEventSource
+from storesvc.adapters.order_replica import ReplicaOrderProvider
+from storesvc.domain import events
+from storesvc.domain.value import OrderStatus, Order
+from storesvc.service_layer import services, unit_of_work
+from storesvc.service_layer.order_replication import OrderReplicator
+
+ORDER_COUNT = 100
+# Round trip to the order service
+ORDER_SVC_LATENCY = 0.005
+
+
+def test_replicated_orders_are_approved_without_the_order_service(
+        benchmark, file_session_factory, insert_catalog, order_svc_stub, tmp_path
+):
+    store_id, item_ids = insert_catalog(file_session_factory(), 1_000)
+    order_svc_stub.latency = ORDER_SVC_LATENCY
+    source = FileOrderEventSource(str(tmp_path / 'orders.jsonl'))
+    for prefix in ['remote', 'replica']:
+        orders = [
+            Order(order_id=f'{prefix}-{i}', order_datetime=datetime.now(), customer_phone='01012341234',
+                  store_id=store_id, item_ids=item_ids[:3], order_status=OrderStatus.PUBLISHED.value)
+            for i in range(ORDER_COUNT)
+        ]
+        for order in orders:
+            order_svc_stub.add_order(order)
+        source.append(events.OrderCreated(order=order) for order in orders)
+    replicated = OrderReplicator(source, file_session_factory, batch_size=ORDER_COUNT * 2).replicate_once()
+    assert replicated == ORDER_COUNT * 2
+
+    order_svc = provider.OrderSvcProvider(url=order_svc_stub.url)
+    replica = ReplicaOrderProvider(file_session_factory, order_svc)
+
+    def approver(prefix: str, order_provider: provider.AbstractOrderProvider):
+        order_ids = iter(f'{prefix}-{i}' for i in range(ORDER_COUNT))
+        return lambda: services.approve_order(
+            next(order_ids), unit_of_work.SqlAlchemyUnitOfWork(file_session_factory), order_provider
+        )
+
+    remote = benchmark(approver('remote', order_svc), name='approve, order from the order service',
+                       rounds=ORDER_COUNT)
+    requests_before = order_svc_stub.requests
+    local = benchmark(approver('replica', replica), name='approve, order from the replica', rounds=ORDER_COUNT)
+    order_svc.close()
+    benchmark.extra.update(order_service_approval_ms=remote * 1e3, replica_approval_ms=local * 1e3)
+
+    assert order_svc_stub.requests == requests_before
+    assert local < remote
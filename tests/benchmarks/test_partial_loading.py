@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from storesvc.adapters import repository
+from storesvc.domain.value import OrderStatus, Order
+
+CATALOG_SIZE = 50_000
+
+
+def test_partial_loading_approves_without_hydrating_the_catalog(benchmark, session_factory, insert_catalog):
+    store_id, item_ids = insert_catalog(session_factory(), CATALOG_SIZE)
+    order = Order(
+        order_id='o1',
+        order_datetime=datetime.now(),
+        customer_phone='01012341234',
+        store_id=store_id,
+        item_ids=item_ids[:3],
+        order_status=OrderStatus.PUBLISHED.value,
+    )
+    loaded_objects = {}
+
+    def approve(partial: bool):
+        session = session_factory()
+        repo = repository.SqlAlchemyRepository(session)
+        store = repo.get(store_id, item_ids=order.item_ids if partial else None)
+        store.approve(order)
+        session.commit()
+        loaded_objects[partial] = len(session.identity_map)
+        session.close()
+
+    full = benchmark(lambda: approve(partial=False), name=f'approve, full store ({CATALOG_SIZE} items)', rounds=3)
+    partial = benchmark(lambda: approve(partial=True), name=f'approve, ordered items only ({CATALOG_SIZE} items)', rounds=3)
+
+    benchmark.extra.update(full_objects_loaded=loaded_objects[False], partial_objects_loaded=loaded_objects[True])
+    assert loaded_objects[False] == CATALOG_SIZE + 1
+    assert loaded_objects[True] == len(order.item_ids) + 1
+    assert partial < full / 10
@@ -0,0 +1,125 @@
+import http.client
+import json
+import logging
+import os
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from storesvc.adapters.orm import metadata
+from storesvc.domain.value import Order, OrderStatus
+from storesvc.entrypoints import prefork
+from storesvc.entrypoints.flask_app import create_app
+
+from fakes import FakeOrderProvider
+
+CATALOG_SIZE = 100
+# One store per client, so that approvals scale with the workers rather than queue on a store's version
+CLIENTS = 8
+APPROVALS_PER_ROUND = 200
+ROUNDS = 3
+THREADS = 4
+WORKER_COUNTS = sorted({1, 2, os.cpu_count() or 1})
+
+
+def approve(port: int, store_id: str, order_id: str):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        connection.request('POST', f'/stores/{store_id}/orders', body=json.dumps(
+            {'order_id': order_id, 'order_status': OrderStatus.APPROVED.value}
+        ), headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        assert response.status == 200, response.read()
+        response.read()
+    finally:
+        connection.close()
+
+
+def serve(app_factory, workers: int):
+    sock = prefork.bind('127.0.0.1:0')
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            status = prefork.Arbiter(sock, app_factory, workers, THREADS, graceful_timeout=10).run()
+        finally:
+            os._exit(status)
+    port = sock.getsockname()[1]
+    sock.close()
+    return pid, port
+
+
+def test_approval_throughput_scales_with_workers(benchmark, tmp_path, monkeypatch, insert_catalog):
+    monkeypatch.setenv('RESERVATION_SNAPSHOTS_ENABLED', 'false')
+    path = tmp_path / 'storesvc.db'
+    engine = create_engine(f'sqlite:///{path}')
+    metadata.create_all(engine)
+    # Readers do not wait for the writer, as they would not on Postgres
+    engine.execute('PRAGMA journal_mode=WAL')
+    catalogs = [insert_catalog(sessionmaker(bind=engine)(), CATALOG_SIZE) for _ in range(CLIENTS)]
+    engine.dispose()
+
+    orders = {}
+    for workers in WORKER_COUNTS:
+        for round_name in ['warmup'] + [f'r{round_number}' for round_number in range(ROUNDS)]:
+            for i in range(APPROVALS_PER_ROUND):
+                store_id, item_ids = catalogs[i % CLIENTS]
+                order_id = f'w{workers}-{round_name}-o{i}'
+                orders[order_id] = Order(
+                    order_id=order_id, order_datetime=datetime.now(), customer_phone='01012341234',
+                    store_id=store_id, item_ids=item_ids[i % CATALOG_SIZE:i % CATALOG_SIZE + 3],
+                    order_status=OrderStatus.PUBLISHED.value,
+                )
+    order_provider = FakeOrderProvider(orders.values())
+
+    def app_factory():
+        # Runs in each worker, after the fork: the engine and its pool are the worker's own
+        worker_engine = create_engine(
+            f'sqlite:///{path}', connect_args={'check_same_thread': False, 'timeout': 30}
+        )
+
+        @event.listens_for(worker_engine, 'connect')
+        def skip_fsync(dbapi_connection, connection_record):
+            dbapi_connection.execute('PRAGMA synchronous=OFF')
+
+        # Without the access log, which would be most of the work of a worker
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        return create_app(session_factory=sessionmaker(bind=worker_engine), order_provider=order_provider)
+
+    throughputs = {}
+    for workers in WORKER_COUNTS:
+        pid, port = serve(app_factory, workers)
+        rounds = iter(range(ROUNDS))
+
+        def approve_round():
+            round_number = next(rounds)
+            batches = [
+                [(catalogs[i % CLIENTS][0], f'w{workers}-r{round_number}-o{i}')
+                 for i in range(client, APPROVALS_PER_ROUND, CLIENTS)]
+                for client in range(CLIENTS)
+            ]
+            with ThreadPoolExecutor(CLIENTS) as clients:
+                list(clients.map(lambda batch: [approve(port, *args) for args in batch], batches))
+
+        try:
+            # So that the workers have started and connected before the clock starts
+            for i in range(CLIENTS):
+                approve(port, catalogs[i][0], f'w{workers}-warmup-o{i}')
+            median = benchmark(
+                approve_round, name=f'POST orders, {APPROVALS_PER_ROUND} approvals / prefork {workers} workers',
+                rounds=ROUNDS,
+            )
+        finally:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+        throughputs[workers] = APPROVALS_PER_ROUND / median
+
+    cores = os.cpu_count() or 1
+    benchmark.extra['cores'] = cores
+    for workers, throughput in throughputs.items():
+        benchmark.extra[f'approvals_per_s_{workers}_workers'] = throughput
+    if cores > 1:
+        assert throughputs[max(WORKER_COUNTS)] > throughputs[1]
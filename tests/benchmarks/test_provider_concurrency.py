@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from storesvc.adapters import provider
+from storesvc.domain.value import OrderStatus, Order
+
+ORDER_COUNT = 100
+
+
+def test_get_orders_is_faster_than_serial_get_order(benchmark, order_svc_stub):
+    order_svc_stub.latency = 0.005
+    order_ids = [f'o{i}' for i in range(ORDER_COUNT)]
+    for order_id in order_ids:
+        order_svc_stub.add_order(Order(
+            order_id=order_id,
+            order_datetime=datetime.now(),
+            customer_phone='01012341234',
+            store_id='s1',
+            item_ids=['i1'],
+            order_status=OrderStatus.PUBLISHED.value,
+        ))
+    order_provider = provider.OrderSvcProvider(url=order_svc_stub.url, pool_size=10)
+
+    serial = benchmark(
+        lambda: [order_provider.get_order(order_id) for order_id in order_ids],
+        name=f'get_order x {ORDER_COUNT} (5ms latency)', rounds=3,
+    )
+    concurrent = benchmark(
+        lambda: order_provider.get_orders(order_ids),
+        name=f'get_orders {ORDER_COUNT} (5ms latency, pool 10)', rounds=3,
+    )
+    order_provider.close()
+
+    assert concurrent < serial / 2
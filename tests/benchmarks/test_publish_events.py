@@ -0,0 +1,49 @@
+from datetime import datetime
+
+import pytest
+
+from storesvc.domain import events
+from storesvc.domain.model import Store
+from storesvc.domain.value import OrderStatus, Order
+from storesvc.service_layer import messagebus, unit_of_work
+
+EVENT_COUNTS = [100, 10_000]
+
+
+class EventsRepository:
+    def __init__(self, stores):
+        self.seen = set(stores)
+        self.events = []
+
+
+class EventsUnitOfWork(unit_of_work.AbstractUnitOfWork):
+    def __init__(self, stores):
+        self.stores = EventsRepository(stores)
+
+    def _commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def handled(monkeypatch):
+    handled = []
+    monkeypatch.setitem(messagebus.HANDLERS, events.ApprovedOrder, [handled.append])
+    return handled
+
+
+def test_publish_events(benchmark, handled):
+    store = Store(name='Store_001')
+    order = Order(order_id='o1', order_datetime=datetime.now(), customer_phone='01012341234',
+                  store_id=store.id, item_ids=['i1'], order_status=OrderStatus.PUBLISHED.value)
+    uow = EventsUnitOfWork([store])
+    for count in EVENT_COUNTS:
+        def setup():
+            store.events = [events.ApprovedOrder(order=order) for _ in range(count)]
+            return ()
+
+        handled.clear()
+        benchmark(uow.publish_events, name=f'publish_events / {count} events', rounds=10, setup=setup)
+        assert len(handled) == count * 10
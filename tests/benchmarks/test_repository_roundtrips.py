@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from storesvc.adapters import repository
+from storesvc.domain.value import OrderStatus, Order
+from storesvc.service_layer import unit_of_work
+
+CATALOG_SIZES = [10, 1_000]
+
+
+def test_repository_get(benchmark, file_session_factory, insert_catalog):
+    for size in CATALOG_SIZES:
+        store_id, item_ids = insert_catalog(file_session_factory(), size)
+
+        def get_store():
+            session = file_session_factory()
+            repository.SqlAlchemyRepository(session).get(store_id).list_items()
+            session.close()
+
+        def get_partial_store():
+            session = file_session_factory()
+            repository.SqlAlchemyRepository(session).get(store_id, item_ids=item_ids[:10]).list_items()
+            session.close()
+
+        benchmark(get_store, name=f'repository get / {size} items', rounds=20)
+        benchmark(get_partial_store, name=f'repository get 10 items / {size} items', rounds=20)
+
+
+def test_approve_and_commit_round_trip(benchmark, file_session_factory, insert_catalog):
+    store_id, item_ids = insert_catalog(file_session_factory(), 1_000)
+    order = Order(order_id='o1', order_datetime=datetime.now(), customer_phone='01012341234',
+                  store_id=store_id, item_ids=item_ids[:10], order_status=OrderStatus.PUBLISHED.value)
+
+    def approve():
+        with unit_of_work.SqlAlchemyUnitOfWork(file_session_factory, use_outbox=False) as uow:
+            store = uow.stores.get(store_id, item_ids=order.item_ids)
+            store.approve(order)
+            uow.commit()
+
+    benchmark(approve, name='get 10 items, approve and commit / 1000 items', rounds=50)
@@ -0,0 +1,56 @@
+from typing import Dict, List
+
+from sqlalchemy.orm import Session
+
+from storesvc.adapters import db, migrations, orm
+from storesvc.adapters.repository import SqlAlchemyRepository
+
+STORE_COUNT = 500
+ITEMS_PER_STORE = 200
+
+
+def load_store(session: Session, store_id: str) -> int:
+    session.expunge_all()
+    return len(SqlAlchemyRepository(session).get(store_id).list_items())
+
+
+def query_plans(session: Session, store_id: str) -> Dict[str, List[str]]:
+    """EXPLAIN QUERY PLAN of the statements loading a store, whose one parameter is the store id."""
+    with db.track_queries(record=True) as queries:
+        load_store(session, store_id)
+    dbapi_connection = session.connection().connection
+    return {
+        sql: [row[-1] for row in dbapi_connection.execute(f'EXPLAIN QUERY PLAN {sql}', (store_id,))]
+        for sql in queries.sql
+    }
+
+
+def test_loading_a_store_searches_the_mappings_by_index(benchmark, file_session_factory, insert_catalog):
+    session = file_session_factory()
+    stores = [insert_catalog(session, ITEMS_PER_STORE) for _ in range(STORE_COUNT)]
+    store_id, _ = stores[STORE_COUNT // 2]
+    # The schema before the indexes: nothing but the surrogate id
+    for index in orm.store_items_mappings.indexes:
+        index.drop(session.connection())
+    session.commit()
+    name = f'{STORE_COUNT * ITEMS_PER_STORE} mappings'
+
+    assert load_store(session, store_id) == ITEMS_PER_STORE
+    plans_before = query_plans(session, store_id)
+    before = benchmark(lambda: load_store(session, store_id), name=f'load a store, no index / {name}', rounds=20)
+
+    migrations.add_store_items_indexes(session.connection())
+    session.commit()
+    plans_after = query_plans(session, store_id)
+    after = benchmark(lambda: load_store(session, store_id), name=f'load a store, indexed / {name}', rounds=20)
+
+    benchmark.extra['speedup'] = before / after
+    for label, plans in (('before', plans_before), ('after', plans_after)):
+        benchmark.extra[f'query_plans_{label}'] = [
+            f'{" ".join(sql.split())[:100]}...: {step}' for sql, plan in plans.items() for step in plan
+        ]
+    mapping_steps_before = [step for plan in plans_before.values() for step in plan if 'store_items_mappings' in step]
+    mapping_steps_after = [step for plan in plans_after.values() for step in plan if 'store_items_mappings' in step]
+    assert any(step.startswith('SCAN') for step in mapping_steps_before)
+    assert all('uq_store_items_mappings_store_id_item_id' in step for step in mapping_steps_after)
+    assert after < before
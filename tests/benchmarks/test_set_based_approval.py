@@ -0,0 +1,42 @@
+import dataclasses
+from datetime import datetime
+
+import pytest
+
+from storesvc.domain.value import OrderStatus, Order
+from storesvc.service_layer import services, unit_of_work
+
+from fakes import FakeOrderProvider
+
+ROUNDS = 20
+
+
+@pytest.mark.parametrize('catalog_size', [100, 50_000])
+def test_set_based_approval_against_aggregate_approval(
+        benchmark, session_factory, insert_catalog, monkeypatch, catalog_size
+):
+    store_id, item_ids = insert_catalog(session_factory(), catalog_size)
+    order = Order(
+        order_id='o1',
+        order_datetime=datetime.now(),
+        customer_phone='01012341234',
+        store_id=store_id,
+        item_ids=item_ids[:5] + item_ids[:5],
+        order_status=OrderStatus.PUBLISHED.value,
+    )
+    # Each approval needs its own order id: approving an order id again does nothing
+    orders = [dataclasses.replace(order, order_id=f'o{i}') for i in range(2 * ROUNDS)]
+    order_provider = FakeOrderProvider(orders)
+    order_ids = (order.order_id for order in orders)
+
+    medians = {}
+    for strategy in ['aggregate', 'set_based']:
+        monkeypatch.setenv('APPROVAL_STRATEGY', strategy)
+        medians[strategy] = benchmark(
+            lambda: services.approve_order(
+                next(order_ids), unit_of_work.SqlAlchemyUnitOfWork(session_factory), order_provider
+            ),
+            name=f'approve 10 lines, {strategy} ({catalog_size} items)', rounds=ROUNDS,
+        )
+
+    assert medians['set_based'] < medians['aggregate']
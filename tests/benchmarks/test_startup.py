@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+
+ROUNDS = 5
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import storesvc.entrypoints.flask_app as flask_app
+imported = time.perf_counter()
+app = flask_app.create_app()
+created = time.perf_counter()
+from storesvc.adapters import db
+print(json.dumps({
+    'import': imported - start,
+    'create_app': created - imported,
+    'driver_imported': 'psycopg2' in sys.modules,
+    'engines': len(db._engines),
+}))
+'''
+
+
+def run_python(code: str) -> str:
+    # No database to reach: starting must not need one
+    env = dict(os.environ, DB_HOST='db.invalid', RESERVATION_SNAPSHOTS_ENABLED='false')
+    return subprocess.run(
+        [sys.executable, '-c', code], env=env, check=True, stdout=subprocess.PIPE, universal_newlines=True
+    ).stdout
+
+
+def test_worker_starts_without_a_database(benchmark):
+    probes = []
+    interpreter = benchmark(lambda: run_python('pass'), name='start the interpreter', rounds=ROUNDS)
+    total = benchmark(
+        lambda: probes.append(json.loads(run_python(PROBE))), name='start the interpreter and create_app()',
+        rounds=ROUNDS,
+    )
+    imported = sorted(probe['import'] for probe in probes)[ROUNDS // 2]
+    created = sorted(probe['create_app'] for probe in probes)[ROUNDS // 2]
+    benchmark.extra.update(
+        interpreter_ms=interpreter * 1e3, import_ms=imported * 1e3, create_app_ms=created * 1e3, total_ms=total * 1e3
+    )
+
+    assert not any(probe['driver_imported'] or probe['engines'] for probe in probes)
+    assert created < 0.05
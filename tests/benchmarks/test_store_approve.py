@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from storesvc.domain.model import Store, Item
+from storesvc.domain.value import OrderStatus, Order
+
+CATALOG_SIZES = [10, 1_000, 100_000]
+
+
+def make_store(item_count: int) -> Store:
+    store = Store(name='Store_001')
+    for i in range(item_count):
+        store.add_item(Item(name=f'Item_{i:06}', price=1000.0, quantity=10 ** 9))
+    return store
+
+
+def make_order(store: Store, line_count: int) -> Order:
+    items = store.list_items()
+    return Order(
+        order_id='o1',
+        order_datetime=datetime.now(),
+        customer_phone='01012341234',
+        store_id=store.id,
+        item_ids=[items[-(i % len(items)) - 1].id for i in range(line_count)],
+        order_status=OrderStatus.PUBLISHED.value,
+    )
+
+
+def test_approve_latency_is_flat_in_catalog_size(benchmark):
+    medians = {}
+    for size in CATALOG_SIZES:
+        store = make_store(size)
+        order = make_order(store, line_count=10)
+        store.get_item(order.item_ids[0])  # build the index outside the timed loop
+        medians[size] = benchmark(lambda: store.approve(order), name=f'approve 10 lines / {size} items', rounds=200)
+
+    assert medians[CATALOG_SIZES[-1]] < medians[CATALOG_SIZES[0]] * 5
+
+
+def test_approve_latency_is_linear_in_order_size(benchmark):
+    store = make_store(1_000)
+    small_order, large_order = make_order(store, 100), make_order(store, 10_000)
+    small = benchmark(lambda: store.approve(small_order), name='approve 100 lines / 1000 items', rounds=50)
+    large = benchmark(lambda: store.approve(large_order), name='approve 10000 lines / 1000 items', rounds=50)
+
+    assert large < small * 100 * 5
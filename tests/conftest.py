@@ -1,16 +1,29 @@
+import json
 import pytest
+import threading
 import time
 import requests
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from typing import List
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
 
 from sqlalchemy import create_engine
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, clear_mappers
 
 from storesvc import config
-from storesvc.domain import model
+from storesvc.domain import model, value
+from storesvc.adapters import db
 from storesvc.adapters.orm import metadata, start_mappers
+from storesvc.service_layer import services
+
+
+@pytest.fixture(autouse=True)
+def clear_approved_orders():
+    # Tests reuse order ids: start each one without the approvals of the others
+    services.approved_orders.clear()
 
 
 @pytest.fixture
@@ -32,6 +45,20 @@ def session(session_factory):
     return session_factory()
 
 
+@pytest.fixture
+def assert_max_queries():
+    """`with assert_max_queries(n):` fails if the block runs more than n SQL statements."""
+    @contextmanager
+    def _assert_max_queries(max_queries: int):
+        with db.track_queries(record=True) as stats:
+            yield stats
+        assert stats.statements <= max_queries, (
+            f'{stats.statements} queries, expected at most {max_queries}:\n' + '\n'.join(stats.sql)
+        )
+
+    return _assert_max_queries
+
+
 def wait_for_webapp_to_come_up():
     deadline = time.time() + 10
     url = config.get_api_url()
@@ -95,3 +122,82 @@ def restart_api():
     time.sleep(0.5)
     wait_for_webapp_to_come_up()
 
+
+
+class OrderSvcStub(ThreadingHTTPServer):
+    """Local stand-in for the order service API, serving orders added with `add_order`."""
+    daemon_threads = True
+    # Room for a full client connection pool connecting at once
+    request_queue_size = 128
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(('127.0.0.1', 0), OrderSvcStubHandler)
+        self.latency = latency
+        self.orders = {}  # type: Dict[str, dict]
+        self.connections = 0
+        self.requests = 0
+
+    @property
+    def url(self):
+        return f'http://{self.server_address[0]}:{self.server_address[1]}'
+
+    def add_order(self, order: value.Order):
+        self.orders[order.order_id] = {
+            'id': order.order_id,
+            'orderDate': order.order_datetime.isoformat(),
+            'customerPhoneNumber': order.customer_phone,
+            'storeId': order.store_id,
+            'itemIds': list(order.item_ids),
+            'orderStatus': order.order_status,
+        }
+
+
+class OrderSvcStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests += 1
+        time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        if parts[:2] == ['api', 'orders'] and len(parts) == 3 and parts[2] in self.server.orders:
+            self._send_json(200, self.server.orders[parts[2]])
+        elif parts[:3] == ['api', 'orders', 'stores'] and len(parts) == 4:
+            # Pages of `limit` orders; the cursor is the offset of the next page
+            query = parse_qs(url.query)
+            limit = int(query.get('limit', ['100'])[0])
+            offset = int(query.get('cursor', ['0'])[0])
+            orders = [order for order in self.server.orders.values() if order['storeId'] == parts[3]]
+            next_offset = offset + limit
+            self._send_json(200, {
+                'orders': orders[offset:next_offset],
+                'nextCursor': str(next_offset) if next_offset < len(orders) else None,
+            })
+        else:
+            self._send_json(404, {'message': f'Not found {self.path}'})
+
+    def _send_json(self, status_code: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def order_svc_stub():
+    server = OrderSvcStub()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -28,6 +28,20 @@ class TestGetItemsApi:
             {'id': item.id, 'name': item.name, 'price': item.price, 'quantity': item.quantity} for item in items
         ]
 
+    @pytest.mark.usefixtures('restart_api')
+    def test_api_returns_304_if_items_are_not_modified(self, add_stores):
+        store = model.Store(name='Store_001')
+        store.add_item(model.Item(name='Item_001', price=1000.0, quantity=10))
+        add_stores([store])
+        url = config.get_api_url()
+
+        r = requests.get(f'{url}/stores/{store.id}/items')
+        assert r.status_code == 200
+        etag = r.headers['ETag']
+
+        r = requests.get(f'{url}/stores/{store.id}/items', headers={'If-None-Match': etag})
+        assert r.status_code == 304
+        assert r.headers['ETag'] == etag
 
     @pytest.mark.usefixtures('restart_api')
     def test_invalid_store_id_returns_404_and_error_message(self, add_stores):
@@ -39,3 +53,83 @@ class TestGetItemsApi:
         r = requests.get(f'{url}/stores/{str(invalid_store_id)}/items')
         assert r.status_code == 404
         assert r.json()['message'] == f'Invalid store id {invalid_store_id}'
+
+
+    @pytest.mark.usefixtures('restart_api')
+    def test_api_returns_pages_of_projected_items(self, add_stores):
+        store = model.Store(name='Store_001')
+        items = [model.Item(name=f'Item_00{i}', price=1000.0, quantity=i) for i in range(5)]
+        for item in items:
+            store.add_item(item)
+        add_stores([store])
+        url = config.get_api_url()
+        in_stock_ids = sorted(item.id for item in items if item.quantity > 0)
+
+        r = requests.get(
+            f'{url}/stores/{store.id}/items', params={'fields': 'id,quantity', 'limit': 3, 'in_stock': 'true'}
+        )
+        assert r.status_code == 200
+        assert [item['id'] for item in r.json()['items']] == in_stock_ids[:3]
+        assert set(r.json()['items'][0]) == {'id', 'quantity'}
+        next_cursor = r.json()['nextCursor']
+
+        r = requests.get(
+            f'{url}/stores/{store.id}/items',
+            params={'fields': 'id', 'limit': 3, 'in_stock': 'true', 'cursor': next_cursor},
+        )
+        assert r.json()['items'] == [{'id': item_id} for item_id in in_stock_ids[3:]]
+        assert r.json()['nextCursor'] is None
+
+    @pytest.mark.usefixtures('restart_api')
+    def test_api_rejects_unknown_item_fields(self, add_stores):
+        store = model.Store(name='Store_001')
+        add_stores([store])
+        url = config.get_api_url()
+
+        r = requests.get(f'{url}/stores/{store.id}/items', params={'fields': 'id,secret'})
+        assert r.status_code == 400
+
+    @pytest.mark.usefixtures('restart_api')
+    def test_api_imports_a_csv_catalog(self, add_stores):
+        store = model.Store(name='Store_001')
+        add_stores([store])
+        url = config.get_api_url()
+        body = 'name,price,quantity\n' + ''.join(f'Item_{i:03},1000,{i}\n' for i in range(10))
+
+        r = requests.post(
+            f'{url}/stores/{store.id}/items/import', data=body.encode(), headers={'Content-Type': 'text/csv'}
+        )
+        assert r.status_code == 200
+        assert r.json() == {'imported': 10}
+
+        r = requests.get(f'{url}/stores/{store.id}/items')
+        assert sorted(item['name'] for item in r.json()['items']) == [f'Item_{i:03}' for i in range(10)]
+
+    @pytest.mark.usefixtures('restart_api')
+    def test_api_rejects_an_invalid_catalog_line(self, add_stores):
+        store = model.Store(name='Store_001')
+        add_stores([store])
+        url = config.get_api_url()
+        body = '{"name": "Item_001", "price": 1000, "quantity": 1}\n{"name": "Item_002"}\n'
+
+        r = requests.post(
+            f'{url}/stores/{store.id}/items/import', data=body.encode(),
+            headers={'Content-Type': 'application/x-ndjson'},
+        )
+        assert r.status_code == 400
+        assert 'Line 2' in r.json()['message']
+
+
+class TestMetricsApi:
+    @pytest.mark.usefixtures('restart_api')
+    def test_api_exposes_request_metrics(self, add_stores):
+        store = model.Store(name='Store_001')
+        add_stores([store])
+        url = config.get_api_url()
+        requests.get(f'{url}/stores/{store.id}/items')
+
+        r = requests.get(f'{url}/metrics')
+        assert r.status_code == 200
+        assert r.headers['Content-Type'].startswith('text/plain')
+        assert 'storesvc_http_requests_total{endpoint="list_items_endpoint",status="200"}' in r.text
+        assert 'storesvc_http_request_seconds_bucket{endpoint="list_items_endpoint",le="+Inf"}' in r.text
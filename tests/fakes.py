@@ -0,0 +1,30 @@
+from typing import Iterable, List
+
+from storesvc.domain import value
+from storesvc.adapters import provider
+
+
+class FakeOrderProvider(provider.AbstractOrderProvider):
+    """Serves the orders it is given; `requested_ids` are the order ids asked for, in order."""
+
+    def __init__(self, orders: Iterable[value.Order] = ()):
+        self._orders = {order.order_id: order for order in orders}
+        self.requested_ids = []  # type: List[str]
+
+    def get_order(self, order_id: str) -> value.Order:
+        self.requested_ids.append(order_id)
+        try:
+            return self._orders[order_id]
+        except KeyError:
+            raise provider.InvalidOrderId(f'Invalid order id {order_id}')
+
+    def list_orders(self, store_id: str) -> List[value.Order]:
+        return [order for order in self._orders.values() if order.store_id == store_id]
+
+
+class FakeAsyncOrderProvider(provider.AbstractAsyncOrderProvider):
+    def __init__(self, orders: Iterable[value.Order] = ()):
+        self.provider = FakeOrderProvider(orders)
+
+    async def get_order(self, order_id: str) -> value.Order:
+        return self.provider.get_order(order_id)
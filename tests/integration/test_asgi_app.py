@@ -0,0 +1,183 @@
+import asyncio
+import json
+import threading
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, clear_mappers
+
+from storesvc.adapters.orm import metadata, start_mappers
+from storesvc.domain.model import Store, Item
+from storesvc.domain.value import OrderStatus, Order
+from storesvc.entrypoints.asgi_app import StoreSvcApp
+from storesvc.service_layer import unit_of_work
+
+from fakes import FakeAsyncOrderProvider
+
+
+@pytest.fixture
+def shared_session_factory(tmp_path):
+    # A file database, so that the executor threads all see the same data
+    engine = create_engine(
+        f'sqlite:///{tmp_path / "storesvc.db"}', connect_args={'check_same_thread': False, 'timeout': 30}
+    )
+    metadata.create_all(engine)
+    start_mappers()
+    yield sessionmaker(bind=engine)
+    clear_mappers()
+    engine.dispose()
+
+
+def insert_store(session_factory, quantity: int) -> Tuple[Store, Item]:
+    session = session_factory()
+    store = Store(name='Store_001')
+    item = Item(name='Item_001', price=1000.0, quantity=quantity)
+    store.add_item(item)
+    session.add(store)
+    session.commit()
+    store_id, item_id = store.id, item.id
+    session.close()
+    return store_id, item_id
+
+
+def make_order(order_id: str, store_id: str, item_ids: List[str]) -> Order:
+    return Order(order_id=order_id, order_datetime=datetime(2021, 3, 1), customer_phone='010-1234-1234',
+                 store_id=store_id, item_ids=item_ids, order_status=OrderStatus.PUBLISHED.value)
+
+
+async def call(app, method: str, path: str, body: Dict = None, payload: bytes = None) -> Tuple[int, Dict]:
+    sent = []
+    if payload is None:
+        payload = json.dumps(body).encode() if body is not None else b''
+
+    async def receive():
+        return {'type': 'http.request', 'body': payload, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app({'type': 'http', 'method': method, 'path': path}, receive, send)
+    return sent[0]['status'], json.loads(sent[1]['body'])
+
+
+def test_async_uow_loads_and_commits_through_the_executor(shared_session_factory):
+    store_id, item_id = insert_store(shared_session_factory, quantity=2)
+    order = make_order('o1', store_id, [item_id])
+
+    async def approve():
+        async with unit_of_work.AsyncSqlAlchemyUnitOfWork(shared_session_factory) as uow:
+            store = await uow.stores.get(store_id, item_ids=[item_id])
+            store.approve(order)
+            await uow.commit()
+        return uow
+
+    uow = asyncio.run(approve())
+
+    # Counted although each call may have run on another executor thread
+    assert uow.queries.statements == 3
+
+    [[quantity]] = shared_session_factory().execute('SELECT quantity FROM items WHERE id=:id', dict(id=item_id))
+    assert quantity == 1
+
+
+def test_async_uow_rolls_back_uncommitted_work(shared_session_factory):
+    store_id, item_id = insert_store(shared_session_factory, quantity=2)
+    order = make_order('o1', store_id, [item_id])
+
+    async def approve_without_commit():
+        async with unit_of_work.AsyncSqlAlchemyUnitOfWork(shared_session_factory) as uow:
+            store = await uow.stores.get(store_id)
+            store.approve(order)
+
+    asyncio.run(approve_without_commit())
+
+    [[quantity]] = shared_session_factory().execute('SELECT quantity FROM items WHERE id=:id', dict(id=item_id))
+    assert quantity == 2
+
+
+def test_asgi_app_approves_orders_concurrently(shared_session_factory):
+    store_id, item_id = insert_store(shared_session_factory, quantity=3)
+    orders = [make_order(f'o{i}', store_id, [item_id]) for i in range(4)]
+    app = StoreSvcApp(
+        lambda: unit_of_work.AsyncSqlAlchemyUnitOfWork(shared_session_factory), FakeAsyncOrderProvider(orders)
+    )
+
+    async def approve_all():
+        return await asyncio.gather(*(
+            call(app, 'POST', f'/stores/{store_id}/orders', {'order_id': order.order_id, 'order_status': 1})
+            for order in orders
+        ))
+
+    responses = asyncio.run(approve_all())
+
+    assert sorted(status for status, _ in responses) == [200, 200, 200, 400]
+    status, body = asyncio.run(call(app, 'GET', f'/stores/{store_id}/items'))
+    assert status == 200
+    assert body['items'][0]['quantity'] == 0
+
+
+def test_asgi_app_returns_json_errors(shared_session_factory):
+    app = StoreSvcApp(
+        lambda: unit_of_work.AsyncSqlAlchemyUnitOfWork(shared_session_factory), FakeAsyncOrderProvider([])
+    )
+    store_id = '00000000-0000-0000-0000-000000000000'
+
+    assert asyncio.run(call(app, 'GET', '/unknown'))[0] == 404
+    assert asyncio.run(call(app, 'GET', f'/stores/{store_id}/items'))[0] == 404
+    status, body = asyncio.run(
+        call(app, 'POST', f'/stores/{store_id}/orders', {'order_id': 'missing', 'order_status': 1})
+    )
+    assert status == 400
+    assert 'Invalid order id' in body['message']
+
+
+@pytest.mark.parametrize('payload', [b'', b'{"order_id": ', b'[]', b'{"order_id": "o1"}'])
+def test_asgi_app_rejects_missing_or_invalid_bodies(shared_session_factory, payload):
+    app = StoreSvcApp(
+        lambda: unit_of_work.AsyncSqlAlchemyUnitOfWork(shared_session_factory), FakeAsyncOrderProvider([])
+    )
+
+    status, body = asyncio.run(
+        call(app, 'POST', '/stores/00000000-0000-0000-0000-000000000000/orders', payload=payload)
+    )
+
+    assert status == 400
+    assert body['message']
+
+
+def test_cancelled_call_finishes_before_the_session_is_closed(shared_session_factory):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def blocking_call():
+        started.set()
+        release.wait(5)
+        calls.append('call')
+
+    async def cancel_during_call():
+        uow = unit_of_work.AsyncSqlAlchemyUnitOfWork(shared_session_factory)
+        real_exit = uow._uow.__exit__
+
+        def exit_after_call(*args):
+            calls.append('exit')
+            return real_exit(*args)
+
+        uow._uow.__exit__ = exit_after_call
+
+        async def use_uow():
+            async with uow:
+                await uow._run(blocking_call)
+
+        task = asyncio.ensure_future(use_uow())
+        await asyncio.get_running_loop().run_in_executor(None, started.wait)
+        task.cancel()
+        await asyncio.sleep(0.05)
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_during_call())
+
+    assert calls == ['call', 'exit']
@@ -0,0 +1,104 @@
+import os
+import pytest
+from sqlalchemy.exc import TimeoutError
+
+from storesvc.adapters import db
+
+
+@pytest.fixture
+def small_pool_engine(tmp_path, monkeypatch):
+    monkeypatch.setenv('DB_POOL_SIZE', '1')
+    monkeypatch.setenv('DB_MAX_OVERFLOW', '1')
+    monkeypatch.setenv('DB_POOL_TIMEOUT', '0.05')
+    engine = db.create_engine(f'sqlite:///{tmp_path / "storesvc.db"}')
+    yield engine
+    engine.dispose()
+
+
+def test_pool_stats_report_checked_out_connections_and_overflow(small_pool_engine):
+    first = small_pool_engine.connect()
+    second = small_pool_engine.connect()
+
+    stats = db.pool_stats(small_pool_engine)
+
+    assert stats['size'] == 1
+    assert stats['checked_out'] == 2
+    assert stats['overflow'] == 1
+    assert stats['checkouts'] == 2
+    first.close()
+    second.close()
+    assert db.pool_stats(small_pool_engine)['checked_out'] == 0
+
+
+def test_pool_stats_report_wait_time_and_timeouts(small_pool_engine):
+    connections = [small_pool_engine.connect(), small_pool_engine.connect()]
+
+    with pytest.raises(TimeoutError):
+        small_pool_engine.connect()
+
+    stats = db.pool_stats(small_pool_engine)
+    assert stats['timeouts'] == 1
+    assert stats['wait_seconds_max'] >= 0.05
+    for connection in connections:
+        connection.close()
+
+
+def test_statements_are_counted_by_every_active_tracker(small_pool_engine):
+    with db.track_queries() as outer:
+        small_pool_engine.execute('SELECT 1')
+        with db.track_queries(record=True) as inner:
+            small_pool_engine.execute('SELECT 2')
+
+    assert outer.statements == 2
+    assert inner.statements == 1
+    assert inner.sql == ['SELECT 2']
+    assert outer.sql is None
+
+
+def test_statements_slower_than_the_threshold_are_logged(small_pool_engine, monkeypatch, caplog):
+    monkeypatch.setenv('DB_SLOW_QUERY_THRESHOLD', '0')
+
+    with caplog.at_level('WARNING', logger='storesvc.adapters.db'):
+        small_pool_engine.execute('SELECT 1')
+
+    assert 'Slow query took' in caplog.text
+    assert 'SELECT 1' in caplog.text
+
+
+def test_engines_are_created_once_and_shared(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, '_engines', {})
+    uri = f'sqlite:///{tmp_path / "storesvc.db"}'
+    engine = db.get_engine(uri)
+
+    assert db.get_engine(uri) is engine
+    assert db.get_engine(uri, isolation_level='SERIALIZABLE') is not engine
+    engine.execute('SELECT 1')
+    db.dispose_engines()
+    assert engine.pool.checkedin() == 0
+
+
+def test_connections_inherited_through_fork_are_replaced_without_closing_them(small_pool_engine, monkeypatch):
+    with small_pool_engine.connect() as connection:
+        inherited = connection.connection.connection
+    # As if the engine had been inherited by a forked process
+    monkeypatch.setattr(db.os, 'getpid', lambda: -1)
+
+    with small_pool_engine.connect() as connection:
+        assert connection.connection.connection is not inherited
+    inherited.execute('SELECT 1')
+
+
+def test_forked_processes_create_their_own_engines(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, '_engines', {})
+    uri = f'sqlite:///{tmp_path / "storesvc.db"}'
+    engine = db.get_engine(uri)
+    read_end, write_end = os.pipe()
+
+    pid = os.fork()
+    if pid == 0:
+        os.write(write_end, b'new' if db.get_engine(uri) is not engine else b'inherited')
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+    assert os.read(read_end, 16) == b'new'
+    assert db.get_engine(uri) is engine
@@ -0,0 +1,248 @@
+import concurrent.futures
+import threading
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+
+from storesvc import metrics
+from storesvc.adapters import db
+from storesvc.domain import model
+from storesvc.domain.value import Order, OrderStatus
+from storesvc.entrypoints.flask_app import create_app
+from storesvc.service_layer import messagebus
+
+from fakes import FakeOrderProvider
+
+
+def make_order(order_id: str, store_id: str, item_ids) -> Order:
+    return Order(order_id=order_id, order_datetime=datetime(2021, 3, 1, 12, 30), customer_phone='01012341234',
+                 store_id=store_id, item_ids=list(item_ids), order_status=OrderStatus.PUBLISHED.value)
+
+
+@pytest.fixture
+def app(session_factory, monkeypatch):
+    monkeypatch.setenv('RESERVATION_SNAPSHOTS_ENABLED', 'false')
+    app = create_app(session_factory=session_factory)
+    yield app
+    app.extensions['storesvc'].close()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def stores(session):
+    """Two stores of one item each, 10 in stock."""
+    stores = []
+    for name in ('Store_001', 'Store_002'):
+        store = model.Store(name=name)
+        store.add_item(model.Item(name='Item_001', price=1000.0, quantity=10))
+        session.add(store)
+        stores.append(store)
+    session.commit()
+    return [(store.id, store.list_items()[0].id) for store in stores]
+
+
+def quantity(session, item_id: str) -> int:
+    session.expire_all()
+    return session.query(model.Item).get(item_id).quantity
+
+
+class TestBackgroundWorkers:
+    def test_closing_apps_stops_their_workers(self, session_factory, monkeypatch):
+        monkeypatch.setenv('RESERVATION_SNAPSHOTS_ENABLED', 'false')
+        monkeypatch.setenv('APPROVAL_EXECUTION', 'lanes')
+        monkeypatch.setenv('APPROVAL_LANES', '2')
+        monkeypatch.setenv('MESSAGEBUS_MODE', 'async')
+        threads = threading.active_count()
+
+        apps = [create_app(session_factory=session_factory) for _ in range(3)]
+        for app in apps:
+            app.extensions['storesvc'].close()
+            app.extensions['storesvc'].close()
+
+        assert threading.active_count() == threads
+        assert messagebus._dispatcher is None
+
+
+    def test_only_the_first_prefork_worker_replicates_orders(self, session_factory, monkeypatch, tmp_path):
+        monkeypatch.setenv('RESERVATIONS_ENABLED', 'false')
+        monkeypatch.setenv('ORDER_REPLICA_ENABLED', 'true')
+        monkeypatch.setenv('ORDER_EVENTS_PATH', str(tmp_path / 'orders.jsonl'))
+        monkeypatch.setenv('WEB_WORKERS', '2')
+        replicators = []
+        for index in ('0', '1'):
+            monkeypatch.setenv('WEB_WORKER_INDEX', index)
+            app = create_app(session_factory=session_factory)
+            replicators.append([thread for thread in threading.enumerate() if thread.name == 'order-replication'])
+            app.extensions['storesvc'].close()
+
+        assert [len(threads) for threads in replicators] == [1, 0]
+
+    def test_prefork_workers_have_no_reservation_book(self, session_factory, monkeypatch):
+        monkeypatch.setenv('WEB_WORKER_INDEX', '0')
+        monkeypatch.setenv('WEB_WORKERS', '2')
+
+        app = create_app(session_factory=session_factory)
+
+        assert app.extensions['storesvc'].reservation_book is None
+        app.extensions['storesvc'].close()
+
+
+class TestReservationsApi:
+    def test_disabled_reservations_return_404(self, session_factory, monkeypatch, stores):
+        monkeypatch.setenv('RESERVATIONS_ENABLED', 'false')
+        app = create_app(session_factory=session_factory)
+        client = app.test_client()
+        store_id, _ = stores[0]
+
+        r = client.post(f'/stores/{store_id}/reservations', json={'order_id': 'o1'})
+
+        assert r.status_code == 404
+        assert r.get_json() == {'message': 'Reservations are disabled'}
+        app.extensions['storesvc'].close()
+
+    def test_reservations_are_refused_when_served_by_several_processes(self, app, client, stores):
+        store_id, _ = stores[0]
+
+        r = client.post(
+            f'/stores/{store_id}/reservations', json={'order_id': 'o1'}, environ_overrides={'wsgi.multiprocess': True}
+        )
+
+        assert r.status_code == 404
+        assert len(app.extensions['storesvc'].reservation_book) == 0
+
+
+class TestReserveOrderApi:
+    def test_rejects_an_order_of_another_store(self, app, client, stores):
+        (store_id, _), (other_store_id, other_item_id) = stores
+        app.extensions['storesvc'].order_provider = FakeOrderProvider(
+            [make_order('o1', other_store_id, [other_item_id])]
+        )
+
+        r = client.post(f'/stores/{store_id}/reservations', json={'order_id': 'o1'})
+
+        assert r.status_code == 400
+        assert 'store id is not matched' in r.get_json()['message']
+        assert len(app.extensions['storesvc'].reservation_book) == 0
+
+
+class TestBulkOrdersApi:
+    def test_approves_the_orders_of_the_store(self, app, client, session, stores):
+        store_id, item_id = stores[0]
+        app.extensions['storesvc'].order_provider = FakeOrderProvider(
+            [make_order('o1', store_id, [item_id]), make_order('o2', store_id, [item_id, item_id])]
+        )
+
+        r = client.post(f'/stores/{store_id}/orders/bulk', json={'order_ids': ['o1', 'o2', 'missing']})
+
+        assert r.status_code == 200
+        results = {result['order_id']: result['result'] for result in r.get_json()['results']}
+        assert results == {'o1': 'success', 'o2': 'success', 'missing': 'InvalidOrder'}
+        assert quantity(session, item_id) == 7
+
+    def test_rejects_orders_of_another_store(self, app, client, session, stores):
+        (store_id, item_id), (other_store_id, other_item_id) = stores
+        app.extensions['storesvc'].order_provider = FakeOrderProvider(
+            [make_order('o1', store_id, [item_id]), make_order('o2', other_store_id, [other_item_id])]
+        )
+
+        r = client.post(f'/stores/{store_id}/orders/bulk', json={'order_ids': ['o1', 'o2']})
+
+        assert r.status_code == 200
+        results = {result['order_id']: result for result in r.get_json()['results']}
+        assert results['o1']['result'] == 'success'
+        assert results['o2']['result'] == 'InvalidOrder'
+        assert 'store id is not matched' in results['o2']['message']
+        assert quantity(session, item_id) == 9
+        assert quantity(session, other_item_id) == 10
+
+
+class TestImportCatalogApi:
+    def test_duplicate_item_id_returns_409_with_the_items_imported(self, client, session, stores, monkeypatch):
+        monkeypatch.setenv('CATALOG_IMPORT_CHUNK_SIZE', '1')
+        store_id, _ = stores[0]
+        item_id = str(uuid4())
+        body = f'id,name,price,quantity\n{item_id},Item_002,1000,1\n{item_id},Item_003,1000,1\n'
+
+        r = client.post(f'/stores/{store_id}/items/import', data=body, content_type='text/csv')
+
+        assert r.status_code == 409
+        assert r.get_json()['imported'] == 1
+        assert quantity(session, item_id) == 1
+
+    def test_item_id_that_is_not_a_uuid_returns_400(self, client, stores):
+        store_id, _ = stores[0]
+        body = 'id,name,price,quantity\ni2,Item_002,1000,1\n'
+
+        r = client.post(f'/stores/{store_id}/items/import', data=body, content_type='text/csv')
+
+        assert r.status_code == 400
+        assert r.get_json()['imported'] == 0
+
+    def test_quoted_line_breaks_are_kept_in_the_item(self, client, session, stores):
+        store_id, _ = stores[0]
+        item_id = str(uuid4())
+        body = f'id,name,price,quantity\r\n{item_id},"Item_002\r\nLarge",1000,1\r\n'
+
+        r = client.post(f'/stores/{store_id}/items/import', data=body, content_type='text/csv')
+
+        assert r.status_code == 200, r.get_json()
+        [[name]] = session.execute('SELECT name FROM items WHERE id=:id', dict(id=item_id))
+        assert name == 'Item_002\r\nLarge'
+
+
+class FailingOrderProvider:
+    def get_order(self, order_id):
+        raise RuntimeError('order service is down')
+
+
+class TimingOutLanes:
+    def approve(self, store_id, order_id, timeout=None):
+        raise concurrent.futures.TimeoutError()
+
+
+class TestOrdersApi:
+    def test_approves_the_order(self, app, client, session, stores):
+        store_id, item_id = stores[0]
+        app.extensions['storesvc'].order_provider = FakeOrderProvider([make_order('o1', store_id, [item_id])])
+
+        r = client.post(f'/stores/{store_id}/orders', json={'order_id': 'o1', 'order_status': 1})
+
+        assert r.status_code == 200
+        assert quantity(session, item_id) == 9
+
+    def test_approval_timing_out_on_its_lane_returns_503(self, app, client, stores):
+        store_id, _ = stores[0]
+        app.extensions['storesvc'].approval_lanes = TimingOutLanes()
+
+        r = client.post(f'/stores/{store_id}/orders', json={'order_id': 'o1', 'order_status': 1})
+
+        assert r.status_code == 503
+        assert r.headers['Retry-After'] == '1'
+
+    def test_failing_request_is_counted_as_500(self, app, client, stores):
+        store_id, _ = stores[0]
+        app.extensions['storesvc'].order_provider = FailingOrderProvider()
+        failures = metrics.HTTP_REQUESTS.value('handle_orders_endpoint', '500')
+        durations = metrics.HTTP_REQUEST_SECONDS.count('handle_orders_endpoint')
+
+        r = client.post(f'/stores/{store_id}/orders', json={'order_id': 'o1', 'order_status': 1})
+
+        assert r.status_code == 500
+        assert metrics.HTTP_REQUESTS.value('handle_orders_endpoint', '500') == failures + 1
+        assert metrics.HTTP_REQUEST_SECONDS.count('handle_orders_endpoint') == durations + 1
+
+    def test_request_raising_stops_tracking_its_queries(self, app, client, stores):
+        store_id, _ = stores[0]
+        app.extensions['storesvc'].order_provider = FailingOrderProvider()
+        # The exception propagates, as with PROPAGATE_EXCEPTIONS: no after_request handler runs
+        app.testing = True
+
+        with pytest.raises(RuntimeError):
+            client.post(f'/stores/{store_id}/orders', json={'order_id': 'o1', 'order_status': 1})
+
+        assert db._trackers.get() == ()
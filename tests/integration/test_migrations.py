@@ -0,0 +1,184 @@
+import datetime
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import clear_mappers, sessionmaker
+
+from storesvc import config
+from storesvc.adapters import migrations, orm
+from storesvc.adapters.repository import SqlAlchemyRepository
+from storesvc.entrypoints import migrate
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "storesvc.db"}')
+    yield engine
+    engine.dispose()
+
+
+def drop_store_items_indexes(engine):
+    for index in orm.store_items_mappings.indexes:
+        index.drop(engine)
+
+
+def index_names(engine, table: str):
+    return {index['name'] for index in inspect(engine).get_indexes(table)}
+
+
+def test_upgrade_creates_the_schema(engine):
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+
+    assert set(orm.metadata.tables) <= set(inspect(engine).get_table_names())
+    assert index_names(engine, 'store_items_mappings') == {
+        'uq_store_items_mappings_store_id_item_id', 'ix_store_items_mappings_item_id'
+    }
+
+
+def test_upgrade_adds_the_missing_indexes_and_deletes_duplicate_mappings(engine):
+    orm.metadata.create_all(engine)
+    drop_store_items_indexes(engine)
+    engine.execute(orm.stores.insert(), [dict(id='s1', name='Store_001')])
+    engine.execute(orm.items.insert(), [dict(id='i1', name='Item_001', price=1000.0, quantity=10),
+                                        dict(id='i2', name='Item_002', price=2000.0, quantity=20)])
+    engine.execute(orm.store_items_mappings.insert(), [
+        dict(store_id='s1', item_id='i1'), dict(store_id='s1', item_id='i2'), dict(store_id='s1', item_id='i1'),
+    ])
+
+    with engine.begin() as connection:
+        deleted = migrations.add_store_items_indexes(connection)
+
+    assert deleted == 1
+    assert list(engine.execute('SELECT id, store_id, item_id FROM store_items_mappings ORDER BY id')) == [
+        (1, 's1', 'i1'), (2, 's1', 'i2'),
+    ]
+    assert 'uq_store_items_mappings_store_id_item_id' in index_names(engine, 'store_items_mappings')
+
+
+def test_upgrade_adds_the_owner_of_reservations(engine):
+    orm.metadata.create_all(engine)
+    engine.execute('DROP TABLE reservations')
+    engine.execute(
+        'CREATE TABLE reservations (id CHAR(36) PRIMARY KEY, "order" TEXT NOT NULL, expires_at FLOAT NOT NULL)'
+    )
+    engine.execute('INSERT INTO reservations VALUES (\'r1\', \'{}\', 0)')
+
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+
+    assert list(engine.execute('SELECT id, owner FROM reservations')) == [('r1', '')]
+    assert 'ix_reservations_owner' in index_names(engine, 'reservations')
+
+
+def test_upgrading_again_changes_nothing(engine):
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+
+    with engine.begin() as connection:
+        assert migrations.add_store_items_indexes(connection) == 0
+        assert not migrations.add_reservation_owner(connection)
+        assert not migrations.widen_consumer_positions(connection)
+        migrations.upgrade(connection)
+
+
+def test_uuid_columns_include_foreign_keys():
+    assert set(migrations.uuid_columns()) == {
+        ('stores', 'id'), ('items', 'id'), ('store_items_mappings', 'store_id'),
+        ('store_items_mappings', 'item_id'), ('processed_orders', 'store_id'), ('orders', 'store_id'),
+    }
+
+
+def test_native_uuid_columns_need_postgres(engine, capsys):
+    uri = str(engine.url)
+
+    assert migrate.main(['--uri', uri, '--native-uuid']) == 1
+    assert 'need Postgres' in capsys.readouterr().err
+    assert migrate.main(['--uri', uri]) == 0
+
+
+MIGRATION_SCHEMA = 'storesvc_migrations'
+
+
+@pytest.fixture
+def migration_engine(postgres_db):
+    """Returns a function creating an engine on a schema of its own of the Postgres database,
+    so that migrating its tables leaves the tables of the other tests alone."""
+    postgres_db.execute(f'DROP SCHEMA IF EXISTS {MIGRATION_SCHEMA} CASCADE')
+    postgres_db.execute(f'CREATE SCHEMA {MIGRATION_SCHEMA}')
+    engines = []
+
+    def _migration_engine():
+        engine = create_engine(
+            config.get_postgres_uri(), connect_args={'options': f'-csearch_path={MIGRATION_SCHEMA}'}
+        )
+        engines.append(engine)
+        return engine
+
+    yield _migration_engine
+    for engine in engines:
+        engine.dispose()
+    postgres_db.execute(f'DROP SCHEMA {MIGRATION_SCHEMA} CASCADE')
+
+
+def test_convert_keys_to_uuid_keeps_the_rows_for_native_uuid_columns(migration_engine, monkeypatch):
+    engine = migration_engine()
+    orm.metadata.create_all(engine)
+    store_id, item_ids = str(uuid4()), sorted(str(uuid4()) for _ in range(3))
+    engine.execute(orm.stores.insert(), [dict(id=store_id, name='Store_001')])
+    engine.execute(orm.items.insert(), [
+        dict(id=item_id, name=f'Item_{i:03}', price=1000.0, quantity=10) for i, item_id in enumerate(item_ids)
+    ])
+    engine.execute(orm.store_items_mappings.insert(), [
+        dict(store_id=store_id, item_id=item_id) for item_id in item_ids
+    ])
+    engine.execute(orm.processed_orders.insert(), [
+        dict(order_id='o1', store_id=store_id, processed_at=datetime.datetime.utcnow())
+    ])
+
+    with engine.connect() as connection:
+        converted = migrations.convert_keys_to_uuid(connection)
+        assert migrations.convert_keys_to_uuid(connection) == []
+
+    assert sorted(converted) == sorted(migrations.uuid_columns())
+    inspector = inspect(engine)
+    for table, column in converted:
+        assert [
+            str(info['type']).upper() for info in inspector.get_columns(table) if info['name'] == column
+        ] == ['UUID']
+    assert {
+        foreign_key['referred_table'] for foreign_key in inspector.get_foreign_keys('store_items_mappings')
+    } == {'stores', 'items'}
+
+    # The engine of a service started with native uuid columns
+    monkeypatch.setenv('DB_NATIVE_UUID', 'true')
+    orm.start_mappers()
+    try:
+        session = sessionmaker(bind=migration_engine())()
+        store = SqlAlchemyRepository(session).get(store_id)
+        assert store.id == store_id
+        assert sorted(item.id for item in store.list_items()) == item_ids
+        assert SqlAlchemyRepository(session).get_approved_order_ids(['o1', 'o2']) == {'o1'}
+        session.close()
+    finally:
+        clear_mappers()
+
+
+def test_upgrade_widens_consumer_positions_on_postgres(migration_engine):
+    engine = migration_engine()
+    orm.metadata.create_all(engine)
+    engine.execute('ALTER TABLE consumer_positions ALTER COLUMN position TYPE INTEGER')
+    engine.execute(orm.consumer_positions.insert(), [dict(name='orders', position=2 ** 31 - 1)])
+
+    with engine.begin() as connection:
+        migrations.upgrade(connection)
+        assert not migrations.widen_consumer_positions(connection)
+
+    assert [
+        str(info['type']).upper() for info in inspect(engine).get_columns('consumer_positions')
+        if info['name'] == 'position'
+    ] == ['BIGINT']
+    # Past 2 GiB of events
+    engine.execute(orm.consumer_positions.update().values(position=5 * 2 ** 30))
+    assert list(engine.execute('SELECT name, position FROM consumer_positions')) == [('orders', 5 * 2 ** 30)]
@@ -0,0 +1,86 @@
+import pytest
+from datetime import datetime
+from typing import List
+
+from storesvc.adapters import provider
+from storesvc.adapters.order_events import FileOrderEventSource
+from storesvc.adapters.order_replica import ReplicaOrderProvider, SqlAlchemyOrderReplica
+from storesvc.domain import events
+from storesvc.domain.model import Store, Item
+from storesvc.domain.value import Order, OrderStatus
+from storesvc.service_layer import services, unit_of_work
+from storesvc.service_layer.order_replication import OrderReplicator
+
+from fakes import FakeOrderProvider
+
+
+def make_order(order_id: str, store_id: str = 's1', item_ids: List[str] = ('i1',),
+               order_status: int = OrderStatus.PUBLISHED.value) -> Order:
+    return Order(order_id=order_id, order_datetime=datetime(2021, 3, 1, 12, 30), customer_phone='01012341234',
+                 store_id=store_id, item_ids=item_ids, order_status=order_status)
+
+
+def test_replica_saves_orders_and_replaces_them(session):
+    replica = SqlAlchemyOrderReplica(session)
+    replica.save([make_order('o1'), make_order('o2')])
+    session.commit()
+
+    replica.save([make_order('o2', order_status=OrderStatus.CANCELED.value), make_order('o3')])
+    session.commit()
+
+    assert replica.get_orders(['o1', 'o2', 'o3', 'o4']) == {
+        'o1': make_order('o1'),
+        'o2': make_order('o2', order_status=OrderStatus.CANCELED.value),
+        'o3': make_order('o3'),
+    }
+
+
+def test_replicator_resumes_after_the_last_committed_event(session_factory, tmp_path):
+    source = FileOrderEventSource(str(tmp_path / 'orders.jsonl'))
+    source.append([events.OrderCreated(order=make_order(f'o{i}')) for i in range(5)])
+
+    assert OrderReplicator(source, session_factory, batch_size=3).replicate_once() == 3
+    source.append([events.OrderUpdated(order=make_order('o0', order_status=OrderStatus.CANCELED.value))])
+    # A new replicator, as after a restart
+    replicator = OrderReplicator(source, session_factory, batch_size=3)
+    assert replicator.replicate_once() == 3
+    assert replicator.replicate_once() == 0
+
+    orders = SqlAlchemyOrderReplica(session_factory()).get_orders([f'o{i}' for i in range(5)])
+    assert sorted(orders) == [f'o{i}' for i in range(5)]
+    assert orders['o0'].order_status == OrderStatus.CANCELED.value
+
+
+def test_provider_reads_replicated_orders_and_falls_back_for_the_others(session_factory):
+    session = session_factory()
+    SqlAlchemyOrderReplica(session).save([make_order('o1')])
+    session.commit()
+    fallback = FakeOrderProvider([make_order('o2')])
+    order_provider = ReplicaOrderProvider(session_factory, fallback)
+
+    assert order_provider.get_order('o1') == make_order('o1')
+    assert order_provider.get_order('o2') == make_order('o2')
+    assert order_provider.get_orders(['o1', 'o2', 'o3']) == {'o1': make_order('o1'), 'o2': make_order('o2')}
+    with pytest.raises(provider.InvalidOrderId):
+        order_provider.get_order('o3')
+    assert fallback.requested_ids == ['o2', 'o2', 'o3', 'o3']
+
+
+def test_approval_of_a_replicated_order_does_not_call_the_order_service(session_factory, tmp_path):
+    store = Store(name='Store_001')
+    item = Item(name='Item_001', price=1000.0, quantity=10)
+    store.add_item(item)
+    session = session_factory()
+    session.add(store)
+    session.commit()
+    source = FileOrderEventSource(str(tmp_path / 'orders.jsonl'))
+    source.append([events.OrderCreated(order=make_order('o1', store.id, [item.id, item.id]))])
+    OrderReplicator(source, session_factory).replicate_once()
+    fallback = FakeOrderProvider()
+
+    services.approve_order('o1', unit_of_work.SqlAlchemyUnitOfWork(session_factory),
+                           ReplicaOrderProvider(session_factory, fallback))
+
+    assert fallback.requested_ids == []
+    [[quantity]] = session_factory().execute('SELECT quantity FROM items WHERE id=:id', dict(id=item.id))
+    assert quantity == 8
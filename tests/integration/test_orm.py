@@ -1,3 +1,8 @@
+import pytest
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from storesvc.adapters import orm
 from storesvc.domain import model
 
 
@@ -56,3 +61,30 @@ def test_retrieving_store_item_mappings(session):
     store = session.query(model.Store).one()
 
     assert store._items == [new_item]
+
+
+def test_starting_the_mappers_again_keeps_them(session):
+    orm.start_mappers()
+    session.add(model.Store(name='Store_001'))
+    session.commit()
+
+    assert [store.name for store in session.query(model.Store)] == ['Store_001']
+
+
+def test_ids_are_native_uuids_on_postgres_only_when_configured(monkeypatch):
+    assert orm.stores.c.id.type.compile(dialect=postgresql.dialect()) == 'CHAR(36)'
+
+    monkeypatch.setenv('DB_NATIVE_UUID', 'true')
+
+    assert orm.stores.c.id.type.compile(dialect=postgresql.dialect()) == 'UUID'
+    assert orm.store_items_mappings.c.store_id.type.compile(dialect=postgresql.dialect()) == 'UUID'
+    assert orm.stores.c.id.type.compile(dialect=sqlite.dialect()) == 'CHAR(36)'
+
+
+def test_a_store_maps_an_item_only_once(session):
+    session.execute("INSERT INTO stores (id, name) VALUES ('s1', 'Store_001')")
+    session.execute("INSERT INTO items (id, name, price, quantity) VALUES ('i1', 'Item_001', 1000.0, 10)")
+    session.execute("INSERT INTO store_items_mappings (store_id, item_id) VALUES ('s1', 'i1')")
+
+    with pytest.raises(IntegrityError):
+        session.execute("INSERT INTO store_items_mappings (store_id, item_id) VALUES ('s1', 'i1')")
@@ -0,0 +1,125 @@
+import pytest
+from datetime import datetime
+from typing import List
+
+from storesvc import metrics
+from storesvc.adapters import outbox
+from storesvc.domain import events
+from storesvc.domain.model import Store, Item
+from storesvc.domain.value import OrderStatus, Order
+from storesvc.service_layer import messagebus, unit_of_work
+from storesvc.service_layer.outbox_relay import OutboxRelay
+
+
+def make_store_and_order():
+    store = Store(name='Store_001')
+    item = Item(name='Item_001', price=1000.0, quantity=10)
+    store.add_item(item)
+    order = Order(order_id='o1', order_datetime=datetime(2021, 3, 1, 12, 30), customer_phone='010-1234-1234',
+                  store_id=store.id, item_ids=[item.id], order_status=OrderStatus.PUBLISHED.value)
+    return store, order
+
+
+def approve_with_outbox(session_factory, store_id: str, order: Order, commit=True):
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory, use_outbox=True)
+    with uow:
+        store = uow.stores.get(store_id)
+        store.approve(order)
+        if commit:
+            uow.commit()
+
+
+@pytest.fixture
+def published(monkeypatch):
+    published = []  # type: List[events.Event]
+    monkeypatch.setitem(messagebus.HANDLERS, events.ApprovedOrder, [published.append])
+    return published
+
+
+def test_event_is_serialized_and_deserialized():
+    _, order = make_store_and_order()
+    event = events.ApprovedOrder(order=order)
+
+    assert outbox.deserialize('ApprovedOrder', outbox.serialize(event)) == event
+
+
+def test_uow_writes_events_to_outbox_instead_of_publishing(session_factory, published):
+    store, order = make_store_and_order()
+    session = session_factory()
+    session.add(store)
+    session.commit()
+
+    approve_with_outbox(session_factory, store.id, order)
+
+    assert published == []
+    [(event_type, payload)] = session.execute('SELECT event_type, payload FROM outbox')
+    assert outbox.deserialize(event_type, payload) == events.ApprovedOrder(order=order)
+
+
+def test_events_rejected_by_the_message_bus_are_written_to_the_outbox(session_factory, monkeypatch):
+    def reject(event):
+        raise messagebus.QueueFull('ApprovedOrder rejected: 2 events are waiting')
+
+    monkeypatch.setattr(messagebus, 'handle', reject)
+    store, order = make_store_and_order()
+    session = session_factory()
+    session.add(store)
+    session.commit()
+    kept = metrics.REJECTED_EVENTS.value('outbox')
+
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory, use_outbox=False)
+    with uow:
+        uow.stores.get(store.id).approve(order)
+        uow.commit()
+
+    [[quantity]] = session.execute('SELECT quantity FROM items')
+    assert quantity == 9
+    [(event_type, payload)] = session.execute('SELECT event_type, payload FROM outbox')
+    assert outbox.deserialize(event_type, payload) == events.ApprovedOrder(order=order)
+    assert metrics.REJECTED_EVENTS.value('outbox') == kept + 1
+
+
+def test_outbox_is_rolled_back_with_the_changes(session_factory, published):
+    store, order = make_store_and_order()
+    session = session_factory()
+    session.add(store)
+    session.commit()
+
+    approve_with_outbox(session_factory, store.id, order, commit=False)
+
+    assert list(session.execute('SELECT * FROM outbox')) == []
+
+
+def test_relay_hands_outbox_events_to_handlers_in_batches(session_factory, published):
+    store, order = make_store_and_order()
+    session = session_factory()
+    session.add(store)
+    session.commit()
+    for _ in range(3):
+        approve_with_outbox(session_factory, store.id, order)
+
+    relay = OutboxRelay(session_factory, batch_size=2)
+
+    assert relay.relay_once() == 2
+    assert relay.relay_once() == 1
+    assert relay.relay_once() == 0
+    assert published == [events.ApprovedOrder(order=order)] * 3
+    assert list(session.execute('SELECT * FROM outbox')) == []
+
+
+def test_relay_keeps_events_whose_handler_failed(session_factory, monkeypatch):
+    store, order = make_store_and_order()
+    session = session_factory()
+    session.add(store)
+    session.commit()
+    approve_with_outbox(session_factory, store.id, order)
+
+    def fail(event):
+        raise RuntimeError('broker is down')
+
+    monkeypatch.setitem(messagebus.HANDLERS, events.ApprovedOrder, [fail])
+    relay = OutboxRelay(session_factory)
+
+    assert relay.relay_once() == 0
+    [[count]] = session.execute('SELECT count(*) FROM outbox')
+    assert count == 1
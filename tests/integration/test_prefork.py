@@ -0,0 +1,172 @@
+import http.client
+import json
+import os
+import signal
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from storesvc.adapters import orm
+from storesvc.domain.value import Order, OrderStatus
+from storesvc.entrypoints import prefork
+from storesvc.entrypoints.flask_app import StoreSvc, create_app
+
+from fakes import FakeOrderProvider
+
+STORE_ID = '7d0d4e5c-3a44-4a7a-9d2f-0b1c4b1f5a10'
+
+
+ORDERS = [
+    Order(order_id=f'o{i}', order_datetime=datetime(2021, 3, 1, 12, 30), customer_phone='01012341234',
+          store_id=STORE_ID, item_ids=['i1'], order_status=OrderStatus.PUBLISHED.value)
+    for i in range(10)
+]
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    monkeypatch.setenv('RESERVATION_SNAPSHOTS_ENABLED', 'false')
+    path = tmp_path / 'storesvc.db'
+    engine = create_engine(f'sqlite:///{path}')
+    orm.metadata.create_all(engine)
+    engine.execute(orm.stores.insert(), [dict(id=STORE_ID, name='Store_001')])
+    engine.execute(orm.items.insert(), [dict(id='i1', name='Item_001', price=1000.0, quantity=100)])
+    engine.execute(orm.store_items_mappings.insert(), [dict(store_id=STORE_ID, item_id='i1')])
+    engine.dispose()
+    return path
+
+
+@pytest.fixture
+def serve():
+    """Runs the pre-fork server in a child process, as its master; yields a function starting it."""
+    masters = []
+
+    def _serve(app_factory, workers: int = 2):
+        sock = prefork.bind('127.0.0.1:0')
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                status = prefork.Arbiter(sock, app_factory, workers, threads=4, graceful_timeout=5).run()
+            finally:
+                os._exit(status)
+        port = sock.getsockname()[1]
+        sock.close()
+        masters.append(pid)
+        return pid, port
+
+    yield _serve
+
+    for pid in masters:
+        try:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+
+
+def request(port: int, method: str, path: str, body: dict = None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        connection.request(method, path, body=json.dumps(body) if body else None,
+                           headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def wait_for_exit(pid: int, timeout: float = 10) -> int:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        waited, status = os.waitpid(pid, os.WNOHANG)
+        if waited:
+            return os.WEXITSTATUS(status)
+        time.sleep(0.05)
+    pytest.fail(f'Process {pid} still running after {timeout}s')
+
+
+def test_workers_approve_orders_on_their_own_engines(db_path, serve):
+    def app_factory():
+        engine = create_engine(f'sqlite:///{db_path}', connect_args={'check_same_thread': False, 'timeout': 30})
+        return create_app(session_factory=sessionmaker(bind=engine), order_provider=FakeOrderProvider(ORDERS))
+
+    pid, port = serve(app_factory)
+    for order in ORDERS:
+        status, body = request(port, 'POST', f'/stores/{STORE_ID}/orders',
+                               {'order_id': order.order_id, 'order_status': 1})
+        assert status == 200, body
+
+    status, body = request(port, 'GET', f'/stores/{STORE_ID}/items')
+    assert status == 200
+    assert json.loads(body)['items'][0]['quantity'] == 100 - len(ORDERS)
+
+
+def test_master_stops_its_workers_on_sigterm(db_path, serve):
+    pid, port = serve(lambda: create_app(order_provider=FakeOrderProvider(ORDERS)))
+    status, _ = request(port, 'GET', '/metrics')
+    assert status == 200
+
+    os.kill(pid, signal.SIGTERM)
+
+    assert wait_for_exit(pid) == 0
+
+
+def test_master_stops_when_workers_fail_to_start(serve):
+    def app_factory():
+        raise RuntimeError('No configuration')
+
+    pid, _ = serve(app_factory)
+
+    assert wait_for_exit(pid) == 1
+
+
+def test_workers_are_numbered_and_restarted_with_their_number(db_path, tmp_path, serve):
+    started = tmp_path / 'started'
+
+    def app_factory():
+        with open(started, 'a') as file:
+            file.write(f'{os.environ["WEB_WORKER_INDEX"]} {os.getpid()}\n')
+        return create_app()
+
+    def started_workers(count: int) -> dict:
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            lines = started.read_text().splitlines() if started.exists() else []
+            if len(lines) >= count:
+                return dict(reversed(line.split()) for line in lines)
+            time.sleep(0.05)
+        pytest.fail(f'{count} workers not started')
+
+    serve(app_factory)
+    indexes = started_workers(2)
+    assert sorted(indexes.values()) == ['0', '1']
+
+    first = next(pid for pid, index in indexes.items() if index == '0')
+    os.kill(int(first), signal.SIGKILL)
+
+    indexes = started_workers(3)
+    assert sorted(indexes.values()) == ['0', '0', '1']
+
+
+def test_workers_do_not_take_reservations(db_path, serve):
+    _, port = serve(lambda: create_app(order_provider=FakeOrderProvider(ORDERS)))
+    status, body = request(port, 'POST', f'/stores/{STORE_ID}/reservations', {'order_id': ORDERS[0].order_id})
+
+    assert status == 404, body
+
+
+def test_workers_stop_the_background_workers_of_their_app(db_path, serve, tmp_path, monkeypatch):
+    monkeypatch.setattr(StoreSvc, 'close', lambda self: (tmp_path / f'closed-{os.getpid()}').touch())
+    # One worker, which is serving once it has answered
+    pid, port = serve(lambda: create_app(order_provider=FakeOrderProvider(ORDERS)), workers=1)
+    status, _ = request(port, 'GET', '/metrics')
+    assert status == 200
+
+    os.kill(pid, signal.SIGTERM)
+    assert wait_for_exit(pid) == 0
+
+    assert len(list(tmp_path.glob('closed-*'))) == 1
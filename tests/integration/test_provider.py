@@ -0,0 +1,83 @@
+import pytest
+from datetime import datetime, timezone
+
+from storesvc.adapters import provider
+from storesvc.domain.value import OrderStatus, Order
+
+
+def make_order(order_id: str, store_id: str = 's1') -> Order:
+    return Order(
+        order_id=order_id,
+        order_datetime=datetime(2021, 3, 1, 12, 30),
+        customer_phone='01012341234',
+        store_id=store_id,
+        item_ids=['i1', 'i1', 'i2'],
+        order_status=OrderStatus.PUBLISHED.value,
+    )
+
+
+def test_get_order_returns_domain_order(order_svc_stub):
+    order = make_order('o1')
+    order_svc_stub.add_order(order)
+    order_provider = provider.OrderSvcProvider(url=order_svc_stub.url)
+
+    assert order_provider.get_order('o1') == order
+
+
+def test_get_order_raises_invalid_order_id_for_unknown_order(order_svc_stub):
+    order_provider = provider.OrderSvcProvider(url=order_svc_stub.url)
+
+    with pytest.raises(provider.InvalidOrderId, match='o1'):
+        order_provider.get_order('o1')
+
+
+def test_get_orders_fetches_orders_over_pooled_connections(order_svc_stub):
+    orders = [make_order(f'o{i}') for i in range(50)]
+    for order in orders:
+        order_svc_stub.add_order(order)
+    order_provider = provider.OrderSvcProvider(url=order_svc_stub.url, pool_size=4)
+
+    result = order_provider.get_orders([order.order_id for order in orders] + ['unknown'])
+
+    assert result == {order.order_id: order for order in orders}
+    assert order_svc_stub.requests == 51
+    assert order_svc_stub.connections <= 4
+
+
+def test_list_orders_returns_orders_of_the_store(order_svc_stub):
+    orders = [make_order('o1', 's1'), make_order('o2', 's2'), make_order('o3', 's1')]
+    for order in orders:
+        order_svc_stub.add_order(order)
+    order_provider = provider.OrderSvcProvider(url=order_svc_stub.url)
+
+    assert list(order_provider.list_orders('s1')) == [orders[0], orders[2]]
+
+
+def test_list_orders_walks_all_pages_lazily(order_svc_stub):
+    orders = [make_order(f'o{i}', 's1') for i in range(100)]
+    for order in orders:
+        order_svc_stub.add_order(order)
+    order_provider = provider.OrderSvcProvider(url=order_svc_stub.url, page_size=7)
+
+    listed = order_provider.list_orders('s1')
+    first = next(listed)
+
+    assert first == orders[0]
+    assert order_svc_stub.requests == 1
+    assert [first] + list(listed) == orders
+    assert order_svc_stub.requests == 15
+
+
+@pytest.mark.parametrize('order_date, expected', [
+    ('2021-03-01T12:30:00', datetime(2021, 3, 1, 12, 30)),
+    ('2021-03-01T12:30:00Z', datetime(2021, 3, 1, 12, 30, tzinfo=timezone.utc)),
+    ('2021-03-01T21:30:00+09:00', datetime(2021, 3, 1, 12, 30, tzinfo=timezone.utc)),
+    (1614601800000, datetime(2021, 3, 1, 12, 30, tzinfo=timezone.utc)),
+])
+def test_to_domain_parses_order_date(order_date, expected):
+    order = provider.OrderSvcProvider.to_domain({
+        'id': 'o1', 'orderDate': order_date, 'customerPhoneNumber': '01012341234',
+        'storeId': 's1', 'itemIds': ['i1'], 'orderStatus': OrderStatus.PUBLISHED.value,
+    })
+
+    assert order.order_datetime == expected
@@ -1,5 +1,10 @@
+import pytest
+from datetime import datetime
+from uuid import uuid4
+
 from storesvc.domain import model
-from storesvc.adapters import repository
+from storesvc.domain.value import Order, OrderStatus
+from storesvc.adapters import orm, repository
 
 
 def test_repository_can_save_a_store(session):
@@ -31,3 +36,225 @@ def test_repository_can_retrieve_a_store_with_mapping_items(session):
 
     assert retrieved == store
     assert retrieved._items == store._items
+
+
+def test_retrieved_store_can_look_up_mapping_items_by_id(session):
+    item = model.Item(name='Item_001', price=1000.0, quantity=1)
+    store = insert_store_with_item(session, model.Store(name='Store_001'), item)
+    store_id, item_id = store.id, item.id
+    session.close()
+
+    repo = repository.SqlAlchemyRepository(session)
+    retrieved = repo.get(store_id)
+
+    assert retrieved.get_item(item_id).id == item_id
+    assert retrieved.get_item('invalid_item_id') is None
+
+
+def test_repository_can_get_version_number_of_a_store(session):
+    store = model.Store(name='Store_001', version_number=3)
+    session.add(store)
+    session.commit()
+
+    repo = repository.SqlAlchemyRepository(session)
+
+    assert repo.get_version_number(store.id) == 3
+    with pytest.raises(repository.InvalidStoreId):
+        repo.get_version_number('invalid_store_id')
+
+
+def test_repository_can_retrieve_a_store_with_only_requested_items(session):
+    store = model.Store(name='Store_001')
+    items = [model.Item(name=f'Item_00{i}', price=1000.0, quantity=i) for i in range(5)]
+    for item in items:
+        store.add_item(item)
+    session.add(store)
+    session.commit()
+    store_id, item_ids = store.id, [item.id for item in items]
+    session.close()
+
+    repo = repository.SqlAlchemyRepository(session)
+    retrieved = repo.get(store_id, item_ids=[item_ids[1], item_ids[3], 'invalid_item_id'])
+
+    assert {item.id for item in retrieved.list_items()} == {item_ids[1], item_ids[3]}
+    assert retrieved.get_item(item_ids[3]).quantity == 3
+    assert retrieved.get_item(item_ids[0]) is None
+
+
+def test_repository_raises_invalid_store_id_when_retrieving_requested_items(session):
+    repo = repository.SqlAlchemyRepository(session)
+
+    with pytest.raises(repository.InvalidStoreId):
+        repo.get('invalid_store_id', item_ids=['invalid_item_id'])
+
+
+def test_repository_decrements_quantities_of_items_with_enough_stock(session):
+    store = model.Store(name='Store_001')
+    items = [model.Item(name=f'Item_00{i}', price=1000.0, quantity=2) for i in range(3)]
+    for item in items:
+        store.add_item(item)
+    other_store = model.Store(name='Store_002')
+    other_item = model.Item(name='Item_004', price=1000.0, quantity=2)
+    other_store.add_item(other_item)
+    session.add_all([store, other_store])
+    session.commit()
+    store_id, version_number = store.id, store.version_number
+    item_ids, other_item_id = [item.id for item in items], other_item.id
+    session.close()
+
+    repo = repository.SqlAlchemyRepository(session)
+    decremented = repo.decrement_quantities(
+        store_id, {item_ids[0]: 1, item_ids[1]: 3, other_item_id: 1}
+    )
+
+    assert decremented == 1
+    assert repo.get_quantities(store_id, item_ids + [other_item_id]) == {
+        item_ids[0]: 1, item_ids[1]: 2, item_ids[2]: 2,
+    }
+    assert repo.get_version_number(store_id) == version_number + 1
+
+
+def test_repository_does_not_decrement_held_quantities(session):
+    store_id, [item_id] = insert_store_with_items(session, 1)
+    repo = repository.SqlAlchemyRepository(session)
+
+    assert repo.decrement_quantities(store_id, {item_id: 3}, held={item_id: 8}) == 0
+    assert repo.decrement_quantities(store_id, {item_id: 3}, held={item_id: 7}) == 1
+    assert repo.get_quantities(store_id, [item_id]) == {item_id: 7}
+
+
+def test_repository_raises_invalid_store_id_when_decrementing_quantities(session):
+    repo = repository.SqlAlchemyRepository(session)
+
+    with pytest.raises(repository.InvalidStoreId):
+        repo.decrement_quantities('invalid_store_id', {'invalid_item_id': 1})
+
+
+def insert_store_with_items(session, item_count: int):
+    store = model.Store(name='Store_001')
+    for i in range(item_count):
+        store.add_item(model.Item(name=f'Item_{i:03}', price=1000.0, quantity=10))
+    session.add(store)
+    session.commit()
+    store_id, item_ids = store.id, [item.id for item in store.list_items()]
+    session.close()
+    return store_id, item_ids
+
+
+def test_getting_a_store_loads_its_items_in_one_more_query(session, assert_max_queries):
+    store_id, _ = insert_store_with_items(session, 20)
+    repo = repository.SqlAlchemyRepository(session)
+
+    with assert_max_queries(2):
+        store = repo.get(store_id)
+        assert len(store.list_items()) == 20
+        for item in store.list_items():
+            assert store.get_item(item.id).quantity == 10
+
+
+def test_getting_requested_items_of_a_store_is_one_query(session, assert_max_queries):
+    store_id, item_ids = insert_store_with_items(session, 20)
+    repo = repository.SqlAlchemyRepository(session)
+
+    with assert_max_queries(1):
+        store = repo.get(store_id, item_ids=item_ids[:5])
+        assert len(store.list_items()) == 5
+
+
+def test_assert_max_queries_reports_the_statements(session, assert_max_queries):
+    store_id, _ = insert_store_with_items(session, 1)
+    repo = repository.SqlAlchemyRepository(session)
+
+    with pytest.raises(AssertionError, match='2 queries, expected at most 1'):
+        with assert_max_queries(1):
+            repo.get(store_id).list_items()
+
+
+def test_repository_iterates_item_rows_by_keyset(session):
+    store_id, item_ids = insert_store_with_items(session, 5)
+    ordered_ids = sorted(item_ids)
+    repo = repository.SqlAlchemyRepository(session)
+
+    first_page = list(repo.iter_item_rows(store_id, ('id', 'quantity'), limit=2))
+    second_page = list(repo.iter_item_rows(store_id, ('id',), after=first_page[-1][0], limit=2, batch_size=1))
+
+    assert [tuple(row) for row in first_page] == [(ordered_ids[0], 10), (ordered_ids[1], 10)]
+    assert [row[0] for row in second_page] == ordered_ids[2:4]
+    assert list(repo.iter_item_rows('invalid_store_id')) == []
+
+
+def test_repository_iterates_only_items_in_stock(session):
+    store_id, item_ids = insert_store_with_items(session, 3)
+    session.execute('UPDATE items SET quantity=0 WHERE id=:id', dict(id=item_ids[1]))
+    repo = repository.SqlAlchemyRepository(session)
+
+    rows = list(repo.iter_item_rows(store_id, ('id',), in_stock=True))
+
+    assert sorted(row[0] for row in rows) == sorted([item_ids[0], item_ids[2]])
+
+
+def test_repository_inserts_items_in_bulk(session):
+    store = model.Store(name='Store_001')
+    session.add(store)
+    session.commit()
+    store_id = store.id
+    session.close()
+    rows = [{'id': f'item-{i}', 'name': f'Item_{i:03}', 'price': 1000.0, 'quantity': i} for i in range(3)]
+
+    repo = repository.SqlAlchemyRepository(session)
+    assert repo.insert_items(store_id, rows) == 3
+    session.commit()
+
+    store = repository.SqlAlchemyRepository(session).get(store_id)
+    assert sorted((item.id, item.quantity) for item in store.list_items()) == [
+        ('item-0', 0), ('item-1', 1), ('item-2', 2)
+    ]
+    assert store.version_number == 1
+
+
+@pytest.mark.parametrize('session_fixture', ['session', 'postgres_session'])
+def test_repository_inserts_empty_and_missing_names_as_they_are(request, session_fixture):
+    # Postgres inserts through COPY, whose CSV has no other way to tell them apart than quotes
+    session = request.getfixturevalue(session_fixture)
+    store = model.Store(name='Store_001')
+    session.add(store)
+    session.commit()
+    store_id = store.id
+    rows = [
+        {'id': str(uuid4()), 'name': name, 'price': 1000.0, 'quantity': 1}
+        for name in ['', None, 'Item "002",\nLarge']
+    ]
+    try:
+        repository.SqlAlchemyRepository(session).insert_items(store_id, rows)
+        session.commit()
+
+        names = dict(repository.SqlAlchemyRepository(session).iter_item_rows(store_id, ('id', 'name')))
+        assert names == {row['id']: row['name'] for row in rows}
+    finally:
+        session.rollback()
+        session.execute(orm.store_items_mappings.delete().where(orm.store_items_mappings.c.store_id == store_id))
+        session.execute(orm.items.delete().where(orm.items.c.id.in_([row['id'] for row in rows])))
+        session.execute(orm.stores.delete().where(orm.stores.c.id == store_id))
+        session.commit()
+
+
+def test_repository_raises_invalid_store_id_when_inserting_items(session):
+    repo = repository.SqlAlchemyRepository(session)
+
+    with pytest.raises(repository.InvalidStoreId):
+        repo.insert_items('invalid_store_id', [{'id': 'i1', 'name': 'Item_001', 'price': 1.0, 'quantity': 1}])
+
+
+def test_repository_records_approved_orders_once(session):
+    orders = [
+        Order(order_id=order_id, order_datetime=datetime.now(), customer_phone='01012341234', store_id='s1',
+              item_ids=['i1'], order_status=OrderStatus.PUBLISHED.value)
+        for order_id in ['o1', 'o2']
+    ]
+    repo = repository.SqlAlchemyRepository(session)
+    repo.add_approved_orders(orders[:1])
+    session.commit()
+
+    assert repository.SqlAlchemyRepository(session).get_approved_order_ids(['o1', 'o2']) == {'o1'}
+    with pytest.raises(repository.DuplicateApproval):
+        repository.SqlAlchemyRepository(session).add_approved_orders(orders)
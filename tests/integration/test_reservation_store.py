@@ -0,0 +1,75 @@
+import dataclasses
+from datetime import datetime
+
+from storesvc.adapters.reservation_store import SqlAlchemyReservationStore
+from storesvc.domain.model import Store, Item
+from storesvc.domain.reservation import ReservationBook
+from storesvc.domain.value import OrderStatus, Order
+from storesvc.service_layer.reservation_snapshots import ReservationSnapshotter
+
+
+def make_store_and_order():
+    store = Store(name='Store_001')
+    item = Item(name='Item_001', price=1000.0, quantity=10)
+    store.add_item(item)
+    order = Order(order_id='o1', order_datetime=datetime(2021, 3, 1, 12, 30), customer_phone='010-1234-1234',
+                  store_id=store.id, item_ids=[item.id, item.id], order_status=OrderStatus.PUBLISHED.value)
+    return store, order
+
+
+def test_saved_holds_are_loaded_back(session):
+    store, order = make_store_and_order()
+    book = ReservationBook()
+    hold = book.reserve(store, order, ttl=60)
+
+    SqlAlchemyReservationStore(session, 'web-1').save(book.holds())
+    session.commit()
+
+    assert SqlAlchemyReservationStore(session, 'web-1').load() == [hold]
+
+
+def test_owners_save_and_load_their_own_holds(session):
+    store, order = make_store_and_order()
+    books = {owner: ReservationBook() for owner in ('web-1', 'web-2')}
+    holds = {owner: book.reserve(store, order, ttl=60) for owner, book in books.items()}
+    for owner, book in books.items():
+        SqlAlchemyReservationStore(session, owner).save(book.holds())
+    session.commit()
+
+    books['web-1'].release(holds['web-1'].reservation_id)
+    SqlAlchemyReservationStore(session, 'web-1').save(books['web-1'].holds())
+    session.commit()
+
+    assert SqlAlchemyReservationStore(session, 'web-1').load() == []
+    assert SqlAlchemyReservationStore(session, 'web-2').load() == [holds['web-2']]
+
+
+def test_saving_deletes_the_expired_holds_of_every_owner(session):
+    store, order = make_store_and_order()
+    gone = ReservationBook()
+    expired = gone.reserve(store, order, ttl=-1)
+    kept = gone.reserve(store, order, ttl=60)
+    SqlAlchemyReservationStore(session, 'web-gone').save([expired, kept])
+    session.commit()
+
+    SqlAlchemyReservationStore(session, 'web-1').save([])
+    session.commit()
+
+    assert SqlAlchemyReservationStore(session, 'web-gone').load() == [kept]
+
+
+def test_snapshot_replaces_released_holds_and_restores_a_new_book(session_factory):
+    store, order = make_store_and_order()
+    book = ReservationBook()
+    released = book.reserve(store, order, ttl=60)
+    kept = book.reserve(store, dataclasses.replace(order, order_id='o2'), ttl=60)
+    snapshotter = ReservationSnapshotter(book, session_factory, interval=60, owner='web-1')
+    snapshotter.snapshot()
+    book.release(released.reservation_id)
+    snapshotter.snapshot()
+
+    restored = ReservationBook()
+    ReservationSnapshotter(restored, session_factory, owner='web-1').restore()
+
+    assert restored.holds() == [kept]
+    assert restored.held(store.id, order.item_ids[0]) == 2
@@ -5,9 +5,13 @@ import traceback
 from datetime import datetime
 from typing import List
 
-from storesvc.domain.model import Store, Item
+from storesvc.adapters import catalog, db
+from storesvc.domain import events
+from storesvc.domain.model import Store, Item, OutOfStock, InvalidOrder
 from storesvc.domain.value import OrderStatus, Order
-from storesvc.service_layer import unit_of_work
+from storesvc.service_layer import messagebus, services, unit_of_work
+
+from fakes import FakeOrderProvider
 
 
 def insert_store(session, store: Store):
@@ -56,6 +60,29 @@ def test_uow_can_retrieve_a_store_and_approve_an_order(session_factory):
     assert item_quantity == item.quantity - 1
 
 
+def test_uow_can_approve_an_order_against_a_store_with_only_ordered_items(session_factory):
+    session = session_factory()
+    store = Store(name='Store_001')
+    ordered_item = Item(name='Item_001', price=1000.0, quantity=10)
+    other_item = Item(name='Item_002', price=1000.0, quantity=10)
+    store.add_item(ordered_item)
+    store.add_item(other_item)
+    insert_store(session, store)
+
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory)
+    with uow:
+        store = uow.stores.get(id=store.id, item_ids=[ordered_item.id])
+        order = Order(order_id='o1', order_datetime=datetime.now(), customer_phone='010-1234-1234', store_id=store.id,
+                      item_ids=[ordered_item.id, ordered_item.id], order_status=OrderStatus.PUBLISHED.value)
+        store.approve(order)
+        uow.commit()
+
+    assert get_item_quantity(session, ordered_item.id) == 8
+    assert get_item_quantity(session, other_item.id) == 10
+    [[mapping_count]] = session.execute('SELECT count(*) FROM store_items_mappings')
+    assert mapping_count == 2
+
+
 def test_rolls_back_uncommitted_work_by_default(session_factory):
     store = Store(name='Store_001')
     uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory)
@@ -83,6 +110,101 @@ def test_rolls_back_on_error(session_factory):
     assert rows == []
 
 
+def test_commit_raises_concurrent_update_if_store_version_has_changed(session_factory):
+    session = session_factory()
+    store = Store(name='Store_001')
+    item = Item(name='Item_001', price=1000.0, quantity=10)
+    store.add_item(item)
+    insert_store(session, store)
+    session.commit()
+    order = Order(order_id='o1', order_datetime=datetime.now(), customer_phone='010-1234-1234', store_id=store.id,
+                  item_ids=[item.id], order_status=OrderStatus.PUBLISHED.value)
+
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory)
+    with pytest.raises(unit_of_work.ConcurrentUpdate):
+        with uow:
+            retrieved = uow.stores.get(id=store.id)
+            retrieved.approve(order)
+            session.execute(
+                'UPDATE stores SET version_number = version_number + 1 WHERE id=:store_id',
+                dict(store_id=store.id)
+            )
+            uow.commit()
+
+    assert get_item_quantity(session, item.id) == 10
+
+
+def test_set_based_approval_decrements_stock_and_publishes_approved_order(session_factory, monkeypatch):
+    monkeypatch.setenv('APPROVAL_STRATEGY', 'set_based')
+    published = []
+    monkeypatch.setitem(messagebus.HANDLERS, events.ApprovedOrder, [published.append])
+    session = session_factory()
+    store = Store(name='Store_001')
+    item1 = Item(name='Item_001', price=1000.0, quantity=10)
+    item2 = Item(name='Item_002', price=1000.0, quantity=10)
+    store.add_item(item1)
+    store.add_item(item2)
+    insert_store(session, store)
+    session.commit()
+    order = Order(order_id='o1', order_datetime=datetime.now(), customer_phone='010-1234-1234', store_id=store.id,
+                  item_ids=[item1.id, item1.id, item2.id], order_status=OrderStatus.PUBLISHED.value)
+
+    services.approve_order(order.order_id, unit_of_work.SqlAlchemyUnitOfWork(session_factory),
+                           FakeOrderProvider([order]))
+
+    assert get_item_quantity(session, item1.id) == 8
+    assert get_item_quantity(session, item2.id) == 9
+    assert published == [events.ApprovedOrder(order=order)]
+
+
+@pytest.mark.parametrize('strategy', ['aggregate', 'set_based'])
+def test_approving_an_order_twice_takes_its_items_once(session_factory, monkeypatch, strategy):
+    monkeypatch.setenv('APPROVAL_STRATEGY', strategy)
+    session = session_factory()
+    store = Store(name='Store_001')
+    item = Item(name='Item_001', price=1000.0, quantity=10)
+    store.add_item(item)
+    insert_store(session, store)
+    session.commit()
+    order = Order(order_id='o1', order_datetime=datetime.now(), customer_phone='010-1234-1234', store_id=store.id,
+                  item_ids=[item.id], order_status=OrderStatus.PUBLISHED.value)
+
+    services.approve_order(order.order_id, unit_of_work.SqlAlchemyUnitOfWork(session_factory),
+                           FakeOrderProvider([order]))
+    # A retried webhook handled by another process, whose cache has not seen the approval
+    services.approved_orders.clear()
+    services.approve_order(order.order_id, unit_of_work.SqlAlchemyUnitOfWork(session_factory),
+                           FakeOrderProvider([order]))
+
+    assert get_item_quantity(session, item.id) == 9
+    [[processed]] = session.execute('SELECT COUNT(*) FROM processed_orders WHERE order_id=:id', dict(id='o1'))
+    assert processed == 1
+
+
+@pytest.mark.parametrize('ordered_item_id, error', [('in_stock', OutOfStock), ('invalid_item_id', InvalidOrder)])
+def test_set_based_approval_rejects_whole_order_if_a_line_cannot_be_approved(
+        session_factory, monkeypatch, ordered_item_id, error
+):
+    monkeypatch.setenv('APPROVAL_STRATEGY', 'set_based')
+    session = session_factory()
+    store = Store(name='Store_001')
+    in_stock = Item(name='Item_001', price=1000.0, quantity=10)
+    sold_out = Item(name='Item_002', price=1000.0, quantity=0)
+    store.add_item(in_stock)
+    store.add_item(sold_out)
+    insert_store(session, store)
+    session.commit()
+    item_ids = [in_stock.id, sold_out.id] if ordered_item_id == 'in_stock' else [in_stock.id, ordered_item_id]
+    order = Order(order_id='o1', order_datetime=datetime.now(), customer_phone='010-1234-1234', store_id=store.id,
+                  item_ids=item_ids, order_status=OrderStatus.PUBLISHED.value)
+
+    with pytest.raises(error, match=order.order_id):
+        services.approve_order(order.order_id, unit_of_work.SqlAlchemyUnitOfWork(session_factory),
+                               FakeOrderProvider([order]))
+
+    assert get_item_quantity(session, in_stock.id) == 10
+
+
 def try_to_approve(store_id: str, order: Order, exceptions):
     try:
         with unit_of_work.SqlAlchemyUnitOfWork() as uow:
@@ -143,3 +265,70 @@ def test_concurrent_approve_to_version_are_not_allowed(postgres_session_factory)
     )
     assert quantity == item.quantity - 1
 
+
+
+def test_uow_counts_the_statements_it_runs(session_factory):
+    session = session_factory()
+    store = Store(name='Store_001')
+    item = Item(name='Item_001', price=1000.0, quantity=2)
+    store.add_item(item)
+    session.add(store)
+    session.commit()
+    store_id, item_id = store.id, item.id
+    session.close()
+    order = Order(order_id='o1', order_datetime=datetime.now(), customer_phone='010-1234-1234',
+                  store_id=store_id, item_ids=[item_id], order_status=OrderStatus.PUBLISHED.value)
+
+    uow = unit_of_work.SqlAlchemyUnitOfWork(session_factory, use_outbox=False)
+    with db.track_queries() as outer:
+        with uow:
+            uow.stores.get(store_id, item_ids=[item_id]).approve(order)
+            uow.commit()
+
+    # The partial load, then the item and store version updates
+    assert uow.queries.statements == 3
+    assert uow.queries.rows >= 2
+    assert outer.statements == uow.queries.statements
+
+
+def test_import_catalog_commits_each_chunk(session_factory):
+    session = session_factory()
+    store = Store(name='Store_001')
+    insert_store(session, store)
+    session.commit()
+    rows = [{'id': f'item-{i}', 'name': f'Item_{i:03}', 'price': 1000.0, 'quantity': 1} for i in range(5)]
+    progress = []
+
+    imported = services.import_catalog(
+        store.id, iter(rows), unit_of_work.SqlAlchemyUnitOfWork(session_factory), chunk_size=2,
+        progress=progress.append,
+    )
+
+    assert imported == 5
+    assert progress == [2, 4, 5]
+    [[count]] = session_factory().execute('SELECT COUNT(*) FROM store_items_mappings WHERE store_id=:id',
+                                          dict(id=store.id))
+    assert count == 5
+
+
+def test_import_catalog_keeps_the_chunks_before_a_failure(session_factory):
+    session = session_factory()
+    store = Store(name='Store_001')
+    insert_store(session, store)
+    session.commit()
+
+    def rows():
+        for i in range(3):
+            yield {'id': f'item-{i}', 'name': f'Item_{i:03}', 'price': 1000.0, 'quantity': 1}
+        raise catalog.InvalidCatalog('Line 4: invalid item')
+
+    progress = []
+    with pytest.raises(catalog.InvalidCatalog):
+        services.import_catalog(
+            store.id, rows(), unit_of_work.SqlAlchemyUnitOfWork(session_factory), chunk_size=2,
+            progress=progress.append,
+        )
+
+    assert progress == [2]
+    [[count]] = session_factory().execute('SELECT COUNT(*) FROM items')
+    assert count == 2
@@ -0,0 +1,41 @@
+from storesvc.adapters.cache import LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_returns_value_set_for_key():
+    cache = LRUCache(maxsize=2, ttl=10)
+    cache.set(('s1', 1), b'payload')
+
+    assert cache.get(('s1', 1)) == b'payload'
+    assert cache.get(('s1', 2)) is None
+
+
+def test_least_recently_used_entry_is_evicted_when_full():
+    cache = LRUCache(maxsize=2, ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+def test_entry_expires_after_ttl():
+    clock = FakeClock()
+    cache = LRUCache(maxsize=2, ttl=10, clock=clock)
+    cache.set('a', 1)
+
+    clock.now = 9.9
+    assert cache.get('a') == 1
+    clock.now = 10.0
+    assert cache.get('a') is None
+    assert len(cache) == 0
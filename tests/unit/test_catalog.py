@@ -0,0 +1,48 @@
+import pytest
+
+from storesvc.adapters.catalog import InvalidCatalog, read_csv, read_json_lines
+
+
+def test_read_csv_converts_columns_and_ids_and_generates_missing_ids():
+    rows = list(read_csv([
+        'id,name,price,quantity\n',
+        '5B6C0F3E-8A7D-4C1E-9F2A-3D4E5F607182,Item_001,1000,10\n',
+        ',"Item, 002",2500.5,0\n',
+    ]))
+
+    assert rows[0] == {
+        'id': '5b6c0f3e-8a7d-4c1e-9f2a-3d4e5f607182', 'name': 'Item_001', 'price': 1000.0, 'quantity': 10
+    }
+    assert rows[1]['name'] == 'Item, 002'
+    assert rows[1]['price'] == 2500.5
+    assert len(rows[1]['id']) == 36
+
+
+def test_read_csv_requires_the_item_columns():
+    with pytest.raises(InvalidCatalog, match='quantity'):
+        list(read_csv(['name,price\n', 'Item_001,1000\n']))
+
+
+def test_read_json_lines_skips_blank_lines():
+    rows = list(read_json_lines([
+        '{"id": "5b6c0f3e-8a7d-4c1e-9f2a-3d4e5f607182", "name": "Item_001", "price": 1000, "quantity": 10}\n',
+        '\n',
+        '{"name": "Item_002", "price": 2000, "quantity": 1}\n',
+    ]))
+
+    assert [row['name'] for row in rows] == ['Item_001', 'Item_002']
+
+
+@pytest.mark.parametrize('line', [
+    'not json',
+    '[1, 2]',
+    '{"name": "Item_001", "price": 1000}',
+    '{"name": "Item_001", "price": "free", "quantity": 1}',
+    '{"name": "Item_001", "price": 1000, "quantity": -1}',
+    '{"id": "i1", "name": "Item_001", "price": 1000, "quantity": 1}',
+])
+def test_read_json_lines_reports_the_invalid_line(line):
+    lines = ['{"name": "Item_001", "price": 1000, "quantity": 1}\n', line]
+
+    with pytest.raises(InvalidCatalog, match='Line 2'):
+        list(read_json_lines(lines))
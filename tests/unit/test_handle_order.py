@@ -1,3 +1,5 @@
+import copy
+import pickle
 import pytest
 from datetime import datetime
 from typing import List
@@ -59,6 +61,15 @@ def test_raise_out_of_stock_exception_if_quantity_smaller_than_ordered():
         small_store.approve(large_order)
 
 
+def test_held_quantities_are_not_available_to_the_order():
+    store, order = make_store_and_order(5, 3)
+    item_id = order.item_ids[0]
+    with pytest.raises(OutOfStock, match=order.order_id):
+        store.approve(order, held={item_id: 3})
+    store.approve(order, held={item_id: 2})
+    assert store.get_item(item_id).quantity == 2
+
+
 def test_raise_invalid_order_if_store_id_is_not_matched():
     store, mismatched_order = make_store_and_order(5, 5, uuid4())
     with pytest.raises(InvalidOrder, match=mismatched_order.order_id):
@@ -77,3 +88,35 @@ def test_raise_invalid_order_if_order_is_not_published():
     store, approved_order = make_store_and_order(5, 5, uuid4(), OrderStatus.APPROVED.value)
     with pytest.raises(InvalidOrder, match=approved_order.order_id):
         store.approve(approved_order)
+
+
+def test_rejected_order_does_not_change_any_item_quantity():
+    item1 = Item(name="Item_001", price=5000, quantity=10)
+    item2 = Item(name="Item_002", price=5000, quantity=1)
+    store = make_store([item1, item2])
+    order = Order(
+        order_id="order_id_001",
+        order_datetime=datetime.now(),
+        customer_phone="000-0000-0000",
+        store_id=store.id,
+        item_ids=[item1.id, item2.id, item2.id],
+        order_status=OrderStatus.PUBLISHED.value
+    )
+    version_number = store.version_number
+
+    with pytest.raises(OutOfStock, match=order.order_id):
+        store.approve(order)
+
+    assert item1.quantity == 10
+    assert item2.quantity == 1
+    assert store.version_number == version_number
+    assert store.events == []
+
+
+@pytest.mark.parametrize('duplicate', [lambda order: pickle.loads(pickle.dumps(order)), copy.copy, copy.deepcopy])
+def test_order_survives_pickle_and_copy(duplicate):
+    order = Order(order_id="order_id_001", order_datetime=datetime.now(), customer_phone="000-0000-0000",
+                  store_id="store_id_001", item_ids=["item_id_001", "item_id_001"],
+                  order_status=OrderStatus.PUBLISHED.value)
+
+    assert duplicate(order) == order
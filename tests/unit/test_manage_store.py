@@ -59,3 +59,25 @@ def test_set_item_quantity():
     store.set_item_quantity(item_id, 150)
 
     assert store.get_item(item_id).quantity == 150
+
+
+def test_get_item_return_none_after_delete():
+    store = Store(name="Starbucks")
+    item = Item(name="Americano", price=5000, quantity=100)
+    store.add_item(item)
+    store.delete_item(item)
+
+    result = store.get_item(item.id)
+
+    assert result is None
+
+
+def test_catalog_changes_increase_version_number():
+    store = Store(name="Starbucks")
+    item = Item(name="Americano", price=5000, quantity=100)
+
+    store.add_item(item)
+    store.set_item_quantity(item.id, 150)
+    store.delete_item(item)
+
+    assert store.version_number == 3
@@ -0,0 +1,116 @@
+import pytest
+import threading
+from datetime import datetime
+
+from storesvc.domain import events
+from storesvc.domain.value import OrderStatus, Order
+from storesvc.service_layer import messagebus
+
+
+def make_event(order_id: str = 'o1') -> events.ApprovedOrder:
+    return events.ApprovedOrder(order=Order(
+        order_id=order_id, order_datetime=datetime.now(), customer_phone='01012341234',
+        store_id='s1', item_ids=['i1'], order_status=OrderStatus.APPROVED.value,
+    ))
+
+
+class BlockingHandler:
+    def __init__(self):
+        self.handled = []
+        self.release = threading.Event()
+        self.started = threading.Semaphore(0)
+
+    def __call__(self, event):
+        self.started.release()
+        self.release.wait(5)
+        self.handled.append(event)
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    handler = BlockingHandler()
+    monkeypatch.setitem(messagebus.HANDLERS, events.ApprovedOrder, [handler])
+    yield handler
+    handler.release.set()
+    messagebus.stop_async_dispatch(timeout=5)
+
+
+def fill_queue(handler, dispatcher_queue_size: int):
+    messagebus.handle(make_event('busy'))
+    assert handler.started.acquire(timeout=5)
+    for i in range(dispatcher_queue_size):
+        messagebus.handle(make_event(f'queued{i}'))
+
+
+def test_handle_dispatches_inline_without_async_dispatcher(monkeypatch):
+    handled = []
+    monkeypatch.setitem(messagebus.HANDLERS, events.ApprovedOrder, [handled.append])
+
+    event = make_event()
+
+    messagebus.handle(event)
+
+    assert handled == [event]
+
+
+def test_async_dispatcher_handles_events_on_workers(handler):
+    dispatcher = messagebus.start_async_dispatch(workers=2, queue_size=10)
+    handler.release.set()
+
+    for i in range(5):
+        messagebus.handle(make_event(f'o{i}'))
+    messagebus.stop_async_dispatch(timeout=5)
+
+    assert sorted(event.order.order_id for event in handler.handled) == [f'o{i}' for i in range(5)]
+    assert dispatcher.stats()['handled'] == 5
+    assert dispatcher.stats()['queue_depth'] == 0
+
+
+def test_reject_policy_raises_queue_full(handler):
+    dispatcher = messagebus.start_async_dispatch(workers=1, queue_size=2, backpressure=messagebus.Backpressure.REJECT)
+    fill_queue(handler, 2)
+
+    with pytest.raises(messagebus.QueueFull):
+        messagebus.handle(make_event('rejected'))
+    assert dispatcher.stats()['rejected'] == 1
+
+
+def test_drop_policy_discards_events(handler):
+    dispatcher = messagebus.start_async_dispatch(workers=1, queue_size=2, backpressure=messagebus.Backpressure.DROP)
+    fill_queue(handler, 2)
+
+    messagebus.handle(make_event('dropped'))
+    handler.release.set()
+    messagebus.stop_async_dispatch(timeout=5)
+
+    assert 'dropped' not in [event.order.order_id for event in handler.handled]
+    assert dispatcher.stats()['dropped'] == 1
+    assert dispatcher.stats()['handled'] == 3
+
+
+def test_shutdown_drains_queued_events(handler):
+    dispatcher = messagebus.start_async_dispatch(workers=1, queue_size=5)
+    fill_queue(handler, 5)
+    assert dispatcher.stats()['max_queue_depth'] == 5
+
+    handler.release.set()
+    messagebus.stop_async_dispatch(drain=True, timeout=5)
+
+    assert len(handler.handled) == 6
+    with pytest.raises(RuntimeError):
+        dispatcher.submit(make_event())
+
+
+def test_starting_async_dispatch_again_stops_the_previous_dispatcher(handler):
+    handler.release.set()
+    first = messagebus.start_async_dispatch(workers=1, queue_size=10)
+    messagebus.handle(make_event('o1'))
+
+    second = messagebus.start_async_dispatch(workers=1, queue_size=10)
+    messagebus.stop_async_dispatch(timeout=5, dispatcher=first)
+    messagebus.handle(make_event('o2'))
+    messagebus.stop_async_dispatch(timeout=5)
+
+    assert [event.order.order_id for event in handler.handled] == ['o1', 'o2']
+    assert first.stats()['handled'] == 1
+    assert second.stats()['handled'] == 1
@@ -0,0 +1,64 @@
+import pytest
+
+from storesvc.metrics import Counter, Histogram, Registry
+
+
+def test_counter_counts_per_label_values():
+    counter = Counter('requests', 'Requests', ('status',))
+    counter.inc('200')
+    counter.inc('200')
+    counter.inc('400', amount=3)
+
+    assert counter.value('200') == 2
+    assert counter.value('400') == 3
+    assert counter.value('500') == 0
+
+
+def test_metrics_reject_wrong_label_count():
+    with pytest.raises(ValueError):
+        Counter('requests', 'Requests', ('status',)).inc()
+    with pytest.raises(ValueError):
+        Histogram('latency', 'Latency').observe(0.1, 'extra')
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram('latency_seconds', 'Latency', ('stage',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, 'commit')
+    histogram.observe(0.1, 'commit')
+    histogram.observe(0.5, 'commit')
+    histogram.observe(5.0, 'commit')
+
+    assert histogram.count('commit') == 4
+    assert histogram.render() == [
+        '# HELP latency_seconds Latency',
+        '# TYPE latency_seconds histogram',
+        'latency_seconds_bucket{stage="commit",le="0.1"} 2',
+        'latency_seconds_bucket{stage="commit",le="1.0"} 3',
+        'latency_seconds_bucket{stage="commit",le="+Inf"} 4',
+        'latency_seconds_sum{stage="commit"} 5.65',
+        'latency_seconds_count{stage="commit"} 4',
+    ]
+
+
+def test_timer_observes_the_block_duration():
+    histogram = Histogram('latency_seconds', 'Latency')
+
+    with histogram.time():
+        pass
+
+    assert histogram.count() == 1
+    assert 0 <= histogram.sum() < 1
+
+
+def test_registry_renders_every_metric_in_text_format():
+    registry = Registry()
+    counter = registry.register(Counter('requests', 'Requests "handled"', ('path',)))
+    counter.inc('/stores/"1"')
+
+    assert registry.render() == (
+        '# HELP requests Requests "handled"\n'
+        '# TYPE requests counter\n'
+        'requests_total{path="/stores/\\"1\\""} 1.0\n'
+    )
+    with pytest.raises(ValueError):
+        registry.register(Counter('requests', 'Requests'))
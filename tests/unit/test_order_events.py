@@ -0,0 +1,75 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from storesvc import metrics
+from storesvc.adapters.order_events import FileOrderEventSource
+from storesvc.domain import events
+from storesvc.domain.value import Order, OrderStatus
+
+
+def make_order(order_id: str, order_status: int = OrderStatus.PUBLISHED.value) -> Order:
+    return Order(order_id=order_id, order_datetime=datetime(2021, 3, 1, 12, 30), customer_phone='01012341234',
+                 store_id='s1', item_ids=['i1', 'i1'], order_status=order_status)
+
+
+def test_reads_appended_events_in_batches(tmp_path):
+    source = FileOrderEventSource(str(tmp_path / 'orders.jsonl'))
+    created = [events.OrderCreated(order=make_order(f'o{i}')) for i in range(3)]
+    updated = events.OrderUpdated(order=make_order('o0', OrderStatus.CANCELED.value))
+    source.append(created + [updated])
+
+    first, position = source.read(0, limit=3)
+    rest, end = source.read(position, limit=3)
+
+    assert first == created
+    assert rest == [updated]
+    assert source.read(end, limit=3) == ([], end)
+
+
+def test_missing_file_has_no_events(tmp_path):
+    source = FileOrderEventSource(str(tmp_path / 'orders.jsonl'))
+
+    assert source.read(0, limit=10) == ([], 0)
+
+
+def test_stops_before_a_line_still_being_written(tmp_path):
+    path = tmp_path / 'orders.jsonl'
+    source = FileOrderEventSource(str(path))
+    source.append([events.OrderCreated(order=make_order('o1'))])
+    with open(path, 'a') as file:
+        file.write('{"type": "OrderCreated", "ord')
+
+    order_events, position = source.read(0, limit=10)
+
+    assert [event.order.order_id for event in order_events] == ['o1']
+    assert position == len(path.read_bytes().splitlines(keepends=True)[0])
+
+
+def test_skips_other_event_types(tmp_path):
+    path = tmp_path / 'orders.jsonl'
+    path.write_text(json.dumps({'type': 'OrderPaid', 'order': {}}) + '\n\n')
+    source = FileOrderEventSource(str(path))
+
+    assert source.read(0, limit=10) == ([], path.stat().st_size)
+
+
+@pytest.mark.parametrize('line', [
+    'not json',
+    '[1, 2]',
+    '{"type": "OrderCreated"}',
+    '{"type": "OrderCreated", "order": {"id": "o1", "orderDate": "yesterday"}}',
+])
+def test_skips_invalid_lines(tmp_path, line):
+    path = tmp_path / 'orders.jsonl'
+    source = FileOrderEventSource(str(path))
+    path.write_text(line + '\n')
+    source.append([events.OrderCreated(order=make_order('o1'))])
+    invalid = metrics.INVALID_ORDER_EVENTS.value()
+
+    order_events, position = source.read(0, limit=10)
+
+    assert [event.order.order_id for event in order_events] == ['o1']
+    assert position == path.stat().st_size
+    assert metrics.INVALID_ORDER_EVENTS.value() == invalid + 1
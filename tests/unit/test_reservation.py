@@ -0,0 +1,146 @@
+import pytest
+from datetime import datetime
+from typing import List
+
+from storesvc.domain.model import Item, Store, OutOfStock, InvalidOrder
+from storesvc.domain.reservation import ReservationBook, InvalidReservation
+from storesvc.domain.value import OrderStatus, Order
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_store(items: List[Item]):
+    store = Store(name='Store_001')
+    for item in items:
+        store.add_item(item)
+    return store
+
+
+def make_order(order_id: str, store: Store, item_ids: List[str]):
+    return Order(order_id=order_id, order_datetime=datetime.now(), customer_phone='000-0000-0000',
+                 store_id=store.id, item_ids=item_ids, order_status=OrderStatus.PUBLISHED.value)
+
+
+def test_reserve_holds_ordered_quantities_without_changing_the_store():
+    item = Item(name='Item_001', price=5000, quantity=3)
+    store = make_store([item])
+    book = ReservationBook(clock=FakeClock())
+
+    book.reserve(store, make_order('o1', store, [item.id, item.id]), ttl=10)
+
+    assert book.held(store.id, item.id) == 2
+    assert store.get_item(item.id).quantity == 3
+
+
+def test_reserve_counts_existing_holds_against_the_stock():
+    item = Item(name='Item_001', price=5000, quantity=3)
+    store = make_store([item])
+    book = ReservationBook(clock=FakeClock())
+    book.reserve(store, make_order('o1', store, [item.id, item.id]), ttl=10)
+
+    with pytest.raises(OutOfStock):
+        book.reserve(store, make_order('o2', store, [item.id, item.id]), ttl=10)
+    assert book.held(store.id, item.id) == 2
+
+
+def test_reserve_rejects_unknown_items_and_other_stores():
+    item = Item(name='Item_001', price=5000, quantity=3)
+    store = make_store([item])
+    other_store = make_store([])
+    book = ReservationBook(clock=FakeClock())
+
+    with pytest.raises(InvalidOrder):
+        book.reserve(store, make_order('o1', store, ['unknown']), ttl=10)
+    with pytest.raises(InvalidOrder):
+        book.reserve(store, make_order('o2', other_store, [item.id]), ttl=10)
+    assert len(book) == 0
+
+
+def test_holds_expire_after_their_ttl():
+    item = Item(name='Item_001', price=5000, quantity=1)
+    store = make_store([item])
+    clock = FakeClock()
+    book = ReservationBook(clock=clock)
+    hold = book.reserve(store, make_order('o1', store, [item.id]), ttl=10)
+
+    clock.now = 10
+    with pytest.raises(InvalidReservation):
+        book.get(hold.reservation_id)
+    assert book.held(store.id, item.id) == 0
+    book.reserve(store, make_order('o2', store, [item.id]), ttl=10)
+
+
+def test_held_counts_leave_out_expired_holds_and_items_without_holds():
+    held, free = Item(name='Item_001', price=5000, quantity=3), Item(name='Item_002', price=5000, quantity=3)
+    store = make_store([held, free])
+    clock = FakeClock()
+    book = ReservationBook(clock=clock)
+    book.reserve(store, make_order('o1', store, [held.id, held.id]), ttl=10)
+    book.reserve(store, make_order('o2', store, [held.id]), ttl=20)
+
+    assert book.held_counts(store.id, [held.id, free.id]) == {held.id: 3}
+    clock.now = 10
+    assert book.held_counts(store.id, [held.id, free.id]) == {held.id: 1}
+
+
+def test_release_frees_the_stock_and_is_not_expired_again():
+    item = Item(name='Item_001', price=5000, quantity=1)
+    store = make_store([item])
+    clock = FakeClock()
+    book = ReservationBook(clock=clock)
+    hold = book.reserve(store, make_order('o1', store, [item.id]), ttl=10)
+
+    book.release(hold.reservation_id)
+
+    assert book.held(store.id, item.id) == 0
+    with pytest.raises(InvalidReservation):
+        book.release(hold.reservation_id)
+    clock.now = 20
+    assert book.expire() == []
+
+
+def test_restore_skips_expired_holds():
+    item = Item(name='Item_001', price=5000, quantity=2)
+    store = make_store([item])
+    clock = FakeClock()
+    book = ReservationBook(clock=clock)
+    short = book.reserve(store, make_order('o1', store, [item.id]), ttl=5)
+    long = book.reserve(store, make_order('o2', store, [item.id]), ttl=50)
+
+    clock.now = 10
+    restored = ReservationBook(clock=clock)
+    restored.restore([short, long])
+
+    assert [hold.reservation_id for hold in restored.holds()] == [long.reservation_id]
+    assert restored.held(store.id, item.id) == 1
+
+
+def test_an_order_has_one_hold():
+    item = Item(name='Item_001', price=5000, quantity=3)
+    store = make_store([item])
+    book = ReservationBook(clock=FakeClock())
+    order = make_order('o1', store, [item.id])
+
+    hold = book.reserve(store, order, ttl=10)
+
+    assert book.reserve(store, order, ttl=10) == hold
+    assert book.held(store.id, item.id) == 1
+
+
+def test_held_counts_leave_out_the_holds_of_excluded_orders():
+    item = Item(name='Item_001', price=5000, quantity=3)
+    store = make_store([item])
+    book = ReservationBook(clock=FakeClock())
+    book.reserve(store, make_order('o1', store, [item.id]), ttl=10)
+    book.reserve(store, make_order('o2', store, [item.id, item.id]), ttl=10)
+
+    assert book.held_counts(store.id, [item.id], excluding=['o2']) == {item.id: 1}
+    assert book.held_counts(store.id, [item.id], excluding=['o1', 'o2']) == {}
+    assert [hold.order.order_id for hold in book.release_orders(['o1', 'o3'])] == ['o1']
+    assert book.held(store.id, item.id) == 2
@@ -1,11 +1,14 @@
+import asyncio
+import concurrent.futures
 import datetime
 import pytest
 from typing import List
 
 import storesvc.domain.value
-from storesvc.domain import model
+from storesvc.domain import model, reservation
+from storesvc import metrics
 from storesvc.adapters import repository, provider
-from storesvc.service_layer import services, unit_of_work
+from storesvc.service_layer import lanes, services, unit_of_work
 
 
 class FakeOrderProvider(provider.AbstractOrderProvider):
@@ -13,7 +16,10 @@ class FakeOrderProvider(provider.AbstractOrderProvider):
         self._orders = orders
 
     def get_order(self, order_id: str) -> storesvc.domain.value.Order:
-        return next(order for order in self._orders if order.order_id == order_id)
+        try:
+            return next(order for order in self._orders if order.order_id == order_id)
+        except StopIteration:
+            raise provider.InvalidOrderId(f'Invalid order id {order_id}')
 
     def list_orders(self, store_id: str) -> List[storesvc.domain.value.Order]:
         return [order for order in self._orders if order.store_id == store_id]
@@ -23,16 +29,75 @@ class FakeRepository(repository.AbstractRepository):
     def __init__(self, stores: List[model.Store] = list()):
         super().__init__()
         self._stores = stores
+        self._approved_order_ids = set()
+        # Added by the current transaction, until the unit of work commits or rolls back
+        self._new_approved_order_ids = set()
 
     def _new(self, store: model.Store):
         self._stores.append(store)
 
     def _get(self, id: str) -> model.Store:
-        return next(store for store in self._stores if store.id == id)
+        try:
+            return next(store for store in self._stores if store.id == id)
+        except StopIteration:
+            raise repository.InvalidStoreId(f'Invalid store id {id}')
 
     def _list(self) -> List[model.Store]:
         return self._stores
 
+    def decrement_quantities(self, store_id, ordered_counts, held=None):
+        store = self._get(store_id)
+        held = held or {}
+        in_stock = [
+            (store.get_item(item_id), count) for item_id, count in ordered_counts.items()
+            if store.get_item(item_id) and store.get_item(item_id).quantity >= count + held.get(item_id, 0)
+        ]
+        # All or nothing, as the unit of work cannot roll the quantities back
+        if len(in_stock) == len(ordered_counts):
+            for item, count in in_stock:
+                item.quantity -= count
+            store.version_number += 1
+        return len(in_stock)
+
+    def get_quantities(self, store_id, item_ids):
+        store = self._get(store_id)
+        return {item.id: item.quantity for item in store.list_items() if item.id in set(item_ids)}
+
+    def get_name_and_version_number(self, id):
+        store = self._get(id)
+        return store.name, store.version_number
+
+    def insert_items(self, store_id, rows):
+        store = self._get(store_id)
+        for row in rows:
+            store.add_item(model.Item(**row))
+        return len(rows)
+
+    def iter_item_rows(self, store_id, fields=repository.ITEM_FIELDS, after=None, limit=None, in_stock=False,
+                       batch_size=500):
+        items = sorted(self._get(store_id).list_items(), key=lambda item: item.id)
+        items = [
+            item for item in items
+            if (after is None or item.id > after) and (not in_stock or item.quantity > 0)
+        ]
+        return iter([tuple(getattr(item, field) for field in fields) for item in items[:limit]])
+
+    def get_approved_order_ids(self, order_ids):
+        return self._approved_order_ids.intersection(order_ids)
+
+    def add_approved_orders(self, orders):
+        for order in orders:
+            if order.order_id in self._approved_order_ids | self._new_approved_order_ids:
+                raise repository.DuplicateApproval(f'Order already approved: {order.order_id}')
+            self._new_approved_order_ids.add(order.order_id)
+
+    def commit_approved_orders(self):
+        self._approved_order_ids |= self._new_approved_order_ids
+        self._new_approved_order_ids = set()
+
+    def rollback_approved_orders(self):
+        self._new_approved_order_ids = set()
+
 
 class FakeUnitOfWork(unit_of_work.AbstractUnitOfWork):
     def __init__(self, repo=FakeRepository([])):
@@ -40,10 +105,24 @@ class FakeUnitOfWork(unit_of_work.AbstractUnitOfWork):
         self.committed = False
 
     def _commit(self):
+        self.stores.commit_approved_orders()
         self.committed = True
 
     def rollback(self):
-        pass
+        self.stores.rollback_approved_orders()
+
+
+class ConflictingUnitOfWork(FakeUnitOfWork):
+    def __init__(self, repo, conflicts: int):
+        super().__init__(repo)
+        self.conflicts = conflicts
+        self.attempts = 0
+
+    def _commit(self):
+        self.attempts += 1
+        if self.attempts <= self.conflicts:
+            raise unit_of_work.ConcurrentUpdate('store was updated concurrently')
+        super()._commit()
 
 
 class TestApproveOrderService:
@@ -122,6 +201,33 @@ class TestApproveOrderService:
         with pytest.raises(model.OutOfStock, match="Out of stock for store_id"):
             services.approve_order(order.order_id, uow, prov)
 
+    def test_approve_order_retries_on_concurrent_update(self, monkeypatch):
+        monkeypatch.setenv('APPROVE_RETRY_BACKOFF', '0')
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=10)
+        store.add_item(item)
+        order = make_order('o1', store.id, [item.id])
+        uow = ConflictingUnitOfWork(FakeRepository([store]), conflicts=2)
+
+        services.approve_order(order.order_id, uow, FakeOrderProvider([order]))
+
+        assert uow.attempts == 3
+        assert uow.committed
+
+    def test_approve_order_gives_up_after_max_retries(self, monkeypatch):
+        monkeypatch.setenv('APPROVE_MAX_RETRIES', '2')
+        monkeypatch.setenv('APPROVE_RETRY_BACKOFF', '0')
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=10)
+        store.add_item(item)
+        order = make_order('o1', store.id, [item.id])
+        uow = ConflictingUnitOfWork(FakeRepository([store]), conflicts=3)
+
+        with pytest.raises(unit_of_work.ConcurrentUpdate):
+            services.approve_order(order.order_id, uow, FakeOrderProvider([order]))
+        assert uow.attempts == 3
+        assert not uow.committed
+
     def test_approve_order_errors_for_invalid_order_status(self):
         store = model.Store(name='Store_001')
         item = model.Item(name='Item_001', price=1000.0, quantity=1)
@@ -139,3 +245,600 @@ class TestApproveOrderService:
         prov = FakeOrderProvider([order])
         with pytest.raises(model.InvalidOrder, match="The order cannot be approved"):
             services.approve_order(order.order_id, uow, prov)
+
+
+def make_order(order_id: str, store_id: str, item_ids: List[str]) -> storesvc.domain.value.Order:
+    return storesvc.domain.value.Order(
+        order_id=order_id,
+        order_datetime=datetime.datetime.now(),
+        customer_phone='01012341234',
+        store_id=store_id,
+        item_ids=item_ids,
+        order_status=storesvc.domain.value.OrderStatus.PUBLISHED.value
+    )
+
+
+class TestSetBasedApproval:
+    def test_set_based_approval_takes_all_lines_or_none(self, monkeypatch):
+        monkeypatch.setenv('APPROVAL_STRATEGY', 'set_based')
+        store = model.Store(name='Store_001')
+        item1 = model.Item(name='Item_001', price=1000.0, quantity=2)
+        item2 = model.Item(name='Item_002', price=1000.0, quantity=1)
+        store.add_item(item1)
+        store.add_item(item2)
+        orders = [make_order('o1', store.id, [item1.id, item2.id]), make_order('o2', store.id, [item1.id, item2.id])]
+        uow = FakeUnitOfWork(FakeRepository([store]))
+
+        services.approve_order('o1', uow, FakeOrderProvider(orders))
+        with pytest.raises(model.OutOfStock):
+            services.approve_order('o2', uow, FakeOrderProvider(orders))
+
+        assert (item1.quantity, item2.quantity) == (1, 0)
+
+
+class TestApproveOrdersService:
+    def test_approve_orders_approves_orders_of_many_stores_in_one_commit(self):
+        store1, store2 = model.Store(name='Store_001'), model.Store(name='Store_002')
+        item1 = model.Item(name='Item_001', price=1000.0, quantity=2)
+        item2 = model.Item(name='Item_002', price=1000.0, quantity=1)
+        store1.add_item(item1)
+        store2.add_item(item2)
+        orders = [
+            make_order('o1', store1.id, [item1.id]),
+            make_order('o2', store2.id, [item2.id]),
+            make_order('o3', store1.id, [item1.id]),
+        ]
+        uow = FakeUnitOfWork(FakeRepository([store1, store2]))
+
+        results = services.approve_orders(['o1', 'o2', 'o3'], uow, FakeOrderProvider(orders))
+
+        assert results == {'o1': None, 'o2': None, 'o3': None}
+        assert item1.quantity == 0
+        assert item2.quantity == 0
+        assert uow.committed
+
+    def test_approve_orders_rejects_bad_orders_without_aborting_the_rest(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=1)
+        store.add_item(item)
+        orders = [
+            make_order('o1', store.id, [item.id]),
+            make_order('o2', store.id, [item.id]),
+            make_order('o3', store.id, ['invalid_item_id']),
+            make_order('o4', 'invalid_store_id', [item.id]),
+        ]
+        uow = FakeUnitOfWork(FakeRepository([store]))
+
+        results = services.approve_orders(['o1', 'o2', 'o3', 'o4', 'o5'], uow, FakeOrderProvider(orders))
+
+        assert results['o1'] is None
+        assert isinstance(results['o2'], model.OutOfStock)
+        assert isinstance(results['o3'], model.InvalidOrder)
+        assert isinstance(results['o4'], model.InvalidOrder)
+        assert isinstance(results['o5'], model.InvalidOrder)
+        assert item.quantity == 0
+        assert uow.committed
+
+
+    def test_approve_orders_rejects_orders_of_another_store(self):
+        store1, store2 = model.Store(name='Store_001'), model.Store(name='Store_002')
+        item1 = model.Item(name='Item_001', price=1000.0, quantity=1)
+        item2 = model.Item(name='Item_002', price=1000.0, quantity=1)
+        store1.add_item(item1)
+        store2.add_item(item2)
+        orders = [make_order('o1', store1.id, [item1.id]), make_order('o2', store2.id, [item2.id])]
+        uow = FakeUnitOfWork(FakeRepository([store1, store2]))
+
+        results = services.approve_orders(
+            ['o1', 'o2'], uow, FakeOrderProvider(orders), store_ids={'o1': store1.id, 'o2': store1.id}
+        )
+
+        assert results['o1'] is None
+        assert isinstance(results['o2'], model.InvalidOrder)
+        assert item1.quantity == 0
+        assert item2.quantity == 1
+        assert not services.approved_orders.get('o2')
+
+
+class CountingOrderProvider(FakeOrderProvider):
+    def __init__(self, orders: List[storesvc.domain.value.Order]):
+        super().__init__(orders)
+        self.requested_ids = []
+
+    def get_order(self, order_id: str) -> storesvc.domain.value.Order:
+        self.requested_ids.append(order_id)
+        return super().get_order(order_id)
+
+
+class TestIdempotentApproval:
+    def test_approving_an_order_again_does_not_fetch_it_or_touch_stock(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=10)
+        store.add_item(item)
+        prov = CountingOrderProvider([make_order('o1', store.id, [item.id])])
+        uow = FakeUnitOfWork(FakeRepository([store]))
+        duplicates = metrics.APPROVALS.value('duplicate')
+
+        services.approve_order('o1', uow, prov)
+        services.approve_order('o1', uow, prov)
+
+        assert store.get_item(item.id).quantity == 9
+        assert prov.requested_ids == ['o1']
+        assert metrics.APPROVALS.value('duplicate') == duplicates + 1
+
+    def test_ledger_answers_duplicates_the_cache_does_not_know(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=10)
+        store.add_item(item)
+        prov = CountingOrderProvider([make_order('o1', store.id, [item.id])])
+        uow = FakeUnitOfWork(FakeRepository([store]))
+        services.approve_order('o1', uow, prov)
+
+        # As in another process, or after a restart
+        services.approved_orders.clear()
+        services.approve_order('o1', uow, prov)
+
+        assert store.get_item(item.id).quantity == 9
+        assert prov.requested_ids == ['o1']
+
+    def test_duplicate_committed_during_the_approval_wins(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=10)
+        store.add_item(item)
+        repo = FakeRepository([store])
+        uow = FakeUnitOfWork(repo)
+
+        class RacingOrderProvider(FakeOrderProvider):
+            def get_order(self, order_id):
+                # Another request approves the same order while this one fetches it
+                repo.add_approved_orders([make_order(order_id, store.id, [item.id])])
+                repo.commit_approved_orders()
+                return super().get_order(order_id)
+
+        services.approve_order('o1', uow, RacingOrderProvider([make_order('o1', store.id, [item.id])]))
+
+        assert not uow.committed
+
+    def test_approve_orders_skips_approved_orders(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=10)
+        store.add_item(item)
+        prov = CountingOrderProvider([make_order('o1', store.id, [item.id]), make_order('o2', store.id, [item.id])])
+        uow = FakeUnitOfWork(FakeRepository([store]))
+        services.approve_order('o1', uow, prov)
+
+        results = services.approve_orders(['o1', 'o2'], uow, prov)
+        services.approved_orders.clear()
+        again = services.approve_orders(['o1', 'o2'], uow, prov)
+
+        assert results == again == {'o1': None, 'o2': None}
+        assert store.get_item(item.id).quantity == 8
+        assert prov.requested_ids == ['o1', 'o2']
+
+    def test_approve_order_async_skips_approved_orders(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=10)
+        store.add_item(item)
+        order = make_order('o1', store.id, [item.id])
+        uow = FakeAsyncUnitOfWork(FakeUnitOfWork(FakeRepository([store])))
+
+        asyncio.run(services.approve_order_async('o1', uow, FakeAsyncOrderProvider([order])))
+        services.approved_orders.clear()
+        asyncio.run(services.approve_order_async('o1', uow, FakeAsyncOrderProvider([])))
+
+        assert store.get_item(item.id).quantity == 9
+
+
+class CountingUnitOfWork(FakeUnitOfWork):
+    def __init__(self, repo, commits: List[int]):
+        super().__init__(repo)
+        self.commits = commits
+
+    def _commit(self):
+        self.commits.append(1)
+        super()._commit()
+
+
+class TestApprovalLanes:
+    def test_lanes_approve_orders_and_raise_rejections(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=1)
+        store.add_item(item)
+        orders = [make_order('o1', store.id, [item.id]), make_order('o2', store.id, [item.id])]
+        repo = FakeRepository([store])
+        approval_lanes = lanes.ApprovalLanes(lambda: FakeUnitOfWork(repo), FakeOrderProvider(orders), lanes=2)
+        approval_lanes.start()
+
+        approval_lanes.approve(store.id, 'o1', timeout=5)
+        with pytest.raises(model.OutOfStock):
+            approval_lanes.approve(store.id, 'o2', timeout=5)
+        with pytest.raises(model.InvalidOrder):
+            approval_lanes.approve(store.id, 'unknown', timeout=5)
+        approval_lanes.shutdown(timeout=5)
+
+        assert item.quantity == 0
+
+    def test_lane_group_commits_queued_approvals(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=10)
+        store.add_item(item)
+        orders = [make_order(f'o{i}', store.id, [item.id]) for i in range(10)]
+        repo = FakeRepository([store])
+        commits = []  # type: List[int]
+        approval_lanes = lanes.ApprovalLanes(
+            lambda: CountingUnitOfWork(repo, commits), FakeOrderProvider(orders), lanes=1, group_commit_size=10
+        )
+
+        futures = [approval_lanes.submit(store.id, order.order_id) for order in orders]
+        approval_lanes.start()
+        approval_lanes.shutdown(timeout=5)
+
+        assert [future.result() for future in futures] == [None] * 10
+        assert item.quantity == 0
+        assert commits == [1]
+
+
+    def test_lanes_reject_orders_of_another_store_than_their_own(self):
+        store1, store2 = model.Store(name='Store_001'), model.Store(name='Store_002')
+        item = model.Item(name='Item_001', price=1000.0, quantity=1)
+        store2.add_item(item)
+        approval_lanes = lanes.ApprovalLanes(
+            lambda: FakeUnitOfWork(FakeRepository([store1, store2])),
+            FakeOrderProvider([make_order('o1', store2.id, [item.id])]), lanes=2,
+        )
+        approval_lanes.start()
+
+        with pytest.raises(model.InvalidOrder):
+            approval_lanes.approve(store1.id, 'o1', timeout=5)
+        approval_lanes.shutdown(timeout=5)
+
+        assert item.quantity == 1
+
+    def test_approval_timing_out_in_the_queue_is_cancelled(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=1)
+        store.add_item(item)
+        uow = FakeUnitOfWork(FakeRepository([store]))
+        approval_lanes = lanes.ApprovalLanes(
+            lambda: uow, FakeOrderProvider([make_order('o1', store.id, [item.id])]), lanes=1
+        )
+
+        # Not started: the approval stays queued
+        with pytest.raises(concurrent.futures.TimeoutError):
+            approval_lanes.approve(store.id, 'o1', timeout=0.01)
+        approval_lanes.start()
+        approval_lanes.shutdown(timeout=5)
+
+        assert item.quantity == 1
+        assert not uow.committed
+
+
+class TestReservationService:
+    def test_confirm_reservation_approves_the_held_order(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=2)
+        store.add_item(item)
+        order = make_order('o1', store.id, [item.id])
+        uow = FakeUnitOfWork(FakeRepository([store]))
+        book = reservation.ReservationBook()
+
+        hold = services.reserve_order(order.order_id, uow, FakeOrderProvider([order]), book, ttl=60)
+        assert store.get_item(item.id).quantity == 2
+
+        services.confirm_reservation(hold.reservation_id, uow, book)
+
+        assert store.get_item(item.id).quantity == 1
+        assert book.held(store.id, item.id) == 0
+        assert uow.committed
+
+    @pytest.mark.parametrize('strategy', ['aggregate', 'set_based'])
+    def test_approvals_leave_reserved_stock_alone(self, monkeypatch, strategy):
+        monkeypatch.setenv('APPROVAL_STRATEGY', strategy)
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=2)
+        store.add_item(item)
+        reserved, approved, bulk = (make_order(order_id, store.id, [item.id]) for order_id in ('o1', 'o2', 'o3'))
+        prov = FakeOrderProvider([reserved, approved, bulk])
+        uow = FakeUnitOfWork(FakeRepository([store]))
+        book = reservation.ReservationBook()
+        services.reserve_order(reserved.order_id, uow, prov, book, ttl=60)
+
+        services.approve_order(approved.order_id, uow, prov, book)
+        with pytest.raises(model.OutOfStock):
+            services.approve_order(bulk.order_id, uow, prov, book)
+        results = services.approve_orders([bulk.order_id], uow, prov, book=book)
+
+        assert isinstance(results[bulk.order_id], model.OutOfStock)
+        assert item.quantity == 1
+        assert book.held(store.id, item.id) == 1
+
+    @pytest.mark.parametrize('strategy', ['aggregate', 'set_based'])
+    def test_approving_a_reserved_order_uses_and_ends_its_hold(self, monkeypatch, strategy):
+        monkeypatch.setenv('APPROVAL_STRATEGY', strategy)
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=1)
+        store.add_item(item)
+        order = make_order('o1', store.id, [item.id])
+        prov = FakeOrderProvider([order])
+        uow = FakeUnitOfWork(FakeRepository([store]))
+        book = reservation.ReservationBook()
+        hold = services.reserve_order(order.order_id, uow, prov, book, ttl=60)
+
+        services.approve_order(order.order_id, uow, prov, book)
+
+        assert item.quantity == 0
+        assert book.held(store.id, item.id) == 0
+        with pytest.raises(reservation.InvalidReservation):
+            book.get(hold.reservation_id)
+
+    def test_bulk_approval_of_reserved_orders_uses_their_holds(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=2)
+        store.add_item(item)
+        orders = [make_order(order_id, store.id, [item.id]) for order_id in ('o1', 'o2')]
+        prov = FakeOrderProvider(orders)
+        uow = FakeUnitOfWork(FakeRepository([store]))
+        book = reservation.ReservationBook()
+        for order in orders:
+            services.reserve_order(order.order_id, uow, prov, book, ttl=60)
+
+        results = services.approve_orders(['o1', 'o2'], uow, prov, book=book)
+
+        assert results == {'o1': None, 'o2': None}
+        assert item.quantity == 0
+        assert len(book) == 0
+
+    def test_order_is_reserved_once(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=2)
+        store.add_item(item)
+        order = make_order('o1', store.id, [item.id])
+        prov = FakeOrderProvider([order])
+        uow = FakeUnitOfWork(FakeRepository([store]))
+        book = reservation.ReservationBook()
+
+        first = services.reserve_order(order.order_id, uow, prov, book, ttl=60)
+        second = services.reserve_order(order.order_id, uow, prov, book, ttl=60)
+
+        assert second == first
+        assert book.held(store.id, item.id) == 1
+
+    def test_approved_order_cannot_be_reserved(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=2)
+        store.add_item(item)
+        order = make_order('o1', store.id, [item.id])
+        prov = FakeOrderProvider([order])
+        uow = FakeUnitOfWork(FakeRepository([store]))
+        book = reservation.ReservationBook()
+        services.approve_order(order.order_id, uow, prov)
+        services.approved_orders.clear()
+
+        with pytest.raises(model.InvalidOrder, match='already approved'):
+            services.reserve_order(order.order_id, uow, prov, book, ttl=60)
+        assert len(book) == 0
+
+    def test_order_of_another_store_cannot_be_reserved(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=2)
+        store.add_item(item)
+        order = make_order('o1', store.id, [item.id])
+        book = reservation.ReservationBook()
+
+        with pytest.raises(model.InvalidOrder, match='store id is not matched'):
+            services.reserve_order(
+                order.order_id, FakeUnitOfWork(FakeRepository([store])), FakeOrderProvider([order]), book,
+                ttl=60, store_id='other-store',
+            )
+        assert len(book) == 0
+
+    def test_reservation_is_confirmed_once(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=2)
+        store.add_item(item)
+        order = make_order('o1', store.id, [item.id])
+        uow = FakeUnitOfWork(FakeRepository([store]))
+        book = reservation.ReservationBook()
+        hold = services.reserve_order(order.order_id, uow, FakeOrderProvider([order]), book, ttl=60)
+
+        services.confirm_reservation(hold.reservation_id, uow, book)
+        with pytest.raises(reservation.InvalidReservation):
+            services.confirm_reservation(hold.reservation_id, uow, book)
+
+        assert item.quantity == 1
+
+    def test_confirmed_order_is_not_approved_again_by_the_webhook(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=2)
+        store.add_item(item)
+        order = make_order('o1', store.id, [item.id])
+        prov = FakeOrderProvider([order])
+        repo = FakeRepository([store])
+        book = reservation.ReservationBook()
+        hold = services.reserve_order(order.order_id, FakeUnitOfWork(repo), prov, book, ttl=60)
+
+        services.confirm_reservation(hold.reservation_id, FakeUnitOfWork(repo), book)
+        # A later process, which did not see the confirmation
+        services.approved_orders.clear()
+        services.approve_order(order.order_id, FakeUnitOfWork(repo), prov, book)
+        results = services.approve_orders([order.order_id], FakeUnitOfWork(repo), prov, book=book)
+
+        assert results == {order.order_id: None}
+        assert item.quantity == 1
+
+    def test_confirming_an_approved_order_takes_no_more_stock(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=3)
+        store.add_item(item)
+        order = make_order('o1', store.id, [item.id])
+        prov = FakeOrderProvider([order])
+        repo = FakeRepository([store])
+        book = reservation.ReservationBook()
+        hold = services.reserve_order(order.order_id, FakeUnitOfWork(repo), prov, book, ttl=60)
+        # By another process, whose book does not have the hold
+        services.approve_order(order.order_id, FakeUnitOfWork(repo), prov)
+        services.approved_orders.clear()
+
+        services.confirm_reservation(hold.reservation_id, FakeUnitOfWork(repo), book)
+
+        assert item.quantity == 2
+        assert book.held(store.id, item.id) == 0
+
+    def test_failed_confirmation_keeps_the_hold(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=1)
+        store.add_item(item)
+        order = make_order('o1', store.id, [item.id])
+        uow = FakeUnitOfWork(FakeRepository([store]))
+        book = reservation.ReservationBook()
+        hold = services.reserve_order(order.order_id, uow, FakeOrderProvider([order]), book, ttl=60)
+        # Sold by a change that did not go through the book
+        item.quantity = 0
+
+        with pytest.raises(model.OutOfStock):
+            services.confirm_reservation(hold.reservation_id, uow, book)
+
+        assert book.get(hold.reservation_id) == hold
+        assert book.held(store.id, item.id) == 1
+
+    def test_released_reservation_cannot_be_confirmed(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=1)
+        store.add_item(item)
+        order = make_order('o1', store.id, [item.id])
+        uow = FakeUnitOfWork(FakeRepository([store]))
+        book = reservation.ReservationBook()
+        hold = services.reserve_order(order.order_id, uow, FakeOrderProvider([order]), book, ttl=60)
+
+        services.release_reservation(hold.reservation_id, book)
+
+        with pytest.raises(reservation.InvalidReservation):
+            services.confirm_reservation(hold.reservation_id, uow, book)
+        assert store.get_item(item.id).quantity == 1
+
+
+class FakeAsyncOrderProvider(provider.AbstractAsyncOrderProvider):
+    def __init__(self, orders: List[storesvc.domain.value.Order]):
+        self._provider = FakeOrderProvider(orders)
+
+    async def get_order(self, order_id: str) -> storesvc.domain.value.Order:
+        return self._provider.get_order(order_id)
+
+
+class FakeAsyncUnitOfWork(unit_of_work.AbstractAsyncUnitOfWork):
+    def __init__(self, uow: FakeUnitOfWork):
+        self._uow = uow
+        self.stores = repository.ExecutorRepository(uow.stores, self._run)
+
+    @property
+    def committed(self):
+        return self._uow.committed
+
+    async def _run(self, fn, *args):
+        return fn(*args)
+
+    async def publish_events(self):
+        self._uow.publish_events()
+
+    async def _commit(self):
+        self._uow._commit()
+
+    async def rollback(self):
+        self._uow.rollback()
+
+
+class TestApproveOrderAsyncService:
+    def test_approve_order_async_reduces_item_quantity(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=1)
+        store.add_item(item)
+        order = make_order('o1', store.id, [item.id])
+        uow = FakeAsyncUnitOfWork(FakeUnitOfWork(FakeRepository([store])))
+
+        asyncio.run(services.approve_order_async(order.order_id, uow, FakeAsyncOrderProvider([order])))
+
+        assert store.get_item(item.id).quantity == 0
+        assert uow.committed
+
+    def test_approve_order_async_raises_out_of_stock(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=1)
+        store.add_item(item)
+        order = make_order('o1', store.id, [item.id, item.id])
+        uow = FakeAsyncUnitOfWork(FakeUnitOfWork(FakeRepository([store])))
+
+        with pytest.raises(model.OutOfStock):
+            asyncio.run(services.approve_order_async(order.order_id, uow, FakeAsyncOrderProvider([order])))
+        assert store.get_item(item.id).quantity == 1
+        assert not uow.committed
+
+    def test_approve_order_async_retries_concurrent_updates(self, monkeypatch):
+        monkeypatch.setenv('APPROVE_RETRY_BACKOFF', '0')
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=10)
+        store.add_item(item)
+        order = make_order('o1', store.id, [item.id])
+        conflicting = ConflictingUnitOfWork(FakeRepository([store]), conflicts=2)
+
+        asyncio.run(services.approve_order_async(
+            order.order_id, FakeAsyncUnitOfWork(conflicting), FakeAsyncOrderProvider([order])
+        ))
+
+        assert conflicting.attempts == 3
+        assert conflicting.committed
+
+    def test_async_get_orders_skips_missing_orders(self):
+        order = make_order('o1', 'store', ['item'])
+
+        orders = asyncio.run(FakeAsyncOrderProvider([order]).get_orders(['o1', 'missing']))
+
+        assert orders == {'o1': order}
+
+
+class TestApprovalMetrics:
+    def test_approve_order_counts_outcomes_and_times_stages(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=1)
+        store.add_item(item)
+        orders = [make_order('o1', store.id, [item.id]), make_order('o2', store.id, [item.id])]
+        prov = FakeOrderProvider(orders)
+        approved = metrics.APPROVALS.value('approved')
+        out_of_stock = metrics.APPROVALS.value('OutOfStock')
+        commits = metrics.STAGE_SECONDS.count('commit')
+
+        services.approve_order('o1', FakeUnitOfWork(FakeRepository([store])), prov)
+        with pytest.raises(model.OutOfStock):
+            services.approve_order('o2', FakeUnitOfWork(FakeRepository([store])), prov)
+
+        assert metrics.APPROVALS.value('approved') == approved + 1
+        assert metrics.APPROVALS.value('OutOfStock') == out_of_stock + 1
+        assert metrics.STAGE_SECONDS.count('commit') == commits + 1
+
+    def test_approve_orders_counts_the_outcome_of_each_order(self):
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=1)
+        store.add_item(item)
+        prov = FakeOrderProvider([make_order(order_id, store.id, [item.id]) for order_id in ('o1', 'o2')])
+        uow = FakeUnitOfWork(FakeRepository([store]))
+        counts = {outcome: metrics.APPROVALS.value(outcome) for outcome in ('approved', 'duplicate', 'OutOfStock')}
+
+        services.approve_orders(['o1', 'o2'], uow, prov)
+        services.approve_orders(['o1'], uow, prov)
+
+        assert metrics.APPROVALS.value('approved') == counts['approved'] + 1
+        assert metrics.APPROVALS.value('OutOfStock') == counts['OutOfStock'] + 1
+        assert metrics.APPROVALS.value('duplicate') == counts['duplicate'] + 1
+
+    def test_retries_are_counted(self, monkeypatch):
+        monkeypatch.setenv('APPROVE_RETRY_BACKOFF', '0')
+        store = model.Store(name='Store_001')
+        item = model.Item(name='Item_001', price=1000.0, quantity=10)
+        store.add_item(item)
+        order = make_order('o1', store.id, [item.id])
+        retries = metrics.APPROVAL_RETRIES.value()
+
+        services.approve_order(
+            order.order_id, ConflictingUnitOfWork(FakeRepository([store]), conflicts=2), FakeOrderProvider([order])
+        )
+
+        assert metrics.APPROVAL_RETRIES.value() == retries + 2